@@ -1,5 +1,6 @@
 import asyncio
 import os
+import sys
 import time
 
 from mcp_agent.app import MCPApp
@@ -21,7 +22,8 @@ from mcp_agent.workflows.llm.augmented_llm_openai import OpenAIAugmentedLLM
 app = MCPApp(name="fixr")  # settings=settings)
 
 
-async def process_message(user_input: str):
+async def run_messages(messages):
+    """Run several messages against one warm app/agent/LLM instead of one app.run() each"""
     async with app.run() as agent_app:
         logger = agent_app.logger
         context = agent_app.context
@@ -39,17 +41,27 @@ async def process_message(user_input: str):
 
         async with os_agent:
             llm = await os_agent.attach_llm(OpenAIAugmentedLLM)
-            result = await llm.generate_str(
-                message=user_input,
-            )
-            print(result)
-            return result
+            results = []
+            for user_input in messages:
+                result = await llm.generate_str(
+                    message=user_input,
+                    request_params=RequestParams(use_history=False),
+                )
+                print(result)
+                results.append(result)
+            return results
+
+
+async def process_message(user_input: str):
+    results = await run_messages([user_input])
+    return results[0]
 
 
 if __name__ == "__main__":
+    messages = sys.argv[1:] or ["Close Discord"]
     start = time.time()
-    asyncio.get_event_loop().run_until_complete(process_message("Close Discord"))
+    asyncio.run(run_messages(messages))
     end = time.time()
     t = end - start
 
-    print(f"Total run time: {t:.2f}s")
\ No newline at end of file
+    print(f"Total run time: {t:.2f}s")
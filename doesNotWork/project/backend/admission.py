@@ -0,0 +1,196 @@
+"""
+Admission control for agent requests.
+
+At most FIXR_MAX_IN_FLIGHT requests run the agent at once; up to
+FIXR_MAX_QUEUE more wait in a priority queue (FIFO within a priority) for up to
+FIXR_QUEUE_TIMEOUT seconds. Anything beyond that is turned away at once with
+429 (queue full) or 503 (waited too long) and a Retry-After estimated from
+recent run times, instead of piling up until the client gives up.
+/health and /metrics never go through here.
+
+The controller is used from one event loop (the agent loop in server.py, the
+server loop in async_server.py).
+"""
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import math
+import os
+import time
+
+import metrics
+
+PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+
+
+class Rejected(Exception):
+    def __init__(self, status, reason, retry_after):
+        super().__init__(f"Server busy ({reason.replace('_', ' ')}), retry in {retry_after}s")
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def parse_priority(options):
+    """Queue priority (0 = first) from a request's priority field: high, normal (default) or low"""
+    value = options.get('priority', 'normal')
+    if isinstance(value, list):  # query string
+        value = value[0]
+    return PRIORITIES.get(str(value).lower(), PRIORITIES['normal'])
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight=8, max_queue=32, queue_timeout=30.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._queue = []    # (priority, seq, future)
+        self._waiting = 0   # futures in _queue that are still pending
+        self._seq = itertools.count()
+        self._run_seconds = None  # moving average, for Retry-After
+
+    def retry_after(self):
+        """Seconds until a slot is likely free, from the average run time and the queue ahead"""
+        average = self._run_seconds or 1.0
+        return max(1, math.ceil(average * (self._waiting + 1) / self.max_in_flight))
+
+    async def acquire(self, priority=None):
+        """Wait for a slot; raises Rejected when the queue is full or the wait times out"""
+        if priority is None:
+            priority = PRIORITIES['normal']
+        if self.in_flight < self.max_in_flight and not self._waiting:
+            self._admit()
+            metrics.admission_wait_seconds.observe(0.0)
+            return
+        if self._waiting >= self.max_queue:
+            self._reject('queue_full')
+            raise Rejected(429, 'queue_full', self.retry_after())
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future))
+        self._waiting += 1
+        metrics.admission_queue_depth.set(self._waiting)
+        started = time.perf_counter()
+        # Not wait_for: it returns the result when cancelled after release() granted the
+        # slot, so a caller that had already given up would keep the slot forever
+        expiry = loop.call_later(self.queue_timeout, self._expire, future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # admitted just as the caller gave up: hand the slot on
+            else:
+                self._withdraw(future)
+            raise
+        except asyncio.TimeoutError:
+            self._withdraw(future)
+            self._reject('queue_timeout')
+            raise Rejected(503, 'queue_timeout', self.retry_after())
+        finally:
+            expiry.cancel()
+        metrics.admission_wait_seconds.observe(time.perf_counter() - started)
+
+    def release(self, run_seconds=None):
+        """Free a slot (run_seconds: how long the request ran) and admit the next waiter"""
+        self.in_flight -= 1
+        metrics.admission_in_flight.set(self.in_flight)
+        if run_seconds:
+            self._run_seconds = run_seconds if self._run_seconds is None else 0.8 * self._run_seconds + 0.2 * run_seconds
+        while self._queue and self.in_flight < self.max_in_flight:
+            _, _, future = heapq.heappop(self._queue)
+            if future.done():
+                continue  # timed out or cancelled while waiting
+            self._waiting -= 1
+            metrics.admission_queue_depth.set(self._waiting)
+            self._admit()
+            future.set_result(None)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority=None):
+        await self.acquire(priority)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+    def release_after(self, events):
+        """Wrap an acquired slot's event stream so closing it frees the slot"""
+        return AdmittedEvents(self, events)
+
+    def _admit(self):
+        self.in_flight += 1
+        self.admitted += 1
+        metrics.admission_in_flight.set(self.in_flight)
+
+    @staticmethod
+    def _expire(future):
+        if not future.done():
+            future.set_exception(asyncio.TimeoutError())
+
+    def _withdraw(self, future):
+        future.cancel()
+        self._waiting -= 1
+        metrics.admission_queue_depth.set(self._waiting)
+
+    def _reject(self, reason):
+        self.rejected += 1
+        metrics.admission_rejected.inc(reason=reason)
+
+    def stats(self):
+        return {
+            'in_flight': self.in_flight,
+            'queued': self._waiting,
+            'max_in_flight': self.max_in_flight,
+            'max_queue': self.max_queue,
+            'queue_timeout': self.queue_timeout,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+        }
+
+
+class AdmittedEvents:
+    """
+    An async generator of (event, data) holding an admission slot. aclose() frees
+    it exactly once, even if the stream was never iterated (client gone before
+    the headers were written).
+    """
+
+    def __init__(self, controller, events):
+        self.controller = controller
+        self.events = events
+        self.started = time.perf_counter()
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.events.__anext__()
+
+    async def aclose(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self.events.aclose()
+        finally:
+            self.controller.release(time.perf_counter() - self.started)
+
+
+def from_env():
+    """Controller configured by FIXR_MAX_IN_FLIGHT / FIXR_MAX_QUEUE / FIXR_QUEUE_TIMEOUT, or None"""
+    max_in_flight = int(os.environ.get('FIXR_MAX_IN_FLIGHT', 8))
+    if max_in_flight <= 0:
+        return None
+    return AdmissionController(
+        max_in_flight=max_in_flight,
+        max_queue=int(os.environ.get('FIXR_MAX_QUEUE', 32)),
+        queue_timeout=float(os.environ.get('FIXR_QUEUE_TIMEOUT', 30)),
+    )
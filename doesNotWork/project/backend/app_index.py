@@ -0,0 +1,396 @@
+"""
+Index of launchable applications: name -> shortcut, executable or .desktop file.
+
+Built in a background thread from the places launchers look (Start Menu
+shortcuts and registered App Paths on Windows, .desktop files and $PATH
+binaries on Linux, .app bundles on macOS) and rebuilt when one of those
+directories changes. Lookups are a dict access on the normalized name, with
+aliases and a difflib fallback for near misses, so resolving "Discord" does
+not need a file search or an LLM tool loop. Loose executables ($PATH
+binaries, .exe files) are only offered to the agent, never run by the fast path.
+"""
+
+import configparser
+import difflib
+import os
+import platform
+import re
+import shlex
+import threading
+
+NON_ALNUM = re.compile(r'[^0-9a-z]+')
+DESKTOP_FIELD_CODE = re.compile(r'\s*%[a-zA-Z]')
+
+# What people call an app -> the name it is installed under
+DEFAULT_ALIASES = {
+    'chrome': 'google chrome',
+    'edge': 'microsoft edge',
+    'vscode': 'visual studio code',
+    'vs code': 'visual studio code',
+    'code': 'visual studio code',
+    'word': 'microsoft word',
+    'excel': 'microsoft excel',
+    'powerpoint': 'microsoft powerpoint',
+    'outlook': 'microsoft outlook',
+    'teams': 'microsoft teams',
+    'explorer': 'file explorer',
+    'files': 'file explorer',
+    'terminal': 'windows terminal',
+    'cmd': 'command prompt',
+}
+
+LAUNCHER_EXTENSIONS = ('.lnk', '.url', '.exe', '.desktop', '.app')
+
+# Preferred when several entries share a name
+KIND_RANK = {'desktop': 0, 'shortcut': 0, 'app': 0, 'registered': 1, 'exe': 1, 'binary': 2}
+
+# Entries installed to be launched by people (.desktop files, shortcuts, .app bundles,
+# App Paths), which the fast path may start or close without the LLM. Loose .exe files
+# and $PATH binaries (shutdown, reboot, python...) are only offered to the agent.
+LAUNCHER_KINDS = ('desktop', 'shortcut', 'app', 'registered')
+
+# Exec prefixes that start something else; the process is not their own name
+WRAPPERS = ('env', 'nohup', 'gamemoderun', 'prime-run', 'primusrun', 'optirun')
+# Exec commands whose process cannot be told from the command line
+OPAQUE_LAUNCHERS = ('flatpak', 'snap', 'sh', 'bash', 'dash', 'zsh', 'firejail', 'bwrap',
+                    'pkexec', 'sudo', 'xdg-open', 'gtk-launch', 'wine', 'steam', 'java', 'python3', 'python')
+ENV_ASSIGNMENT = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*=')
+
+
+def strip_extension(name):
+    """File name without a launcher extension ("python3.11" keeps its dot)"""
+    stem, ext = os.path.splitext(name)
+    return stem if ext.lower() in LAUNCHER_EXTENSIONS else name
+
+
+def normalize(name):
+    """Lowercase alphanumerics only: "Visual Studio Code" -> "visualstudiocode" """
+    return NON_ALNUM.sub('', name.lower())
+
+
+class AppEntry:
+    __slots__ = ('name', 'kind', 'path', 'command', 'process', 'keywords')
+
+    def __init__(self, name, kind, path, command=None, process=None, keywords=()):
+        self.name = name          # display name
+        self.kind = kind          # 'shortcut', 'exe', 'desktop', 'binary', 'app' or 'registered' (App Paths)
+        self.path = path          # file the entry was read from
+        self.command = command    # Exec line of a .desktop file
+        self.process = process    # executable name, for closing the app
+        self.keywords = tuple(keywords)
+
+    def to_dict(self):
+        return {'name': self.name, 'kind': self.kind, 'path': self.path,
+                'command': self.command, 'process': self.process}
+
+
+def launch_command(entry, system=None):
+    """Shell command that starts an application entry"""
+    system = system or platform.system()
+    if system == "Windows":
+        return f'start "" "{entry.path}"'
+    if system == "Darwin":
+        return f'open -a {shlex.quote(entry.path)}'
+    if entry.kind == 'desktop':
+        return f'gtk-launch {shlex.quote(os.path.basename(entry.path)[:-len(".desktop")])}'
+    return f'nohup {shlex.quote(entry.path)} >/dev/null 2>&1 &'
+
+
+def exec_process(command):
+    """
+    Process name an Exec line starts, past env assignments and wrappers like
+    env/nohup; None when a launcher (flatpak, sh -c, ...) hides it
+    """
+    try:
+        args = shlex.split(command)
+    except ValueError:
+        return None
+    while args:
+        name = os.path.basename(args[0])
+        if ENV_ASSIGNMENT.match(args[0]) or name in WRAPPERS:
+            args = args[1:]
+            while name == 'env' and args and args[0].startswith('-'):
+                args = args[1:]  # env's own options
+            continue
+        return None if name in OPAQUE_LAUNCHERS else name
+    return None
+
+
+def read_desktop_file(path):
+    """AppEntry for a .desktop file, or None if it is hidden or not an application"""
+    parser = configparser.RawConfigParser(interpolation=None, strict=False)
+    parser.optionxform = str
+    try:
+        parser.read(path, encoding='utf-8')
+        section = parser['Desktop Entry']
+    except (configparser.Error, KeyError, UnicodeDecodeError, OSError):
+        return None
+    if section.get('Type', 'Application') != 'Application':
+        return None
+    if section.get('NoDisplay') == 'true' or section.get('Hidden') == 'true':
+        return None
+    name = section.get('Name')
+    if not name:
+        return None
+    command = DESKTOP_FIELD_CODE.sub('', section.get('Exec', '')).strip() or None
+    process = exec_process(command) if command else None
+    if process is None:
+        # Usually the executable's name, and the only hint for flatpak/snap launchers
+        process = section.get('StartupWMClass') or None
+    keywords = [section.get('GenericName', '')]
+    keywords.extend(section.get('Keywords', '').split(';'))
+    return AppEntry(name, 'desktop', path, command, process, [k for k in keywords if k])
+
+
+class AppIndex:
+    def __init__(self, system=None, refresh_interval=300.0, aliases=None, path_dirs=None):
+        self.system = system or platform.system()
+        self.refresh_interval = refresh_interval
+        self.aliases = {normalize(alias): normalize(name)
+                        for alias, name in {**DEFAULT_ALIASES, **(aliases or {})}.items()}
+        self.path_dirs = path_dirs
+        self.ready = threading.Event()
+        self.refreshes = 0
+        self.lookups = 0
+        self.fuzzy_lookups = 0
+        self._by_key = {}       # normalized name/file name/process -> [AppEntry], best first
+        self._by_keyword = {}   # normalized GenericName/Keywords -> [AppEntry]
+        self._entries = []
+        self._stamps = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Lifecycle
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='fixr-app-index', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            stamps = self._source_stamps()
+            if stamps != self._stamps:
+                self.refresh()
+                self._stamps = stamps
+            self.ready.set()
+            if self._stop.wait(self.refresh_interval):
+                return
+
+    # Sources
+
+    def _source_dirs(self):
+        home = os.path.expanduser('~')
+        if self.system == "Windows":
+            dirs = [
+                os.path.join(os.environ.get('APPDATA', ''), 'Microsoft', 'Windows', 'Start Menu', 'Programs'),
+                os.path.join(os.environ.get('PROGRAMDATA', r'C:\ProgramData'),
+                             'Microsoft', 'Windows', 'Start Menu', 'Programs'),
+                os.path.join(home, 'Desktop'),
+            ]
+        elif self.system == "Darwin":
+            dirs = ['/Applications', '/System/Applications', os.path.join(home, 'Applications')]
+        else:
+            data_home = os.environ.get('XDG_DATA_HOME') or os.path.join(home, '.local', 'share')
+            data_dirs = os.environ.get('XDG_DATA_DIRS') or '/usr/local/share:/usr/share'
+            dirs = [os.path.join(d, 'applications') for d in [data_home, *data_dirs.split(':')]]
+            dirs += ['/var/lib/flatpak/exports/share/applications',
+                     os.path.join(data_home, 'flatpak', 'exports', 'share', 'applications'),
+                     '/var/lib/snapd/desktop/applications']
+        return [d for d in dict.fromkeys(dirs) if os.path.isdir(d)]
+
+    def _path_dirs(self):
+        if self.path_dirs is not None:
+            return self.path_dirs
+        dirs = os.environ.get('PATH', '').split(os.pathsep)
+        return [d for d in dict.fromkeys(dirs) if d and os.path.isdir(d)]
+
+    def _source_stamps(self):
+        """mtimes of every source directory; the index is rebuilt when they change"""
+        stamps = []
+        for top in self._source_dirs():
+            for path, dirs, _ in os.walk(top):
+                dirs[:] = [d for d in dirs if not d.endswith('.app')]
+                try:
+                    stamps.append((path, os.stat(path).st_mtime_ns))
+                except OSError:
+                    pass
+        for path in self._path_dirs():
+            try:
+                stamps.append((path, os.stat(path).st_mtime_ns))
+            except OSError:
+                pass
+        return stamps
+
+    def _scan(self):
+        entries = []
+        for top in self._source_dirs():
+            for path, dirs, files in os.walk(top):
+                if self.system == "Darwin":
+                    bundles = [d for d in dirs if d.endswith('.app')]
+                    entries.extend(AppEntry(d[:-4], 'app', os.path.join(path, d), process=d[:-4])
+                                   for d in bundles)
+                    dirs[:] = [d for d in dirs if not d.endswith('.app')]
+                    continue
+                for name in files:
+                    stem, ext = os.path.splitext(name)
+                    ext = ext.lower()
+                    full = os.path.join(path, name)
+                    if ext == '.lnk' or ext == '.url':
+                        entries.append(AppEntry(stem, 'shortcut', full))
+                    elif ext == '.exe':
+                        entries.append(AppEntry(stem, 'exe', full, process=name))
+                    elif ext == '.desktop':
+                        entry = read_desktop_file(full)
+                        if entry is not None:
+                            entries.append(entry)
+        if self.system == "Windows":
+            entries.extend(self._registered_app_paths())
+        else:
+            seen = set()
+            for directory in self._path_dirs():
+                try:
+                    with os.scandir(directory) as it:
+                        for item in it:
+                            # Earlier $PATH entries shadow later ones, as in the shell
+                            if item.name in seen:
+                                continue
+                            if item.is_file() and os.access(item.path, os.X_OK):
+                                seen.add(item.name)
+                                entries.append(AppEntry(item.name, 'binary', item.path, process=item.name))
+                except OSError:
+                    continue
+        return entries
+
+    def _registered_app_paths(self):
+        """Executables registered under App Paths (what the Run dialog resolves)"""
+        import winreg
+
+        entries = []
+        key_path = r'SOFTWARE\Microsoft\Windows\CurrentVersion\App Paths'
+        for hive in (winreg.HKEY_CURRENT_USER, winreg.HKEY_LOCAL_MACHINE):
+            try:
+                key = winreg.OpenKey(hive, key_path)
+            except OSError:
+                continue
+            with key:
+                for i in range(winreg.QueryInfoKey(key)[0]):
+                    try:
+                        exe = winreg.EnumKey(key, i)
+                        path = winreg.QueryValue(key, exe).strip('"')
+                    except OSError:
+                        continue
+                    if path:
+                        entries.append(AppEntry(os.path.splitext(exe)[0], 'registered', path, process=exe))
+        return entries
+
+    def refresh(self):
+        """Rebuild the index from disk; lookups keep using the old one until it is swapped in"""
+        entries = self._scan()
+        by_key, by_keyword = {}, {}
+        for entry in entries:
+            keys = {normalize(entry.name), normalize(strip_extension(os.path.basename(entry.path)))}
+            if entry.process:
+                keys.add(normalize(strip_extension(entry.process)))
+            for key in keys:
+                if key:
+                    by_key.setdefault(key, []).append(entry)
+            for keyword in entry.keywords:
+                if normalize(keyword):
+                    by_keyword.setdefault(normalize(keyword), []).append(entry)
+        for matches in [*by_key.values(), *by_keyword.values()]:
+            matches.sort(key=lambda e: (KIND_RANK[e.kind], len(e.path)))
+        self._by_key, self._by_keyword, self._entries = by_key, by_keyword, entries
+        self.refreshes += 1
+
+    # Lookups
+
+    def lookup(self, name):
+        """Entries whose name, alias, file name or process name is exactly this name"""
+        self.lookups += 1
+        key = normalize(name)
+        if not key:
+            return []
+        return self._by_key.get(key) or self._by_key.get(self.aliases.get(key, ''), [])
+
+    def resolve(self, name, limit=5, cutoff=0.8):
+        """
+        Entries matching an app name, best first: exact name (or alias), then
+        keywords ("text editor"), names starting with it and close spellings.
+        """
+        matches = self.lookup(name)
+        if matches:
+            return matches[:limit]
+        key = normalize(name)
+        if not key:
+            return []
+
+        self.fuzzy_lookups += 1
+        by_key = self._by_key
+        results = list(self._by_keyword.get(key, ()))
+        prefixed = sorted((k for k in by_key if k.startswith(key)), key=len)
+        close = difflib.get_close_matches(key, by_key, n=limit, cutoff=cutoff)
+        for k in dict.fromkeys(prefixed + close):
+            for entry in by_key[k]:
+                if entry not in results:
+                    results.append(entry)
+            if len(results) >= limit:
+                break
+        return results[:limit]
+
+    def stats(self):
+        return {
+            'ready': self.ready.is_set(),
+            'applications': len(self._entries),
+            'names': len(self._by_key),
+            'refreshes': self.refreshes,
+            'lookups': self.lookups,
+            'fuzzy_lookups': self.fuzzy_lookups,
+        }
+
+
+def make_launcher_tool(index):
+    def find_application(name: str) -> str:
+        """
+        Look up an installed application by name (fuzzy, e.g. "discord", "vs code")
+        and return the command that launches it. Use this before searching for
+        .exe or .lnk files when the user asks to open an application.
+        """
+        matches = index.resolve(name)
+        if not matches:
+            if not index.ready.is_set():
+                return "The application index is still being built; search for the application instead."
+            return f"No application matching {name!r} found"
+        return "\n".join(
+            f"Name: {entry.name}\nPath: {entry.path}\nLaunch: {launch_command(entry, index.system)}\n"
+            for entry in matches
+        )
+
+    return find_application
+
+
+def parse_aliases(text):
+    """FIXR_APP_ALIASES format: "vsc=visual studio code;ff=firefox" """
+    aliases = {}
+    for item in (text or '').split(';'):
+        alias, sep, name = item.partition('=')
+        if sep and alias.strip() and name.strip():
+            aliases[alias.strip()] = name.strip()
+    return aliases
+
+
+def from_env():
+    """The application index, or None when disabled with FIXR_APP_INDEX=0"""
+    if os.environ.get('FIXR_APP_INDEX', '1') == '0':
+        return None
+    return AppIndex(
+        refresh_interval=float(os.environ.get('FIXR_APP_INDEX_REFRESH', 300)),
+        aliases=parse_aliases(os.environ.get('FIXR_APP_ALIASES')),
+    )
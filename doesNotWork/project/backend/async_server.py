@@ -0,0 +1,465 @@
+"""
+Asyncio HTTP front end for the FIXR backend.
+
+Serves the same routes as ServerHandler in server.py, but every connection is
+handled on one event loop, so many agent runs can be in flight at once and
+/health never waits behind a slow request. Started with `python server.py --async`.
+"""
+
+import asyncio
+import contextlib
+import json
+import signal
+import time
+from http import HTTPStatus
+from urllib.parse import urlparse, parse_qs
+
+import metrics
+from admission import Rejected, from_env as admission_from_env, parse_priority
+from handlers import (check_api_key, client_timeout, health, key_verifier, parse_batch, reload_backend,
+                      save_api_key, session_id_of, sse_frame, start_reload, use_cache)
+from startup import warm_up_async, warmup
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+DISCONNECT_POLL_INTERVAL = 0.25
+# Not sent to anyone: counted in the HTTP metrics for requests whose client left first (as nginx does)
+CLIENT_CLOSED = 499
+
+
+class BadRequest(Exception):
+    pass
+
+
+class Request:
+    def __init__(self, method, target, version, headers, body):
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers
+        self.body = body
+        parsed = urlparse(target)
+        self.path = parsed.path
+        self.query = parse_qs(parsed.query)
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+    def json(self):
+        return json.loads(self.body.decode('utf-8'))
+
+
+class Response:
+    def __init__(self, status=200, payload=None, headers=None, body=b''):
+        self.status = status
+        self.headers = {'Access-Control-Allow-Origin': '*'}
+        if payload is not None:
+            body = json.dumps(payload).encode('utf-8')
+            self.headers['Content-Type'] = 'application/json'
+        self.headers.update(headers or {})
+        self.body = body
+
+
+class StreamResponse:
+    """Server-Sent Events response; frames are written as the event source yields them"""
+
+    def __init__(self, events, timeout=None):
+        self.status = 200
+        self.headers = {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+        }
+        self.events = events
+        self.timeout = timeout
+
+    async def frames(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout if self.timeout else None
+        try:
+            while True:
+                remaining = deadline - loop.time() if deadline else None
+                try:
+                    event, data = await asyncio.wait_for(self.events.__anext__(), remaining)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    metrics.record_error('timeout')
+                    yield sse_frame('error', {'error': f'Request timed out after {self.timeout:g}s'})
+                    return
+                yield sse_frame(event, data)
+        finally:
+            await self.events.aclose()
+
+
+def busy_response(rejected):
+    return Response(rejected.status, {'success': False, 'error': str(rejected)},
+                    headers={'Retry-After': str(rejected.retry_after)})
+
+
+async def wait_for_disconnect(reader):
+    """Return once the client has closed (or reset) its end of the connection"""
+    while not reader.at_eof() and reader.exception() is None:
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+
+async def read_request(reader):
+    """Read one request from the stream; returns None when the client closed the connection"""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError as e:
+        if e.partial.strip():
+            raise BadRequest('Incomplete request')
+        return None
+    except asyncio.LimitOverrunError:
+        raise BadRequest('Headers too large')
+
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = lines[0].split(' ', 2)
+    except ValueError:
+        raise BadRequest('Malformed request line')
+
+    headers = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        content_length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise BadRequest('Invalid Content-Length')
+    if content_length < 0 or content_length > MAX_BODY_BYTES:
+        raise BadRequest('Invalid Content-Length')
+
+    body = await reader.readexactly(content_length) if content_length else b''
+    return Request(method.upper(), target, version, headers, body)
+
+
+async def write_response(writer, response, keep_alive):
+    status = HTTPStatus(response.status)
+    lines = [f'HTTP/1.1 {status.value} {status.phrase}']
+    headers = dict(response.headers)
+    streaming = isinstance(response, StreamResponse)
+    if streaming:
+        # No Content-Length: the stream ends when the connection closes
+        keep_alive = False
+    else:
+        headers['Content-Length'] = str(len(response.body))
+    headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+    lines.extend(f'{name}: {value}' for name, value in headers.items())
+    head = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    if not streaming:
+        writer.write(head + response.body)
+        await writer.drain()
+        return keep_alive
+
+    frames = response.frames()
+    try:
+        writer.write(head)
+        await writer.drain()
+        async for frame in frames:
+            writer.write(frame)
+            await writer.drain()
+    finally:
+        await frames.aclose()
+        # frames() never started if the client was already gone; close the source anyway
+        await response.events.aclose()
+    return keep_alive
+
+
+class AsyncServer:
+    """
+    Minimal HTTP/1.1 server (keep-alive, JSON bodies) with per-request
+    timeouts and a graceful drain on shutdown.
+    """
+
+    def __init__(self, host='', port=8080, request_timeout=120.0, drain_timeout=30.0, admission=None):
+        self.host = host or None
+        self.port = port
+        self.request_timeout = request_timeout
+        self.drain_timeout = drain_timeout
+        self.admission = admission
+        self._server = None
+        self._idle = set()
+        self._busy = set()
+        self._draining = False
+        self._stopped = None
+
+    async def start(self):
+        self._stopped = asyncio.Event()
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port, limit=MAX_HEADER_BYTES
+        )
+
+    async def serve_forever(self):
+        await self._stopped.wait()
+
+    def request_shutdown(self):
+        self._stopped.set()
+
+    async def shutdown(self):
+        """Stop accepting connections, let in-flight requests finish, then cancel stragglers"""
+        self._draining = True
+        self._stopped.set()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+        for task in list(self._idle):
+            task.cancel()
+
+        if self._busy:
+            print(f"Draining {len(self._busy)} in-flight request(s)...")
+            done, pending = await asyncio.wait(set(self._busy), timeout=self.drain_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        try:
+            while not self._draining:
+                self._idle.add(task)
+                try:
+                    request = await read_request(reader)
+                except BadRequest as e:
+                    await write_response(writer, Response(400, {'success': False, 'error': str(e)}), False)
+                    break
+                finally:
+                    self._idle.discard(task)
+                if request is None:
+                    break
+
+                self._busy.add(task)
+                started = time.perf_counter()
+                metrics.http_in_flight.inc()
+                status = None
+                try:
+                    status, keep_alive = await self._respond_unless_disconnected(request, reader, writer)
+                finally:
+                    self._busy.discard(task)
+                    metrics.http_in_flight.dec()
+                    if status is not None:
+                        path = metrics.route_label(request.path)
+                        metrics.http_requests.inc(method=request.method, path=path, status=str(status))
+                        metrics.http_request_seconds.observe(time.perf_counter() - started, path=path)
+                if not keep_alive:
+                    break
+        except (asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, request, writer):
+        """Dispatch one request and write the response; returns (status, keep_alive)"""
+        try:
+            response = await self.dispatch(request)
+        except Exception as e:
+            metrics.record_error(e)
+            print(f"❌ Unexpected error in {request.path}: {e}")
+            response = Response(500, {'success': False, 'error': f'Server error: {str(e)}'})
+        keep_alive = request.keep_alive and not self._draining
+        return response.status, await write_response(writer, response, keep_alive)
+
+    async def _respond_unless_disconnected(self, request, reader, writer):
+        """
+        _respond, cancelled if the client goes away first: the agent run, its pending
+        completion and tool calls are cancelled and the admission slot goes to the next request
+        """
+        responding = asyncio.create_task(self._respond(request, writer))
+        watching = asyncio.create_task(wait_for_disconnect(reader))
+        try:
+            await asyncio.wait({responding, watching}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            watching.cancel()
+            responding.cancel()
+            await asyncio.gather(responding, watching, return_exceptions=True)
+        if responding.cancelled():
+            metrics.record_error('client_disconnect')
+            return CLIENT_CLOSED, False
+        return responding.result()
+
+    async def dispatch(self, request):
+        if request.method == 'OPTIONS':
+            return Response(200, headers={
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Request-Timeout',
+            })
+
+        if request.method == 'GET':
+            if request.path == '/health':
+                return Response(200, health(self.admission))
+            if request.path == '/metrics':
+                return Response(200, headers={'Content-Type': metrics.CONTENT_TYPE},
+                                body=metrics.render().encode('utf-8'))
+            if request.path == '/calculate' and '?' in request.target:
+                if 'expression' not in request.query:
+                    return Response(400, {'success': False, 'error': 'Missing expression'})
+                return await self.calculate(request.query['expression'][0], use_cache(request.query),
+                                            parse_priority(request.query), self.timeout(request, request.query),
+                                            session_id_of(request.query))
+            if request.path == '/calculate/stream':
+                if 'expression' not in request.query:
+                    return Response(400, {'success': False, 'error': 'Missing expression'})
+                return await self.stream(request.query['expression'][0], use_cache(request.query),
+                                         parse_priority(request.query), self.timeout(request, request.query),
+                                         session_id_of(request.query))
+
+        if request.method == 'POST':
+            if request.path == '/calculate':
+                try:
+                    data = request.json()
+                except ValueError:
+                    return Response(400, {'success': False, 'error': 'Invalid JSON'})
+                if 'expression' not in data:
+                    return Response(400, {'success': False, 'error': 'Missing expression'})
+                return await self.calculate(data['expression'], use_cache(data), parse_priority(data),
+                                            self.timeout(request, data), session_id_of(data))
+            if request.path == '/calculate/stream':
+                try:
+                    data = request.json()
+                except ValueError:
+                    return Response(400, {'success': False, 'error': 'Invalid JSON'})
+                if 'expression' not in data:
+                    return Response(400, {'success': False, 'error': 'Missing expression'})
+                return await self.stream(data['expression'], use_cache(data), parse_priority(data),
+                                         self.timeout(request, data), session_id_of(data))
+            if request.path == '/calculate/batch':
+                try:
+                    data = request.json()
+                except ValueError:
+                    return Response(400, {'success': False, 'error': 'Invalid JSON'})
+                try:
+                    expressions, concurrency, stream = parse_batch(data)
+                except ValueError as e:
+                    return Response(400, {'success': False, 'error': str(e)})
+                return await self.batch(expressions, concurrency, stream, use_cache(data), parse_priority(data),
+                                        self.timeout(request, data))
+            if request.path == '/save-api-key':
+                try:
+                    data = request.json()
+                except ValueError:
+                    return Response(400, {'success': False, 'error': 'Invalid JSON'})
+                payload, status = save_api_key(data)
+                if status == 200:
+                    # Swap the key into the running agent in the background; /health reports the outcome
+                    payload['reload'] = await start_reload()
+                return Response(status, payload)
+            if request.path == '/reload':
+                payload, status = await reload_backend()
+                return Response(status, payload)
+            if request.path == '/verify-api-key':
+                try:
+                    data = request.json()
+                except ValueError:
+                    return Response(400, {'success': False, 'error': 'Invalid JSON'})
+                payload, status = await check_api_key(data)
+                return Response(status, payload)
+
+        return Response(404, {'success': False, 'error': 'Not found'})
+
+    async def backend(self):
+        """(message module, None) once warm-up has imported it, else (None, error response)"""
+        try:
+            backend = await warmup.wait_async(self.request_timeout)
+        except RuntimeError as e:
+            return None, Response(503, {'success': False, 'error': str(e)})
+        if backend is None:
+            return None, Response(503, {'success': False, 'error': 'Backend is still starting'})
+        return backend, None
+
+    def timeout(self, request, options):
+        return client_timeout(options, request.headers.get('x-request-timeout'), self.request_timeout)
+
+    def slot(self, priority):
+        """Admission slot for one agent request (raises Rejected when saturated)"""
+        if self.admission is None:
+            return contextlib.nullcontext()
+        return self.admission.slot(priority)
+
+    async def stream(self, expression, cache=True, priority=None, timeout=None, session_id=None):
+        timeout = timeout or self.request_timeout
+        backend, error = await self.backend()
+        if error is not None:
+            return error
+        if self.admission is None:
+            return StreamResponse(backend.stream_message(expression, cache, session_id), timeout)
+        try:
+            await self.admission.acquire(priority)
+        except Rejected as e:
+            return busy_response(e)
+        events = self.admission.release_after(backend.stream_message(expression, cache, session_id))
+        return StreamResponse(events, timeout)
+
+    async def calculate(self, expression, cache=True, priority=None, timeout=None, session_id=None):
+        timeout = timeout or self.request_timeout
+        backend, error = await self.backend()
+        if error is not None:
+            return error
+        try:
+            async with self.slot(priority):
+                answer = await asyncio.wait_for(backend.handle_message(expression, cache, session_id), timeout)
+        except Rejected as e:
+            return busy_response(e)
+        except asyncio.TimeoutError:
+            metrics.record_error('timeout')
+            return Response(504, {'success': False, 'error': f'Request timed out after {timeout:g}s'})
+        except Exception as e:
+            print(f"❌ Error processing message: {e}")
+            return Response(500, {'success': False, 'error': f'Server error: {str(e)}'})
+        return Response(200, {'success': True, **answer})
+
+    async def batch(self, expressions, concurrency, stream=False, cache=True, priority=None, timeout=None):
+        """Run a batch; the timeout applies to each item rather than the whole batch"""
+        timeout = timeout or self.request_timeout
+        backend, error = await self.backend()
+        if error is not None:
+            return error
+        # Every item takes its own admission slot, so a batch cannot starve single requests
+        admit = None if self.admission is None else lambda: self.admission.slot(priority)
+        if stream:
+            return StreamResponse(backend.stream_batch(expressions, concurrency, cache, timeout, admit))
+        answer = await backend.handle_batch(expressions, concurrency, cache, timeout, admit)
+        return Response(200, {'success': True, **answer})
+
+
+async def serve(port, request_timeout=120.0, drain_timeout=30.0):
+    server = AsyncServer(port=port, request_timeout=request_timeout, drain_timeout=drain_timeout,
+                         admission=admission_from_env())
+    await server.start()
+
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, server.request_shutdown)
+    except NotImplementedError:
+        pass  # Windows: Ctrl+C still cancels the main task
+
+    # The port is already bound; load the agent stack without blocking requests
+    warmup_task = asyncio.create_task(warm_up_async())
+
+    try:
+        await server.serve_forever()
+    except asyncio.CancelledError:
+        print("\nServer stopped by user")
+    finally:
+        await server.shutdown()
+        await asyncio.gather(warmup_task, return_exceptions=True)
+        if warmup.backend is not None:
+            await warmup.backend.runtime.stop()
+        await key_verifier.aclose()
+        print("Agent runtime stopped")
+
+
+def run_server(port, **options):
+    try:
+        asyncio.run(serve(port, **options))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,176 @@
+"""
+Stand-ins for OpenAI and the MCP servers, used by benchmark.py.
+
+StubOpenAIServer speaks just enough of the chat completions API for
+OpenAIAugmentedLLM (and answers GET /models/<id> for key verification; keys
+containing "invalid" are refused) and follows the windows_assistant recipe: for an open/close
+request it calls the search tool, then the command tool, then answers; anything
+else is answered right away. make_fake_tools() returns in-process replacements
+for the everything-search, mcp-server-commands and fetch tools. Every
+completion and tool call sleeps for a configurable latency so runs are
+repeatable without a network or API key.
+"""
+
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ACTION_REQUEST = re.compile(r'^\s*(?:please\s+)?(?:open|launch|start|run|close|quit|kill)\b', re.IGNORECASE)
+
+
+def jittered(latency, jitter):
+    return max(0.0, latency + random.uniform(-jitter, jitter)) if jitter else latency
+
+
+class StubOpenAIServer:
+    """OpenAI-compatible /v1/chat/completions endpoint with scripted tool calls"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.5, jitter=0.0, model='gpt-4o'):
+        self.latency = latency
+        self.jitter = jitter
+        self.model = model
+        self.completions = 0
+        self.model_lookups = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fixr-stub-openai', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def complete(self, request):
+        """Response body for one chat completion request"""
+        with self._lock:
+            self.completions += 1
+            n = self.completions
+        time.sleep(jittered(self.latency, self.jitter))
+
+        messages = request.get('messages', [])
+        tools = [tool['function']['name'] for tool in request.get('tools') or []]
+        last_user = max((i for i, m in enumerate(messages) if m.get('role') == 'user'), default=-1)
+        text = messages[last_user].get('content', '') if last_user >= 0 else ''
+        if isinstance(text, list):
+            text = ' '.join(part.get('text', '') for part in text if isinstance(part, dict))
+        tool_results = sum(1 for m in messages[last_user + 1:] if m.get('role') == 'tool')
+
+        call = None
+        if ACTION_REQUEST.match(text):
+            search = next((t for t in tools if 'search' in t), None)
+            command = next((t for t in tools if 'command' in t), None)
+            if tool_results == 0 and search:
+                call = (search, {'base': {'query': text.split(None, 1)[-1], 'max_results': 10}}
+                        if search.endswith('everything-search_search') else {'query': text.split(None, 1)[-1]})
+            elif tool_results <= 1 and command:
+                call = (command, {'command': 'echo ok'})
+
+        if call is not None:
+            message = {
+                'role': 'assistant',
+                'content': None,
+                'tool_calls': [{
+                    'id': f'call_{n}',
+                    'type': 'function',
+                    'function': {'name': call[0], 'arguments': json.dumps(call[1])},
+                }],
+            }
+            finish_reason = 'tool_calls'
+        else:
+            message = {'role': 'assistant', 'content': f'Done: {text}'}
+            finish_reason = 'stop'
+
+        return {
+            'id': f'chatcmpl-stub-{n}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model') or self.model,
+            'choices': [{'index': 0, 'message': message, 'finish_reason': finish_reason, 'logprobs': None}],
+            'usage': {'prompt_tokens': 100, 'completion_tokens': 20, 'total_tokens': 120},
+        }
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                path = self.path.rstrip('/')
+                if '/models/' not in path:
+                    self.send_json({'error': {'message': f'Unsupported endpoint {self.path}'}}, 404)
+                    return
+                with stub._lock:
+                    stub.model_lookups += 1
+                time.sleep(jittered(stub.latency, stub.jitter))
+                if 'invalid' in self.headers.get('Authorization', ''):
+                    self.send_json({'error': {'message': 'Incorrect API key provided', 'code': 'invalid_api_key'}}, 401)
+                    return
+                model = path.rsplit('/', 1)[-1]
+                self.send_json({'id': model, 'object': 'model', 'created': 0, 'owned_by': 'stub'})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    request = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    self.send_json({'error': {'message': 'Invalid JSON'}}, 400)
+                    return
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self.send_json({'error': {'message': f'Unsupported endpoint {self.path}'}}, 404)
+                    return
+                self.send_json(stub.complete(request))
+
+            def send_json(self, payload, status=200):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def make_fake_tools(search_latency=0.05, command_latency=0.1, fetch_latency=0.3, jitter=0.0):
+    """In-process replacements for the search, run_command and fetch MCP tools"""
+
+    async def search(query: str, max_results: int = 100) -> str:
+        """Search for files and folders by name"""
+        await asyncio.sleep(jittered(search_latency, jitter))
+        name = query.strip().replace(' ', '') or 'app'
+        return (
+            f"Path: C:\\Users\\bench\\AppData\\Roaming\\Microsoft\\Windows\\Start Menu\\Programs\\{name}.lnk\n"
+            f"Filename: {name}.lnk\n"
+            f"Size: 2,048 bytes\n"
+            f"Modified: 2024-01-01T00:00:00\n"
+        )
+
+    async def run_command(command: str) -> str:
+        """Run a shell command"""
+        await asyncio.sleep(jittered(command_latency, jitter))
+        return ""
+
+    async def fetch(url: str) -> str:
+        """Fetch a URL and return its content"""
+        await asyncio.sleep(jittered(fetch_latency, jitter))
+        return f"Contents of {url}"
+
+    return [search, run_command, fetch]
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for process_message and the HTTP server.
+
+Runs the real agent stack (MCPApp, FixrAgent, FixrOpenAIAugmentedLLM, the
+request path in message.py and the server front ends) against the stubs in
+bench_stubs.py: a local OpenAI-compatible server and in-process fake search,
+command and fetch tools with configurable latencies. Needs no API key, uvx or
+npx. Reports cold start, warm p50/p95/p99 and throughput, and writes them as
+JSON so runs can be compared across versions:
+
+    python benchmark.py --requests 50 --concurrency 8 --output bench.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Benchmark the agent path itself: no fast path, response cache or local indexes
+os.environ['FIXR_FAST_PATH'] = '0'
+os.environ['FIXR_RESPONSE_CACHE'] = '0'
+os.environ['FIXR_SEARCH_BACKEND'] = 'everything'
+os.environ['FIXR_APP_INDEX'] = '0'
+
+from mcp_agent.app import MCPApp
+from mcp_agent.config import Settings, LoggerSettings, MCPSettings, OpenAISettings
+
+import message
+import metrics
+import startup
+from bench_stubs import StubOpenAIServer, make_fake_tools
+from fixr_agent import FixrAgent
+from llm import FixrOpenAIAugmentedLLM
+from runtime import AgentRuntime
+
+DEFAULT_MESSAGES = ["Open Discord", "Close Discord", "Open notepad", "How do I fix my WiFi?"]
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(latencies, wall_seconds, errors):
+    return {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+        'max_ms': round(max(latencies) * 1000, 2) if latencies else None,
+        'throughput_rps': round(len(latencies) / wall_seconds, 2) if wall_seconds else None,
+        'wall_seconds': round(wall_seconds, 3),
+    }
+
+
+def make_runtime(args, stub):
+    settings = Settings(
+        execution_engine="asyncio",
+        logger=LoggerSettings(type="none", level="error"),
+        mcp=MCPSettings(servers={}),
+        openai=OpenAISettings(api_key="sk-bench", base_url=stub.base_url, default_model=stub.model),
+    )
+    tools = make_fake_tools(args.search_latency, args.command_latency, args.fetch_latency, args.jitter)
+
+    def build_agent():
+        return FixrAgent(
+            name="windows_assistant",
+            instruction=message.token_budget.compact_instruction(message.INSTRUCTION),
+            server_names=[],
+            functions=tools,
+            search_cache=message.search_cache if args.search_cache else None,
+            token_budget=message.token_budget,
+        )
+
+    return AgentRuntime(MCPApp(name="fixr-bench", settings=settings), build_agent,
+                        llm_class=FixrOpenAIAugmentedLLM)
+
+
+def request_messages(args, n):
+    return [args.message[i % len(args.message)] for i in range(n)]
+
+
+# process_message, called directly
+
+async def bench_direct(args, stub):
+    message.runtime = make_runtime(args, stub)
+    try:
+        started = time.perf_counter()
+        await message.process_message(args.message[0])
+        cold = time.perf_counter() - started
+
+        for text in request_messages(args, args.warmup):
+            await message.process_message(text)
+
+        latencies, errors = [], 0
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one(text):
+            nonlocal errors
+            async with semaphore:
+                t0 = time.perf_counter()
+                try:
+                    await message.process_message(text)
+                except Exception as e:
+                    errors += 1
+                    print(f"❌ {e}", file=sys.stderr)
+                    return
+                latencies.append(time.perf_counter() - t0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(text) for text in request_messages(args, args.requests)))
+        wall = time.perf_counter() - started
+        return {'cold_start_ms': round(cold * 1000, 2), **summarize(latencies, wall, errors)}
+    finally:
+        await message.runtime.stop()
+
+
+# The HTTP server, end to end
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def post_calculate(port, text, timeout):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        conn.request('POST', '/calculate', json.dumps({'expression': text}),
+                     {'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        body = response.read()
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}: {body[:200]!r}")
+    finally:
+        conn.close()
+
+
+def start_http_server(args, port):
+    """Start the chosen front end in background threads; returns a stop function"""
+    if args.server == 'async':
+        import async_server
+
+        loop = asyncio.new_event_loop()
+        server = async_server.AsyncServer('127.0.0.1', port, request_timeout=args.timeout)
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        asyncio.run_coroutine_threadsafe(server.start(), loop).result()
+
+        def stop():
+            asyncio.run_coroutine_threadsafe(server.shutdown(), loop).result()
+            asyncio.run_coroutine_threadsafe(message.runtime.stop(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+        return stop
+
+    import server
+
+    server.ServerHandler.request_timeout = args.timeout
+    server.ServerHandler.log_message = lambda *a: None
+    httpd = server.ThreadingHTTPServer(('127.0.0.1', port), server.ServerHandler)
+    httpd.daemon_threads = True
+    if not server.agent_loop.is_running():
+        threading.Thread(target=server.agent_loop.run_forever, daemon=True).start()
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    def stop():
+        httpd.shutdown()
+        httpd.server_close()
+        server.run_async(message.runtime.stop())
+    return stop
+
+
+def bench_http(args, stub):
+    message.runtime = make_runtime(args, stub)
+    # message is already imported; let the front ends use it without a warm-up phase
+    startup.warmup.load()
+    port = free_port()
+    started = time.perf_counter()
+    stop = start_http_server(args, port)
+    try:
+        post_calculate(port, args.message[0], args.timeout)
+        cold = time.perf_counter() - started
+
+        for text in request_messages(args, args.warmup):
+            post_calculate(port, text, args.timeout)
+
+        latencies, errors = [], 0
+
+        def one(text):
+            t0 = time.perf_counter()
+            post_calculate(port, text, args.timeout)
+            return time.perf_counter() - t0
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            futures = [pool.submit(one, text) for text in request_messages(args, args.requests)]
+            for future in futures:
+                try:
+                    latencies.append(future.result())
+                except Exception as e:
+                    errors += 1
+                    print(f"❌ {e}", file=sys.stderr)
+        wall = time.perf_counter() - started
+    finally:
+        stop()
+    return {'server': args.server, 'cold_start_ms': round(cold * 1000, 2), **summarize(latencies, wall, errors)}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='FIXR offline benchmark (stub LLM and MCP tools)')
+    parser.add_argument('--mode', choices=['direct', 'http', 'all'], default='all')
+    parser.add_argument('--server', choices=['threaded', 'async'], default='async',
+                        help='Front end used by the http mode')
+    parser.add_argument('--requests', type=int, default=50, help='Measured requests per mode')
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--message', action='append', help='Request text (repeat for a mix)')
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='Seconds per chat completion')
+    parser.add_argument('--search-latency', type=float, default=0.05)
+    parser.add_argument('--command-latency', type=float, default=0.1)
+    parser.add_argument('--fetch-latency', type=float, default=0.3)
+    parser.add_argument('--jitter', type=float, default=0.0, help='+/- seconds added to every latency')
+    parser.add_argument('--search-cache', action='store_true', help='Keep the search result cache on')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--output', default='benchmark-results.json')
+    args = parser.parse_args(argv)
+    args.message = args.message or DEFAULT_MESSAGES
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stub = StubOpenAIServer(latency=args.llm_latency, jitter=args.jitter).start()
+    results = {}
+    try:
+        if args.mode in ('direct', 'all'):
+            results['direct'] = asyncio.run(bench_direct(args, stub))
+            print(f"✅ process_message: {results['direct']}")
+        if args.mode in ('http', 'all'):
+            results['http'] = bench_http(args, stub)
+            print(f"✅ HTTP ({args.server}): {results['http']}")
+    finally:
+        stub.stop()
+
+    report = {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'llm_completions': stub.completions,
+        'results': results,
+        'stages': {stage: {'count': count, 'total_seconds': round(total, 4)}
+                   for stage, (count, total) in metrics.stage_totals().items()},
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return report
+
+
+if __name__ == '__main__':
+    main()
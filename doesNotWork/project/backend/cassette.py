@@ -0,0 +1,249 @@
+"""
+Record/replay of OpenAI chat completions and MCP tool calls.
+
+With FIXR_CASSETTE=<file> and FIXR_CASSETTE_MODE=record, every chat completion
+goes through a local proxy that forwards it to OpenAI and appends the
+request/response pair to the cassette (JSON lines), and FixrAgent appends every
+list_tools/call_tool result. With FIXR_CASSETTE_MODE=replay the proxy answers
+from the cassette and the agent returns the recorded tool results, so a run
+repeats exactly with no network, no API key and no MCP servers.
+FIXR_CASSETTE_LATENCY replays with the recorded latencies ("original", the
+default), none ("zero") or scaled by a factor (e.g. "0.5"). While recording,
+the proxy answers 504 when OpenAI does not answer within FIXR_CASSETTE_TIMEOUT
+seconds (600, the OpenAI client's own timeout).
+
+Interactions are matched on a hash of the request (chat body, tool name and
+arguments); identical requests are answered in recorded order, and the last
+answer is reused once they run out so a cassette can be replayed in a loop.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_UPSTREAM = 'https://api.openai.com/v1'
+DEFAULT_TIMEOUT = 600.0
+FORWARDED_HEADERS = ('Authorization', 'Content-Type', 'OpenAI-Organization', 'OpenAI-Project', 'User-Agent')
+
+
+class CassetteMiss(LookupError):
+    pass
+
+
+def request_key(*parts):
+    canonical = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def to_json(result):
+    if hasattr(result, 'model_dump'):
+        return result.model_dump(mode='json', by_alias=True, exclude_none=True)
+    return result
+
+
+class Cassette:
+    def __init__(self, path, mode='replay', latency_scale=1.0, upstream=None, timeout=DEFAULT_TIMEOUT):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Cassette mode must be 'record' or 'replay', not {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.timeout = timeout
+        self.upstream = (upstream or os.environ.get('FIXR_CASSETTE_UPSTREAM')
+                         or os.environ.get('OPENAI_BASE_URL') or DEFAULT_UPSTREAM).rstrip('/')
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._interactions = {}   # (kind, key) -> [interaction]
+        self._positions = {}      # (kind, key) -> next index
+        self._proxy = None
+        if self.replaying:
+            self.load()
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            open(path, 'w').close()
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    # Storage
+
+    def load(self):
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    interaction = json.loads(line)
+                    self._interactions.setdefault((interaction['kind'], interaction['key']), []).append(interaction)
+
+    def record(self, kind, key, elapsed, **fields):
+        line = json.dumps({'kind': kind, 'key': key, 'elapsed': round(elapsed, 6), **fields})
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+            self.recorded += 1
+
+    def lookup(self, kind, key, description):
+        """Next recorded interaction for a request (the last one again once they run out)"""
+        with self._lock:
+            interactions = self._interactions.get((kind, key))
+            if not interactions:
+                self.misses += 1
+                raise CassetteMiss(f"No recorded {kind} for {description} in {self.path}")
+            position = self._positions.get((kind, key), 0)
+            self._positions[(kind, key)] = position + 1
+            self.replayed += 1
+            return interactions[min(position, len(interactions) - 1)]
+
+    def delay(self, interaction):
+        return interaction['elapsed'] * self.latency_scale
+
+    # Chat completions (through the proxy)
+
+    def start(self, host='127.0.0.1', port=0):
+        """Start the proxy and point the OpenAI client at it"""
+        self._proxy = ThreadingHTTPServer((host, port), self._handler_class())
+        self._proxy.daemon_threads = True
+        threading.Thread(target=self._proxy.serve_forever, name='fixr-cassette', daemon=True).start()
+        os.environ['OPENAI_BASE_URL'] = self.base_url
+        if self.replaying:
+            # The client refuses to start without a key; replay never sends it anywhere
+            os.environ.setdefault('OPENAI_API_KEY', 'sk-cassette-replay')
+        return self
+
+    def stop(self):
+        if self._proxy is not None:
+            self._proxy.shutdown()
+            self._proxy.server_close()
+            self._proxy = None
+
+    @property
+    def base_url(self):
+        host, port = self._proxy.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def chat(self, path, body, headers):
+        """(status, response body) for one request to the OpenAI API"""
+        request = json.loads(body or b'{}')
+        key = request_key(path, request)
+        if self.replaying:
+            interaction = self.lookup('chat', key, f"{path} (model {request.get('model')})")
+            time.sleep(self.delay(interaction))
+            return interaction['status'], json.dumps(interaction['response']).encode('utf-8')
+
+        started = time.perf_counter()
+        upstream = urllib.request.Request(self.upstream + path[len('/v1'):] if path.startswith('/v1') else self.upstream + path,
+                                          data=body, method='POST',
+                                          headers={name: headers[name] for name in FORWARDED_HEADERS if headers.get(name)})
+        try:
+            with urllib.request.urlopen(upstream, timeout=self.timeout) as response:
+                status, payload = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, payload = e.code, e.read()
+        except urllib.error.URLError as e:
+            if isinstance(e.reason, TimeoutError):
+                raise e.reason  # timed out connecting
+            raise
+        try:
+            recorded = json.loads(payload)
+        except ValueError:
+            recorded = {'error': {'message': payload.decode('utf-8', 'replace')}}
+        self.record('chat', key, time.perf_counter() - started, path=path, request=request,
+                    status=status, response=recorded)
+        return status, payload
+
+    def _handler_class(self):
+        cassette = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                try:
+                    status, payload = cassette.chat(self.path, body, self.headers)
+                except CassetteMiss as e:
+                    status, payload = 404, json.dumps({'error': {'message': str(e), 'type': 'cassette_miss'}}).encode('utf-8')
+                except TimeoutError:
+                    message = f'Cassette proxy: no answer from {cassette.upstream} within {cassette.timeout:g}s'
+                    status, payload = 504, json.dumps({'error': {'message': message, 'type': 'timeout'}}).encode('utf-8')
+                except (OSError, ValueError) as e:
+                    status, payload = 502, json.dumps({'error': {'message': f'Cassette proxy error: {e}'}}).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    # MCP tools (through FixrAgent)
+
+    async def list_tools(self, fetch, server_name=None):
+        key = request_key('list_tools', server_name)
+        if self.replaying:
+            from mcp.types import ListToolsResult
+
+            interaction = self.lookup('list_tools', key, f"list_tools({server_name or ''})")
+            return ListToolsResult.model_validate(interaction['result'])
+        started = time.perf_counter()
+        result = await fetch()
+        self.record('list_tools', key, time.perf_counter() - started, server_name=server_name,
+                    result=to_json(result))
+        return result
+
+    async def call_tool(self, call, name, arguments=None, server_name=None):
+        key = request_key('call_tool', name, arguments or {}, server_name)
+        if self.replaying:
+            from mcp.types import CallToolResult
+
+            interaction = self.lookup('call_tool', key, f"tool {name}")
+            await asyncio.sleep(self.delay(interaction))
+            return CallToolResult.model_validate(interaction['result'])
+        started = time.perf_counter()
+        result = await call()
+        self.record('call_tool', key, time.perf_counter() - started, name=name, arguments=arguments,
+                    server_name=server_name, result=to_json(result))
+        return result
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'mode': self.mode,
+            'latency_scale': self.latency_scale,
+            'recorded': self.recorded,
+            'replayed': self.replayed,
+            'misses': self.misses,
+        }
+
+
+def parse_latency(value):
+    if value in (None, '', 'original'):
+        return 1.0
+    if value == 'zero':
+        return 0.0
+    return float(value)
+
+
+def from_env():
+    """The cassette configured by FIXR_CASSETTE / FIXR_CASSETTE_MODE, started, or None"""
+    path = os.environ.get('FIXR_CASSETTE')
+    if not path:
+        return None
+    cassette = Cassette(
+        path,
+        mode=os.environ.get('FIXR_CASSETTE_MODE', 'replay'),
+        latency_scale=parse_latency(os.environ.get('FIXR_CASSETTE_LATENCY')),
+        timeout=float(os.environ.get('FIXR_CASSETTE_TIMEOUT', DEFAULT_TIMEOUT)),
+    )
+    return cassette.start()
@@ -0,0 +1,66 @@
+"""
+Reading and atomically updating the backend's .env file.
+
+Updates are written to a temporary file in the same directory, flushed to disk
+and renamed over .env, so a crash or a concurrent reader never sees a
+half-written file. Other lines (comments, other variables) are kept as they are.
+"""
+
+import os
+import tempfile
+
+ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+
+
+def read_env(path=ENV_PATH):
+    """{NAME: value} for the NAME=value lines of a .env file ({} if it does not exist)"""
+    values = {}
+    try:
+        with open(path, 'r') as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return values
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+        name, _, value = line.partition('=')
+        name = name.strip()
+        if name.startswith('export '):
+            name = name[len('export '):].strip()
+        values[name] = value.strip().strip('"\'')
+    return values
+
+
+def update_env(updates, path=ENV_PATH):
+    """Set NAME=value for each of updates, replacing existing lines in place or appending"""
+    lines = []
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            lines = f.readlines()
+    if lines and not lines[-1].endswith('\n'):
+        lines[-1] += '\n'
+
+    pending = dict(updates)
+    for i, line in enumerate(lines):
+        name = line.strip().partition('=')[0].strip()
+        if name in pending:
+            lines[i] = f'{name}={pending.pop(name)}\n'
+    lines.extend(f'{name}={value}\n' for name, value in pending.items())
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.env.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
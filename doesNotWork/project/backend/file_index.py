@@ -0,0 +1,375 @@
+"""
+Local filename index: a cross-platform stand-in for everything-search.
+
+Names of every file and folder under the configured roots are kept in a
+trigram index, so substring and glob queries only look at entries that share
+the query's rarest trigram instead of scanning millions of paths. The index is
+built by a background crawl, kept current by polling directory mtimes (a
+directory's mtime changes whenever an entry is added, removed or renamed in
+it) and persisted to disk so a restart can answer queries right away.
+"""
+
+import fnmatch
+import os
+import pickle
+import re
+import threading
+import time
+from array import array
+
+FORMAT_VERSION = 1
+
+DEFAULT_EXCLUDES = ('/proc', '/sys', '/dev', '/run')
+SKIP_NAMES = ('.git', '__pycache__')
+
+WILDCARD = re.compile(r'[*?\[]')
+WILDCARD_PARTS = re.compile(r'\*|\?|\[[^\]]*\]')
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def literal_of(term):
+    """Longest wildcard-free run of a search term, used to pick candidate entries"""
+    return max(WILDCARD_PARTS.split(term), key=len)
+
+
+class FileIndex:
+    def __init__(self, roots, index_path=None, poll_interval=60.0,
+                 excludes=DEFAULT_EXCLUDES, skip_names=SKIP_NAMES):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.index_path = index_path
+        self.poll_interval = poll_interval
+        self.excludes = set(excludes)
+        self.skip_names = set(skip_names)
+        self.ready = threading.Event()
+        self.crawling = False
+        self.last_crawl_seconds = None
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._dirty = False
+        self._reset()
+
+    def _reset(self):
+        self.dirs = []                # dir id -> path
+        self.dir_mtimes = array('q')  # dir id -> mtime_ns at last scan, -1 once removed
+        self.dir_entries = []         # dir id -> array of entry ids directly inside it
+        self.entry_dir = array('I')   # entry id -> dir id
+        self.names = []               # entry id -> name
+        self.lower_names = []         # entry id -> lowercased name
+        self.deleted = set()          # entry ids of removed files
+        self.postings = {}            # trigram -> array of entry ids
+        self._dir_ids = {}
+
+    # Lifecycle
+
+    def start(self):
+        """Load the persisted index and start crawling/polling in a background thread"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='fixr-file-index', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._dirty:
+            self.save()
+
+    def _run(self):
+        if self.index_path and self.load():
+            self.ready.set()
+        else:
+            started = time.monotonic()
+            self.crawling = True
+            for root in self.roots:
+                self._crawl(root)
+            self.crawling = False
+            self.last_crawl_seconds = time.monotonic() - started
+            self.ready.set()
+            self.save()
+
+        # Catch up with changes made while we were not running, then keep polling
+        while True:
+            if self._poll():
+                self.save()
+            if self._stop.wait(self.poll_interval):
+                return
+
+    # Crawling and incremental updates
+
+    def _crawl(self, path):
+        pending = [path]
+        while pending and not self._stop.is_set():
+            pending.extend(self._scan_dir(pending.pop()))
+
+    def _scan_dir(self, path):
+        """(Re)scan one directory; returns subdirectories that are new to the index"""
+        if path in self.excludes:
+            return []
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            with os.scandir(path) as it:
+                listing = {}
+                for entry in it:
+                    if entry.name in self.skip_names:
+                        continue
+                    try:
+                        listing[entry.name] = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        continue
+        except OSError:
+            self._remove_dir(path)
+            return []
+
+        with self._lock:
+            dir_id = self._dir_ids.get(path)
+            if dir_id is None:
+                dir_id = len(self.dirs)
+                self._dir_ids[path] = dir_id
+                self.dirs.append(path)
+                self.dir_mtimes.append(mtime)
+                self.dir_entries.append(array('I'))
+            self.dir_mtimes[dir_id] = mtime
+
+            current = {}
+            for entry_id in self.dir_entries[dir_id]:
+                if entry_id not in self.deleted:
+                    current[self.names[entry_id]] = entry_id
+
+            for name, entry_id in current.items():
+                if name not in listing:
+                    self.deleted.add(entry_id)
+
+            new_dirs = []
+            for name, is_dir in listing.items():
+                if name in current:
+                    continue
+                self._add_entry(dir_id, name)
+                child = os.path.join(path, name)
+                # A directory removed earlier (mtime -1) is no longer polled, so a new one
+                # at the same path is crawled like any directory the index does not know
+                child_id = self._dir_ids.get(child)
+                if is_dir and (child_id is None or self.dir_mtimes[child_id] < 0):
+                    new_dirs.append(child)
+            self._dirty = True
+        return new_dirs
+
+    def _add_entry(self, dir_id, name):
+        entry_id = len(self.names)
+        lower = name.lower()
+        self.names.append(name)
+        self.lower_names.append(lower)
+        self.entry_dir.append(dir_id)
+        self.dir_entries[dir_id].append(entry_id)
+        for gram in trigrams(lower):
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = array('I')
+            posting.append(entry_id)
+
+    def _remove_dir(self, path):
+        with self._lock:
+            dir_id = self._dir_ids.get(path)
+            if dir_id is None or self.dir_mtimes[dir_id] < 0:
+                return
+            self.dir_mtimes[dir_id] = -1
+            self.deleted.update(self.dir_entries[dir_id])
+            self._dirty = True
+
+    def _poll(self):
+        """Rescan directories whose mtime changed; returns True if anything changed"""
+        changed = False
+        for dir_id in range(len(self.dirs)):
+            if self._stop.is_set():
+                break
+            recorded = self.dir_mtimes[dir_id]
+            if recorded < 0:
+                continue
+            path = self.dirs[dir_id]
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                self._remove_dir(path)
+                changed = True
+                continue
+            if mtime != recorded:
+                for child in self._scan_dir(path):
+                    self._crawl(child)
+                changed = True
+        return changed
+
+    # Queries
+
+    def path_of(self, entry_id):
+        return os.path.join(self.dirs[self.entry_dir[entry_id]], self.names[entry_id])
+
+    def _matcher(self, term, match_case, match_path, match_whole_word=False, match_regex=False):
+        if match_path:
+            target = self.path_of
+        elif match_case:
+            target = self.names.__getitem__
+        else:
+            target = self.lower_names.__getitem__
+        flags = 0 if match_case else re.IGNORECASE
+
+        if match_regex:
+            pattern = re.compile(term, flags)
+            return lambda entry_id: pattern.search(target(entry_id)) is not None
+        if WILDCARD.search(term):
+            pattern = re.compile(fnmatch.translate(term), flags)
+            return lambda entry_id: pattern.match(target(entry_id)) is not None
+        if match_whole_word:
+            pattern = re.compile(rf'(?<![^\W_]){re.escape(term)}(?![^\W_])', flags)
+            return lambda entry_id: pattern.search(target(entry_id)) is not None
+
+        if match_case:
+            return lambda entry_id: term in target(entry_id)
+        needle = term.lower()
+        if match_path:
+            return lambda entry_id: needle in target(entry_id).lower()
+        return lambda entry_id: needle in target(entry_id)
+
+    def _name_candidates(self, literal):
+        """Entries whose name contains the literal's rarest trigram (None if it has no trigram)"""
+        best = None
+        for gram in trigrams(literal.lower()):
+            posting = self.postings.get(gram)
+            if posting is None:
+                return ()
+            if best is None or len(posting) < len(best):
+                best = posting
+        return best
+
+    def _path_candidates(self, term):
+        """Entries in directories whose path contains the term, then entries whose name does"""
+        needle = term.lower()
+        matched_dirs = set()
+        for dir_id, path in enumerate(self.dirs):
+            if needle in path.lower():
+                matched_dirs.add(dir_id)
+                yield from self.dir_entries[dir_id]
+        names = self._name_candidates(needle)
+        for entry_id in range(len(self.names)) if names is None else names:
+            if self.entry_dir[entry_id] not in matched_dirs:
+                yield entry_id
+
+    def _candidates(self, terms, match_path, match_regex):
+        """Smallest set of entries that can match, or every entry if no term narrows it down"""
+        if match_regex:
+            return range(len(self.names))
+        if match_path:
+            plain = [term for term in terms
+                     if not WILDCARD.search(term) and '/' not in term and os.sep not in term]
+            if plain:
+                # Longer terms match fewer directories
+                return self._path_candidates(max(plain, key=len))
+            return range(len(self.names))
+        best = None
+        for term in terms:
+            posting = self._name_candidates(literal_of(term))
+            if posting is not None and (best is None or len(posting) < len(best)):
+                best = posting
+        return best if best is not None else range(len(self.names))
+
+    def search(self, query, max_results=100, match_path=False, match_case=False,
+               match_whole_word=False, match_regex=False):
+        """
+        Paths whose name contains every whitespace-separated term of the query.
+        Terms with * ? or [...] are globs matched against the whole name.
+        match_path matches against the full path instead of the name;
+        match_regex treats the whole query as one regular expression.
+        """
+        terms = [query] if match_regex else query.split()
+        if not terms or not terms[0]:
+            return []
+        matchers = [self._matcher(term, match_case, match_path, match_whole_word, match_regex)
+                    for term in terms]
+        results = []
+        with self._lock:
+            deleted = self.deleted
+            for entry_id in self._candidates(terms, match_path, match_regex):
+                if entry_id in deleted:
+                    continue
+                if all(match(entry_id) for match in matchers):
+                    results.append(self.path_of(entry_id))
+                    if len(results) >= max_results:
+                        break
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self.ready.is_set(),
+                'crawling': self.crawling,
+                'entries': len(self.names) - len(self.deleted),
+                'directories': len(self.dirs),
+                'roots': self.roots,
+                'last_crawl_seconds': self.last_crawl_seconds,
+            }
+
+    # Persistence
+
+    def save(self):
+        if not self.index_path:
+            return
+        with self._lock:
+            if len(self.deleted) > len(self.names) // 4:
+                self._compact()
+            state = {
+                'version': FORMAT_VERSION,
+                'roots': self.roots,
+                'dirs': self.dirs,
+                'dir_mtimes': self.dir_mtimes,
+                'dir_entries': self.dir_entries,
+                'entry_dir': self.entry_dir,
+                'names': self.names,
+                'lower_names': self.lower_names,
+                'deleted': self.deleted,
+                'postings': self.postings,
+            }
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            tmp_path = f'{self.index_path}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.index_path)
+            self._dirty = False
+
+    def load(self):
+        """Load the persisted index; returns False if there is none or it is stale"""
+        try:
+            with open(self.index_path, 'rb') as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            return False
+        if state.get('version') != FORMAT_VERSION or state.get('roots') != self.roots:
+            return False
+        with self._lock:
+            for key in ('dirs', 'dir_mtimes', 'dir_entries', 'entry_dir', 'names',
+                        'lower_names', 'deleted', 'postings'):
+                setattr(self, key, state[key])
+            self._dir_ids = {path: dir_id for dir_id, path in enumerate(self.dirs)}
+        return True
+
+    def _compact(self):
+        """Rebuild the index without deleted entries"""
+        old_dirs, old_mtimes = self.dirs, self.dir_mtimes
+        old_entry_dir, old_names, deleted = self.entry_dir, self.names, self.deleted
+        self._reset()
+        for dir_id, path in enumerate(old_dirs):
+            if old_mtimes[dir_id] < 0:
+                continue
+            self._dir_ids[path] = len(self.dirs)
+            self.dirs.append(path)
+            self.dir_mtimes.append(old_mtimes[dir_id])
+            self.dir_entries.append(array('I'))
+        for entry_id, name in enumerate(old_names):
+            if entry_id in deleted:
+                continue
+            dir_id = self._dir_ids.get(old_dirs[old_entry_dir[entry_id]])
+            if dir_id is not None:
+                self._add_entry(dir_id, name)
@@ -0,0 +1,279 @@
+"""
+Agent subclass that adds FIXR's tool-call layer on top of mcp_agent's Agent.
+"""
+
+import asyncio
+import contextlib
+import time
+
+from mcp.types import Tool
+from mcp_agent.agents.agent import Agent, AgentTasks
+from mcp_agent.core.context import get_current_context
+from mcp_agent.logging.logger import get_logger
+from mcp_agent.mcp.mcp_agent_client_session import MCPAgentClientSession
+from mcp_agent.mcp.mcp_aggregator import SEP, MCPAggregator, NamespacedTool
+
+from metrics import observe_stage, record_error, span, tool_call_seconds
+from server_selection import current as selected_servers
+from sessions import current as current_session
+from token_budget import current as current_budget, tool_tokens
+from tool_cache import dump_tools, fetch_tools
+
+logger = get_logger(__name__)
+
+
+def namespace_tools(server_name, tools):
+    return [NamespacedTool(tool=tool, server_name=server_name, namespaced_tool_name=f'{server_name}{SEP}{tool.name}')
+            for tool in tools]
+
+
+class CachedToolsAggregator(MCPAggregator):
+    """
+    MCPAggregator that indexes the tool lists it was given (from the tool cache)
+    the first time it loads, instead of asking the servers for them
+    """
+
+    def __init__(self, *args, tools, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cached_tools = tools  # server name -> [NamespacedTool]
+
+    async def load_servers(self, force: bool = False):
+        tools, self.cached_tools = self.cached_tools, None
+        if tools is None or force:
+            return await super().load_servers(force=force)
+        async with self._tool_map_lock:
+            self._namespaced_tool_map.clear()
+            self._server_to_tool_map.clear()
+            for name, server_tools in tools.items():
+                self._server_to_tool_map[name] = list(server_tools)
+                self._namespaced_tool_map.update((tool.namespaced_tool_name, tool) for tool in server_tools)
+        self.initialized = True
+
+
+class CachedToolsAgentTasks(AgentTasks):
+    """AgentTasks whose first aggregator for an agent starts from cached tool lists"""
+
+    def __init__(self, context, tools):
+        super().__init__(context)
+        self.cached_tools = tools
+
+    async def initialize_aggregator_task(self, request):
+        tools, self.cached_tools = self.cached_tools, None
+        if tools is not None and not request.force:
+            async with self.server_aggregators_for_agent_lock:
+                if request.agent_name not in self.server_aggregators_for_agent:
+                    self.server_aggregators_for_agent[request.agent_name] = CachedToolsAggregator(
+                        server_names=request.server_names,
+                        connection_persistence=request.connection_persistence,
+                        context=self.context,
+                        name=request.agent_name,
+                        tools=tools,
+                    )
+        return await super().initialize_aggregator_task(request)
+
+
+class FixrAgent(Agent):
+    """
+    Agent whose tool calls are timed, go through the search result cache and
+    are recorded to / replayed from a cassette when one is set. Within a
+    conversation session, repeated read-only calls are answered from the session.
+    With a tool cache, the servers' tool lists are taken from disk at startup and
+    checked against the servers in the background. At most tool_limits[server]
+    (default_tool_limit) calls run on one MCP server at a time; the rest wait in
+    the order they were made.
+    """
+
+    def __init__(self, *args, search_cache=None, cassette=None, token_budget=None, tool_cache=None,
+                 tool_limits=None, default_tool_limit=4, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.search_cache = search_cache
+        self.cassette = cassette
+        self.token_budget = token_budget
+        self.tool_cache = tool_cache
+        self.tool_limits = dict(tool_limits or {})
+        self.default_tool_limit = default_tool_limit
+        self._tool_slots = {}  # server name -> semaphore, created on the agent's loop
+        self._revalidation = None
+
+    async def initialize(self, force: bool = False):
+        if self.initialized and not force:
+            return
+        if self.cassette is not None and self.cassette.replaying:
+            # Tool lists and results come from the cassette: no aggregator, so no MCP server is started
+            self.initialized = True
+            return
+        if self.context is None:
+            # As Agent.initialize does; the server configurations are needed to find the cached lists
+            self.context = get_current_context()
+        listings = None
+        if self.tool_cache is not None and not force and self._agent_tasks is None:
+            listings = self._cached_tools()
+        if listings is not None:
+            # Requests start on the saved listing right away; the servers are asked again in the background
+            self._agent_tasks = CachedToolsAgentTasks(self.context, listings)
+            await super().initialize()
+            self._revalidation = asyncio.create_task(self.revalidate_tools())
+            return
+        # Connects to the servers and fetches their tool lists (list_tools)
+        with span('list_tools'):
+            await super().initialize(force=force)
+        if self.tool_cache is not None:
+            for name in self.server_names:
+                tools = [namespaced.tool for namespaced in self._server_to_tool_map.get(name, [])]
+                if tools:  # a server that failed to load is not cached as having no tools
+                    self.tool_cache.put(name, self._server_config(name), dump_tools(tools))
+
+    def _server_config(self, server_name):
+        return (getattr(self.context.server_registry, 'registry', None) or {}).get(server_name)
+
+    def _cached_tools(self):
+        """Cached tools of every server (server name -> [NamespacedTool]), or None unless every server has some"""
+        listings = {}
+        for name in self.server_names:
+            config = self._server_config(name)
+            listing = self.tool_cache.get(config) if config is not None else None
+            if listing is None:
+                return None
+            listings[name] = listing
+        try:
+            return {name: namespace_tools(name, [Tool.model_validate(tool) for tool in listing])
+                    for name, listing in listings.items()}
+        except ValueError:
+            return None
+
+    def _set_server_tools(self, server_name, tools):
+        """Replace a server's tools in the agent's index (no await in between, so requests see old or new)"""
+        namespaced = namespace_tools(server_name, tools)
+        for previous in self._server_to_tool_map.get(server_name, []):
+            self._namespaced_tool_map.pop(previous.namespaced_tool_name, None)
+        self._server_to_tool_map[server_name] = namespaced
+        self._namespaced_tool_map.update((tool.namespaced_tool_name, tool) for tool in namespaced)
+
+    async def revalidate_tools(self, server_names=None):
+        """Ask the servers for their tools again; returns the servers whose tools changed (now updated)"""
+        names = list(server_names or self.server_names)
+        results = await asyncio.gather(*(self._revalidate(name) for name in names), return_exceptions=True)
+        changed = []
+        for name, result in zip(names, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"{name}: Could not revalidate the cached tool list: {result}")
+            elif result:
+                changed.append(name)
+        if changed:
+            logger.info("Tool lists changed since they were cached", data={"servers": changed})
+        return changed
+
+    async def _revalidate(self, server_name):
+        server_conn = await self.context._mcp_connection_manager.get_server(
+            server_name, client_session_factory=MCPAgentClientSession)
+        tools = await fetch_tools(server_conn.session)
+        current = [namespaced.tool for namespaced in self._server_to_tool_map.get(server_name, [])]
+        changed = dump_tools(tools) != dump_tools(current)
+        if changed:
+            self._set_server_tools(server_name, tools)
+        if self.tool_cache is not None and tools:
+            self.tool_cache.put(server_name, self._server_config(server_name), dump_tools(tools))
+        return changed
+
+    async def shutdown(self):
+        if self._agent_tasks is None:
+            # Replayed from a cassette: there are no servers to shut down
+            self.initialized = False
+            return
+        await super().shutdown()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self._revalidation is not None and not self._revalidation.done():
+            self._revalidation.cancel()
+            await asyncio.gather(self._revalidation, return_exceptions=True)
+        return await super().__aexit__(exc_type, exc_val, exc_tb)
+
+    async def list_tools(self, server_name=None, **kwargs):
+        # kwargs: tool_filter and the like, which newer mcp_agent versions pass
+        if self.cassette is None:
+            result = await super().list_tools(server_name, **kwargs)
+        else:
+            result = await self.cassette.list_tools(
+                lambda: super(FixrAgent, self).list_tools(server_name, **kwargs), server_name)
+        if server_name is not None or not hasattr(result, 'tools'):
+            return result
+        tools = result.tools
+        selected = selected_servers()
+        if selected is not None:
+            # Only the tools of the servers selected for this request (plus in-process tools) go into the prompt
+            tools = [tool for tool in tools if self._tool_server(tool.name) in (None, *selected)]
+        if self.token_budget is not None:
+            tools = self.token_budget.compact_tools(tools)
+        budget = current_budget()
+        if budget is not None:
+            budget.set('tools', sum(tool_tokens(tool) for tool in tools))
+        if tools is result.tools:
+            return result
+        return result.model_copy(update={'tools': tools})
+
+    def _tool_server(self, tool_name):
+        """The MCP server a namespaced tool ("fetch_fetch") belongs to; None for in-process tools"""
+        namespaced = self._namespaced_tool_map.get(tool_name)
+        if namespaced is not None:
+            return namespaced.server_name
+        # Not indexed (replayed from a cassette): the longest server name the tool is namespaced with
+        owners = [name for name in self.server_names if tool_name.startswith(f'{name}{SEP}')]
+        return max(owners, key=len, default=None)
+
+    async def call_tool(self, name, arguments=None, server_name=None):
+        session = current_session()
+        if session is not None:
+            result = session.cached_result(name, arguments)
+            if result is not None:
+                session.record_tool(name, arguments, result)
+                return result
+        async with self._tool_slot(server_name or self._tool_server(name)):
+            result = await self._timed_call_tool(name, arguments, server_name)
+        if session is not None:
+            session.record_tool(name, arguments, result)
+        return result
+
+    @contextlib.asynccontextmanager
+    async def _tool_slot(self, server_name):
+        """One of the server's concurrent call slots (in-process tools are not limited)"""
+        if server_name is None:
+            yield
+            return
+        slots = self._tool_slots.get(server_name)
+        if slots is None:
+            slots = self._tool_slots[server_name] = asyncio.Semaphore(
+                self.tool_limits.get(server_name, self.default_tool_limit))
+        if slots.locked():
+            started = time.perf_counter()
+            async with slots:
+                observe_stage('tool_wait', time.perf_counter() - started)
+                yield
+        else:
+            async with slots:
+                yield
+
+    async def _timed_call_tool(self, name, arguments=None, server_name=None):
+        started = time.perf_counter()
+        if self.cassette is not None:
+            result = await self.cassette.call_tool(
+                lambda: self._call_tool(name, arguments, server_name), name, arguments, server_name)
+        else:
+            result = await self._call_tool(name, arguments, server_name)
+        elapsed = time.perf_counter() - started
+        observe_stage('tool_call', elapsed)
+        tool_call_seconds.observe(elapsed, tool=name)
+        if getattr(result, 'isError', False):
+            record_error('tool_error')
+        return result
+
+    async def _call_tool(self, name, arguments=None, server_name=None):
+        cache = self.search_cache
+        if cache is None or not cache.handles(name, server_name):
+            return await super().call_tool(name, arguments, server_name)
+
+        key = cache.make_key(name, arguments, server_name)
+        result = cache.get(key)
+        if result is None:
+            result = await super().call_tool(name, arguments, server_name)
+            cache.put(key, result)
+        return result
@@ -0,0 +1,184 @@
+"""
+Route logic shared by the threaded (server.py) and asyncio (async_server.py) front ends.
+Each handler takes the parsed request data and returns (payload, status).
+"""
+
+import asyncio
+import json
+import os
+import time
+
+import metrics
+from env_file import ENV_PATH, update_env
+from startup import warmup
+from verify_api_key import from_env as key_verifier_from_env
+
+# In-process key checks for /verify-api-key (the HTTP client is only created on first use)
+key_verifier = key_verifier_from_env()
+
+# POST /calculate/batch: requests run at once by default, and the limits per batch
+BATCH_CONCURRENCY = int(os.environ.get('FIXR_BATCH_CONCURRENCY', 4))
+BATCH_MAX_CONCURRENCY = int(os.environ.get('FIXR_BATCH_MAX_CONCURRENCY', 16))
+BATCH_MAX_SIZE = int(os.environ.get('FIXR_BATCH_MAX_SIZE', 100))
+
+# Seconds a reload waits for the backend to finish loading
+RELOAD_WAIT = 60.0
+
+
+def health(admission=None):
+    # Answered while the backend is still warming up; 'ready' says when the agent is
+    payload = {'status': 'healthy', 'ready': warmup.ready.is_set(), 'startup': warmup.status()}
+    if admission is not None:
+        payload['admission'] = admission.stats()
+    payload['key_verifier'] = key_verifier.stats()
+    payload['reload'] = reload_status()
+    backend = warmup.backend
+    if backend is None:
+        return payload
+    runtime = backend.runtime
+    payload['ready'] = runtime.running
+    payload['servers'] = runtime.pool.status() if runtime.pool else {}
+    payload['settings_generation'] = runtime.generation.number if runtime.generation else None
+    for name in ('response_cache', 'search_cache', 'file_index', 'app_index', 'cassette', 'log_pipeline',
+                 'session_store', 'tool_cache'):
+        component = getattr(backend, name)
+        if component is not None:
+            payload[name] = component.stats()
+    return payload
+
+
+def use_cache(options):
+    """False when the request asks to bypass the response cache (no_cache=true/1)"""
+    value = options.get('no_cache', False)
+    if isinstance(value, list):  # query string
+        value = value[0]
+    return str(value).lower() not in ('1', 'true', 'yes')
+
+
+def session_id_of(options):
+    """The conversation a request continues (session_id field / query parameter), or None"""
+    value = options.get('session_id')
+    if isinstance(value, list):  # query string
+        value = value[0]
+    return value
+
+
+def client_timeout(options, header=None, default=None):
+    """
+    Seconds a request may run: the client's own deadline (a timeout field / query
+    parameter, or the X-Request-Timeout header), capped by the server's default
+    """
+    value = options.get('timeout', header)
+    if isinstance(value, list):  # query string
+        value = value[0]
+    try:
+        timeout = float(value)
+    except (TypeError, ValueError):
+        return default
+    if not timeout > 0:
+        return default
+    return min(timeout, default) if default else timeout
+
+
+def parse_batch(data):
+    """(expressions, concurrency, stream) from a /calculate/batch body; ValueError if invalid"""
+    expressions = data.get('expressions') if isinstance(data, dict) else None
+    if not isinstance(expressions, list) or not expressions:
+        raise ValueError('Missing expressions (a non-empty list of strings)')
+    if not all(isinstance(expression, str) for expression in expressions):
+        raise ValueError('Every expression must be a string')
+    if len(expressions) > BATCH_MAX_SIZE:
+        raise ValueError(f'At most {BATCH_MAX_SIZE} expressions per batch')
+
+    concurrency = data.get('concurrency', BATCH_CONCURRENCY)
+    if isinstance(concurrency, bool) or not isinstance(concurrency, int) or concurrency < 1:
+        raise ValueError('concurrency must be a positive integer')
+    return expressions, min(concurrency, BATCH_MAX_CONCURRENCY), bool(data.get('stream', False))
+
+
+def save_api_key(data, env_path=ENV_PATH):
+    if 'api_key' not in data:
+        return {'success': False, 'error': 'Missing api_key'}, 400
+
+    api_key = data['api_key'].strip()
+
+    if not api_key:
+        return {'success': False, 'error': 'API key cannot be empty'}, 400
+
+    if not api_key.startswith('sk-'):
+        return {'success': False, 'error': 'Invalid API key format. OpenAI keys start with "sk-"'}, 400
+
+    try:
+        # Written to a temporary file and renamed over .env, never left half-written
+        update_env({'OPENAI_API_KEY': api_key}, env_path)
+        print(f"✅ API key saved to {env_path}")
+        return {'success': True, 'message': 'API key saved successfully'}, 200
+
+    except Exception as e:
+        print(f"❌ Error saving API key: {e}")
+        return {'success': False, 'error': f'Failed to save API key: {str(e)}'}, 500
+
+
+async def reload_backend():
+    """POST /reload (and after /save-api-key): apply .env and mcp_agent.config.yaml to the running agent"""
+    try:
+        # The message module may have read the old settings while warming up; wait and reload it
+        backend = await warmup.wait_async(RELOAD_WAIT)
+    except RuntimeError as e:
+        return {'success': False, 'error': str(e)}, 503
+    if backend is None:
+        return {'success': False, 'error': 'Backend is still starting'}, 503
+    try:
+        result = await backend.reload_config()
+    except Exception as e:
+        metrics.record_error(e)
+        print(f"❌ Error reloading settings: {e}")
+        return {'success': False, 'error': f'Failed to reload settings: {str(e)}'}, 500
+    return {'success': True, **result}, 200
+
+
+# The reload started by the last /save-api-key, reported by /health
+_background_reload = {'state': 'idle'}
+_background_task = None
+
+
+async def start_reload():
+    """
+    Start reload_backend() without waiting for it (restarting servers can take
+    longer than the client waits for /save-api-key); returns its state
+    """
+    global _background_reload, _background_task
+    state = _background_reload = {'state': 'running', 'started': time.time()}
+    _background_task = asyncio.get_running_loop().create_task(_reload_in_background(state))
+    return dict(state)
+
+
+async def _reload_in_background(state):
+    payload, status = await reload_backend()
+    state.update(state='done' if status == 200 else 'failed', result=payload, finished=time.time())
+
+
+def reload_status():
+    return dict(_background_reload)
+
+
+async def check_api_key(data, verifier=None):
+    """POST /verify-api-key: 200 with success true/false once OpenAI answered, 400/502 otherwise"""
+    verifier = verifier or key_verifier
+    api_key = data.get('api_key') if isinstance(data, dict) else None
+    if not isinstance(api_key, str):
+        return {'success': False, 'error': 'Missing api_key'}, 400
+
+    is_valid, message, details = await verifier.verify(api_key.strip())
+    if not is_valid and not details:
+        status = 400  # malformed key, OpenAI was not asked
+    elif details.get('error_type') in ('network_error', 'unknown_error'):
+        status = 502
+    else:
+        status = 200
+    return {'success': is_valid, 'message': message, 'details': details}, status
+
+
+def sse_frame(event, data):
+    """Encode one Server-Sent Events frame"""
+    return f'event: {event}\ndata: {json.dumps(data, default=str)}\n\n'.encode('utf-8')
@@ -0,0 +1,233 @@
+"""
+Deterministic fast path for "open X" / "close X" requests.
+
+The windows_assistant instruction describes a fixed recipe for these requests
+(search, execute, reply), so when a request clearly matches one of them the
+router runs that recipe directly with the agent's tools and skips the LLM.
+Anything it is not confident about, or cannot finish, goes to the full agent.
+"""
+
+import os
+import platform
+import re
+import shlex
+import subprocess
+
+from app_index import LAUNCHER_KINDS, launch_command, strip_extension
+from progress import emit
+from search_cache import extract_paths
+
+CONFIDENCE_THRESHOLD = 0.8
+
+POLITE_PREFIX = re.compile(r'^(?:please\s+|(?:can|could|would)\s+you\s+(?:please\s+)?)+')
+LAUNCH = re.compile(r'^(?:open|launch|start|run)\s+(?:up\s+)?(?:the\s+|my\s+)?(?:(?P<file>file)\s+|app\s+|application\s+|program\s+)?(?P<target>.+?)(?:\s+(?:app|application|program))?(?:\s+for me)?$')
+# Not "stop": "stop the music" is about what an app does, not the app
+CLOSE = re.compile(r'^(?:close|quit|exit|kill)\s+(?:the\s+|my\s+)?(?:app\s+|application\s+|program\s+)?(?P<target>.+?)(?:\s+(?:app|application|program))?(?:\s+for me)?$')
+FILE_EXTENSION = re.compile(r'\.[A-Za-z0-9]{1,5}$')
+EXECUTABLE_EXTENSIONS = ('.exe', '.com', '.bat', '.cmd', '.msi', '.ps1', '.vbs', '.scr', '.sh', '.run',
+                         '.appimage', '.jar')
+# "close it": only a conversation knows what that is (see sessions.py)
+PRONOUN = re.compile(r'^(?:it|that|this|them|those|these)(?:\s+(?:app|application|program|file|one))?$')
+# Names _close passes to taskkill/pkill; anything else is left to the agent
+PROCESS_NAME = re.compile(r'^\w[\w.-]*$')
+AMBIGUOUS = re.compile(r'\b(?:and|then|but|or|if|when|after|before|how|why|what|which|all|every)\b|[?,;]')
+
+# Process names for common apps whose name differs from what people call them
+PROCESS_ALIASES = {
+    'chrome': 'chrome', 'google chrome': 'chrome',
+    'edge': 'msedge', 'microsoft edge': 'msedge',
+    'firefox': 'firefox', 'mozilla firefox': 'firefox',
+    'vs code': 'code', 'vscode': 'code', 'visual studio code': 'code',
+    'word': 'winword', 'microsoft word': 'winword',
+    'excel': 'excel', 'microsoft excel': 'excel',
+    'powerpoint': 'powerpnt', 'microsoft powerpoint': 'powerpnt',
+    'teams': 'ms-teams', 'microsoft teams': 'ms-teams',
+    'file explorer': 'explorer', 'explorer': 'explorer',
+    'task manager': 'taskmgr',
+}
+
+
+class Intent:
+    def __init__(self, kind, target, confidence):
+        self.kind = kind          # 'launch', 'open_file' or 'close'
+        self.target = target
+        self.confidence = confidence
+
+    def to_dict(self):
+        return {'kind': self.kind, 'target': self.target, 'confidence': self.confidence}
+
+
+def classify(text):
+    """The Intent of a request, or None if it is not an open/close request"""
+    normalized = POLITE_PREFIX.sub('', ' '.join(text.lower().split()).strip(' .!'))
+
+    match = CLOSE.match(normalized)
+    kind = 'close'
+    if match is None:
+        match = LAUNCH.match(normalized)
+        if match is None:
+            return None
+        is_file = match.group('file') or FILE_EXTENSION.search(match.group('target'))
+        kind = 'open_file' if is_file else 'launch'
+
+    target = match.group('target').strip(' "\'')
+    confidence = 0.95
+    if AMBIGUOUS.search(target) or PRONOUN.match(target):
+        confidence = 0.3
+    elif len(target.split()) > 3:
+        confidence = 0.5
+    elif kind == 'close' and len(target.split()) > 1 and target not in PROCESS_ALIASES:
+        # Multi-word names rarely match a process name; let the agent figure it out
+        confidence = 0.6
+
+    if kind == 'open_file':
+        # Keep the original spelling of file names
+        original = re.search(re.escape(target), text, re.IGNORECASE)
+        if original:
+            target = original.group(0)
+    return Intent(kind, target, confidence)
+
+
+def rank_candidates(target, paths, extensions):
+    """
+    Paths whose name is or starts with the target, best first: exact name,
+    preferred extension, then shorter paths. Looser matches are left to the agent.
+    """
+    target = target.lower()
+    ranked = []
+    for path in paths:
+        stem, ext = os.path.splitext(os.path.basename(path))
+        if ext.lower() not in extensions or (not ext and not os.path.isfile(path)):
+            continue
+        stem = stem.lower()
+        if stem == target:
+            score = 0
+        elif stem.startswith(target):
+            score = 1
+        else:
+            continue
+        ranked.append((score, extensions.index(ext.lower()), len(path), path))
+    return [path for *_, path in sorted(ranked)]
+
+
+class IntentRouter:
+    """Runs recognised intents with the agent's search and command tools"""
+
+    def __init__(self, search_tool, command_tool='mcp-server-commands_run_command',
+                 system=None, threshold=CONFIDENCE_THRESHOLD, app_index=None):
+        self.search_tool = search_tool
+        self.command_tool = command_tool
+        self.system = system or platform.system()
+        self.threshold = threshold
+        self.app_index = app_index
+
+    async def try_handle(self, agent, text):
+        """Reply text if the request was handled on the fast path, else None"""
+        intent = classify(text)
+        if intent is None or intent.confidence < self.threshold:
+            return None
+        emit('route', route='fast_path', intent=intent.to_dict())
+
+        if intent.kind == 'close':
+            return await self._close(agent, intent.target)
+
+        if intent.kind == 'open_file' and os.path.splitext(intent.target)[1].lower() in EXECUTABLE_EXTENSIONS:
+            # Opening these runs them
+            emit('route', route='agent', reason='executable')
+            return None
+
+        if intent.kind == 'launch':
+            entry = self._known_app(intent.target)
+            if entry is not None:
+                ok, output = await self._run(agent, launch_command(entry, self.system))
+                if ok:
+                    return f"Opened {entry.name}."
+                return self._failed(output)
+
+        extensions = None if intent.kind == 'open_file' else self._launch_extensions()
+        paths = await self._search(agent, intent.target, extensions)
+        if not paths:
+            emit('route', route='agent', reason='no_match')
+            return None
+        target = paths[0]
+        ok, output = await self._run(agent, self._open_command(target, intent.kind))
+        name = os.path.splitext(os.path.basename(target))[0] if intent.kind == 'launch' else target
+        if ok:
+            return f"Opened {name}."
+        return self._failed(output)
+
+    @staticmethod
+    def _failed(output):
+        """None: the agent answers a request whose recipe failed (it may find another way)"""
+        emit('route', route='agent', reason='command_failed', output=output)
+        return None
+
+    def _launch_extensions(self):
+        # Launchers only: a bare executable (shutdown.exe, /usr/sbin/reboot) is never started without the LLM
+        if self.system == "Windows":
+            return ['.lnk']
+        if self.system == "Darwin":
+            return ['.app']
+        return ['.desktop']
+
+    async def _search(self, agent, target, extensions):
+        arguments = {'base': {'query': target, 'max_results': 50}}
+        emit('tool_start', id=None, tool=self.search_tool, arguments=arguments)
+        result = await agent.call_tool(self.search_tool, arguments)
+        emit('tool_end', id=None, tool=self.search_tool, is_error=bool(getattr(result, 'isError', False)))
+        if getattr(result, 'isError', False):
+            return []
+        paths = extract_paths(result)
+        if extensions is None:
+            # Opening a file: only exact file name matches are safe to run
+            base = os.path.basename(target).lower()
+            return [path for path in paths if os.path.basename(path).lower() == base]
+        return rank_candidates(target, paths, extensions)
+
+    def _open_command(self, path, kind):
+        if self.system == "Windows":
+            return f'start "" "{path}"'
+        if self.system == "Darwin":
+            return f'open {shlex.quote(path)}'
+        if kind == 'launch' and path.endswith('.desktop'):
+            return f'gtk-launch {shlex.quote(os.path.basename(path)[:-len(".desktop")])}'
+        return f'xdg-open {shlex.quote(path)}'
+
+    def _known_app(self, name):
+        """Best exact (or alias) match from the application index, if it has one"""
+        if self.app_index is None:
+            return None
+        matches = [entry for entry in self.app_index.lookup(name) if entry.kind in LAUNCHER_KINDS]
+        return matches[0] if matches else None
+
+    async def _close(self, agent, target):
+        # Only apps we know the process of: "exit fullscreen" or "kill time" are for the agent
+        process = PROCESS_ALIASES.get(target)
+        if process is None:
+            entry = self._known_app(target)
+            if entry is None or not entry.process:
+                emit('route', route='agent', reason='unknown_app')
+                return None
+            process = strip_extension(entry.process)
+        if not PROCESS_NAME.match(process):
+            emit('route', route='agent', reason='process_name')
+            return None
+        if self.system == "Windows":
+            command = subprocess.list2cmdline(['taskkill', '/IM', f'{process}.exe', '/F'])
+        else:
+            command = shlex.join(['pkill', '-i', '-x', '--', process])
+        ok, output = await self._run(agent, command)
+        if ok:
+            return f"Closed {target}."
+        return self._failed(output)
+
+    async def _run(self, agent, command):
+        arguments = {'command': command}
+        emit('tool_start', id=None, tool=self.command_tool, arguments=arguments)
+        result = await agent.call_tool(self.command_tool, arguments)
+        is_error = bool(getattr(result, 'isError', False))
+        emit('tool_end', id=None, tool=self.command_tool, is_error=is_error)
+        output = ' '.join(
+            getattr(content, 'text', '') for content in getattr(result, 'content', None) or []
+        ).strip()
+        return not is_error, output
@@ -0,0 +1,132 @@
+"""
+OpenAIAugmentedLLM with FIXR's hooks (progress events and timings for LLM turns and tool calls).
+
+When the model asks for several tools in one response, all of them are started
+as soon as the tool loop executes the first one, and each result is handed back
+to the loop under its own call id. A turn therefore costs its slowest call
+whether the installed mcp_agent runs the calls one by one or not. The agent
+limits how many calls run at once per MCP server (FixrAgent.call_tool).
+"""
+
+import asyncio
+import contextvars
+import json
+import time
+
+from mcp.types import CallToolRequest, CallToolRequestParams
+from mcp_agent.workflows.llm.augmented_llm_openai import OpenAIAugmentedLLM
+
+from metrics import observe_stage
+from progress import emit
+from token_budget import estimate_tokens, using as using_budget
+
+# Start of the chat completion in flight for the current generate() call. A mutable
+# holder, so tool calls running in child tasks can close it.
+_completion = contextvars.ContextVar('fixr_llm_completion', default=None)
+
+
+class FixrOpenAIAugmentedLLM(OpenAIAugmentedLLM):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._tool_started = {}
+
+    @property
+    def token_budget(self):
+        return getattr(self.agent, 'token_budget', None)
+
+    async def generate(self, message, *args, **kwargs):
+        # turn: tool calls of the latest response; dispatched: call id -> task running it
+        completion = {'started': None, 'budget': None, 'turn': None, 'dispatched': {}}
+        if self.token_budget is not None:
+            completion['budget'] = self.token_budget.start(getattr(self, 'instruction', None), message)
+        token = _completion.set(completion)
+        try:
+            with using_budget(completion['budget']):
+                return await super().generate(message, *args, **kwargs)
+        finally:
+            _completion.reset(token)
+            self._end_completion(completion)
+            # Calls the loop never collected (it stopped early or was cancelled)
+            leftover = [task for task in completion['dispatched'].values() if not task.done()]
+            for task in leftover:
+                task.cancel()
+            await asyncio.gather(*leftover, return_exceptions=True)
+
+    @classmethod
+    def convert_message_to_message_param(cls, message, **kwargs):
+        # Called for every model response before the loop executes its tool calls
+        completion = _completion.get()
+        if completion is not None:
+            completion['turn'] = list(getattr(message, 'tool_calls', None) or [])
+        return super().convert_message_to_message_param(message, **kwargs)
+
+    async def call_tool(self, request, tool_call_id=None):
+        completion = _completion.get()
+        if completion is None:
+            return await super().call_tool(request, tool_call_id)
+        dispatched = completion['dispatched']
+        if tool_call_id not in dispatched:
+            turn = completion['turn']
+            if not turn or len(turn) < 2 or tool_call_id not in {call.id for call in turn}:
+                return await super().call_tool(request, tool_call_id)
+            # The loop started executing this turn: start every call of it now
+            completion['turn'] = None
+            for call in turn:
+                call_request = request if call.id == tool_call_id else tool_request(call)
+                if call_request is not None:
+                    dispatched[call.id] = asyncio.ensure_future(super().call_tool(call_request, call.id))
+        return await dispatched.pop(tool_call_id)
+
+    @staticmethod
+    def _end_completion(completion):
+        """Record the completion in flight, if any (ends at the first tool call or at the answer)"""
+        if completion is not None and completion['started'] is not None:
+            observe_stage('llm_completion', time.perf_counter() - completion['started'])
+            completion['started'] = None
+
+    def _log_chat_progress(self, chat_turn=None, model=None):
+        # Called by the tool loop right before each chat completion request
+        completion = _completion.get()
+        prompt_tokens = None
+        if completion is not None:
+            completion['started'] = time.perf_counter()
+            if completion['budget'] is not None:
+                prompt_tokens = completion['budget'].completion()
+        emit('llm_turn', turn=chat_turn, model=model, prompt_tokens=prompt_tokens)
+        return super()._log_chat_progress(chat_turn=chat_turn, model=model)
+
+    async def execute_tool_call(self, tool_call):
+        message = await super().execute_tool_call(tool_call)
+        completion = _completion.get()
+        budget = completion['budget'] if completion is not None else None
+        if budget is not None:
+            # The model's call stays in the conversation for the rest of the loop
+            budget.add('history', estimate_tokens(tool_call.function.name + (tool_call.function.arguments or '')))
+        if self.token_budget is None or not isinstance(message, dict):
+            return message
+        # Results stay in the conversation too: cut them before they are sent with every later completion
+        return self.token_budget.limit_result(message, budget)
+
+    async def pre_tool_call(self, tool_call_id, request):
+        self._end_completion(_completion.get())
+        self._tool_started[tool_call_id or id(request)] = time.perf_counter()
+        emit('tool_start', id=tool_call_id, tool=request.params.name,
+             arguments=request.params.arguments)
+        return await super().pre_tool_call(tool_call_id, request)
+
+    async def post_tool_call(self, tool_call_id, request, result):
+        started = self._tool_started.pop(tool_call_id or id(request), None)
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1) if started else None
+        emit('tool_end', id=tool_call_id, tool=request.params.name,
+             is_error=bool(getattr(result, 'isError', False)), elapsed_ms=elapsed_ms)
+        return await super().post_tool_call(tool_call_id, request, result)
+
+
+def tool_request(tool_call):
+    """The CallToolRequest for a tool call of a model response (None if its arguments are not valid JSON)"""
+    try:
+        arguments = json.loads(tool_call.function.arguments) if tool_call.function.arguments else {}
+    except ValueError:
+        return None  # the tool loop reports the bad arguments to the model itself
+    return CallToolRequest(method='tools/call', params=CallToolRequestParams(name=tool_call.function.name,
+                                                                            arguments=arguments))
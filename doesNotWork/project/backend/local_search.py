@@ -0,0 +1,87 @@
+"""
+The local filename index (file_index.py) exposed as an agent tool.
+
+The tool takes the same arguments as everything-search's `search` tool and
+answers in the same text format, so the model (and the search cache) can use
+either backend. Which backend is used is decided by FIXR_SEARCH_BACKEND:
+"everything", "local", or "auto" (default: everything-search on Windows,
+the local index elsewhere).
+"""
+
+import datetime
+import os
+import platform
+
+from pydantic import BaseModel, Field
+
+from file_index import FileIndex
+from storage import cache_path
+
+
+class SearchQuery(BaseModel):
+    query: str = Field(description="Search query; space-separated terms must all match, * and ? are wildcards")
+    max_results: int = Field(default=100, ge=1, le=1000, description="Maximum number of results to return")
+    match_path: bool = Field(default=False, description="Match against the full path instead of just the name")
+    match_case: bool = Field(default=False, description="Case-sensitive matching")
+    match_whole_word: bool = Field(default=False, description="Match whole words only")
+    match_regex: bool = Field(default=False, description="Treat the query as a regular expression")
+
+
+def format_results(paths):
+    """Same layout as everything-search results"""
+    blocks = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        is_dir = os.path.isdir(path)
+        blocks.append(
+            f"Path: {path}\n"
+            f"Filename: {os.path.basename(path)}{' (Directory)' if is_dir else ''}\n"
+            f"Size: {st.st_size:,} bytes\n"
+            f"Modified: {datetime.datetime.fromtimestamp(st.st_mtime).isoformat()}\n"
+        )
+    return "\n".join(blocks) if blocks else "No results found"
+
+
+def make_search_tool(index):
+    def search(base: SearchQuery) -> str:
+        """
+        Search for files and folders by name on this computer using the local file index.
+        Space-separated terms must all match; use * and ? as wildcards (e.g. "*.desktop").
+        """
+        paths = index.search(
+            base.query,
+            max_results=base.max_results,
+            match_path=base.match_path,
+            match_case=base.match_case,
+            match_whole_word=base.match_whole_word,
+            match_regex=base.match_regex,
+        )
+        text = format_results(paths)
+        if not index.ready.is_set():
+            text += f"\n(The file index is still being built; {index.stats()['entries']:,} entries indexed so far.)"
+        return text
+
+    return search
+
+
+def default_roots():
+    if platform.system() == "Windows":
+        return [os.path.expanduser('~')]
+    roots = [os.path.expanduser('~'), '/usr/share/applications', '/opt']
+    return [root for root in roots if os.path.isdir(root)]
+
+
+def index_from_env():
+    """The local file index if it is the configured search backend, else None"""
+    backend = os.environ.get('FIXR_SEARCH_BACKEND', 'auto')
+    if backend == 'everything' or (backend == 'auto' and platform.system() == "Windows"):
+        return None
+    roots = os.environ.get('FIXR_INDEX_ROOTS')
+    return FileIndex(
+        roots.split(os.pathsep) if roots else default_roots(),
+        index_path=cache_path('file_index.pickle'),
+        poll_interval=float(os.environ.get('FIXR_INDEX_POLL_INTERVAL', 60)),
+    )
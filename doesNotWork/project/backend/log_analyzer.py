@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Per-session latency breakdown from mcp_agent JSONL logs.
+
+Reads logs/mcp_agent.log (or any number of files, .gz rotations included, or
+stdin) in one streaming pass. Each MCPApp session is rebuilt from its events:
+events carrying a session_id ("MCPApp initialized" ... "MCPApp cleanup") open
+and close a session, and events without one belong to the session most
+recently opened. The time between consecutive events is charged to the phase
+the session is in:
+
+    init       app and agent initialization
+    connect    MCP server startup, initialize and tools/list requests
+    tool_call  tools/call requests until their response
+    llm        chat completions (from "Chat in progress" on)
+    teardown   agent shutdown and server disconnects
+    other      everything else
+
+Memory stays constant however large the input: only open sessions are kept
+(at most --max-open), finished ones are folded into log-bucket histograms for
+the percentiles and a heap of the --top slowest.
+
+    python log_analyzer.py logs/mcp_agent.log logs/mcp_agent.log.1.gz --top 10
+    python log_analyzer.py --json logs/mcp_agent.log > breakdown.json
+"""
+
+import argparse
+import collections
+import datetime
+import gzip
+import heapq
+import io
+import json
+import math
+import sys
+
+PHASES = ('init', 'connect', 'tool_call', 'llm', 'teardown', 'other')
+
+SESSION_START = 'mcpapp initialized'
+SESSION_END = 'mcpapp cleanup'
+
+# (phase, lowercase message fragments), first match wins; send_request is handled separately
+PHASE_MARKERS = (
+    ('teardown', ('shutting down', 'shutdown', 'disconnecting', 'disconnect all', 'cleaning up')),
+    ('init', ('initializing agent', 'initializing', 'mcpapp initialized')),
+    ('connect', ('connected to server', 'up and running', 'found', 'connecting', 'list_tools')),
+    ('llm', ('chat in progress', 'requesting completion', 'chatcompletion request')),
+    ('other', ('chat finished', 'chatcompletion response', 'iteration')),
+)
+
+CONNECT_METHODS = ('initialize', 'tools/list', 'prompts/list', 'resources/list', 'notifications/initialized')
+
+
+class LogHistogram:
+    """Percentiles from log-spaced buckets (about 2.5% relative error), constant memory"""
+
+    def __init__(self, smallest=1e-6, ratio=1.05):
+        self.smallest = smallest
+        self.log_ratio = math.log(ratio)
+        self.counts = collections.Counter()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        bucket = -1 if value <= self.smallest else int(math.log(value / self.smallest) / self.log_ratio)
+        self.counts[bucket] += 1
+
+    def percentile(self, p):
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                if bucket < 0:
+                    return 0.0
+                # geometric middle of the bucket, never above the largest value seen
+                return min(self.smallest * math.exp((bucket + 0.5) * self.log_ratio), self.max)
+        return self.max
+
+
+class Session:
+    __slots__ = ('id', 'started', 'last', 'phase', 'seconds', 'pending', 'tool_calls', 'llm_turns', 'complete')
+
+    def __init__(self, session_id, timestamp):
+        self.id = session_id
+        self.started = timestamp
+        self.last = timestamp
+        self.phase = 'init'
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.pending = collections.deque()  # methods of send_requests awaiting their response
+        self.tool_calls = 0
+        self.llm_turns = 0
+        self.complete = False
+
+    @property
+    def total(self):
+        return self.last - self.started
+
+    def advance(self, timestamp):
+        """Charge the time since the previous event to the current phase"""
+        if timestamp > self.last:
+            self.seconds[self.phase] += timestamp - self.last
+            self.last = timestamp
+
+    def observe(self, message, data):
+        lowered = message.lower()
+        if 'send_request' in lowered:
+            self._send_request(lowered, data)
+            return
+        for phase, fragments in PHASE_MARKERS:
+            if any(fragment in lowered for fragment in fragments):
+                if phase == 'llm' and self.phase != 'llm':
+                    self.llm_turns += 1
+                if phase != 'other' or self.phase == 'llm':
+                    self.phase = phase
+                return
+
+    def _send_request(self, lowered, data):
+        if 'response' in lowered:
+            method = self.pending.popleft() if self.pending else None
+            if method == 'tools/call' and 'tools/call' not in self.pending:
+                self.phase = 'llm'  # the model picks up the tool result
+            return
+        method = find_method(data)
+        self.pending.append(method)
+        if method == 'tools/call':
+            self.tool_calls += 1
+            self.phase = 'tool_call'
+        elif method in CONNECT_METHODS:
+            self.phase = 'connect'
+
+    def to_dict(self):
+        return {
+            'session_id': self.id,
+            'started': datetime.datetime.fromtimestamp(self.started).isoformat(),
+            'total_seconds': round(self.total, 6),
+            'complete': self.complete,
+            'tool_calls': self.tool_calls,
+            'llm_turns': self.llm_turns,
+            'phases': {phase: round(seconds, 6) for phase, seconds in self.seconds.items()},
+        }
+
+
+def find_method(data):
+    """JSON-RPC method of a logged send_request payload (possibly wrapped in root/data)"""
+    for _ in range(3):
+        if not isinstance(data, dict):
+            return None
+        if isinstance(data.get('method'), str):
+            return data['method']
+        data = data.get('root') or data.get('data') or data.get('request')
+    return None
+
+
+def parse_timestamp(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+def session_id_of(event):
+    for holder in (event, event.get('context'), event.get('data')):
+        if isinstance(holder, dict):
+            if holder.get('session_id'):
+                return str(holder['session_id'])
+            inner = holder.get('data')
+            if isinstance(inner, dict) and inner.get('session_id'):
+                return str(inner['session_id'])
+    return None
+
+
+class Analyzer:
+    def __init__(self, top=10, max_open=10000):
+        self.top = top
+        self.max_open = max_open
+        self.open = collections.OrderedDict()  # session id -> Session, oldest first
+        self.current = None
+        self.histograms = {phase: LogHistogram() for phase in PHASES + ('total',)}
+        self.slowest = []  # min-heap of (total, seq, session dict)
+        self.sessions = 0
+        self.incomplete = 0
+        self.events = 0
+        self.skipped = 0
+        self._anonymous = 0
+
+    def feed(self, line):
+        try:
+            event = json.loads(line)
+        except ValueError:
+            self.skipped += 1
+            return
+        if not isinstance(event, dict):
+            self.skipped += 1
+            return
+        timestamp = parse_timestamp(event.get('timestamp') or event.get('time'))
+        message = event.get('message') or event.get('msg') or ''
+        if timestamp is None or not isinstance(message, str):
+            self.skipped += 1
+            return
+        self.events += 1
+
+        session_id = session_id_of(event)
+        lowered = message.lower()
+        if session_id is not None:
+            session = self.open.get(session_id)
+            if session is None:
+                session = self._start(session_id, timestamp)
+        elif self.current is not None and self.current.id in self.open:
+            session = self.current
+        elif SESSION_START in lowered or 'initializing' in lowered:
+            self._anonymous += 1
+            session = self._start(f'session-{self._anonymous}', timestamp)
+        else:
+            self.skipped += 1
+            return
+
+        if SESSION_END in lowered:
+            if session.phase == 'other':
+                session.phase = 'teardown'  # closing the agent and its servers after the last chat
+            session.advance(timestamp)
+            session.complete = True
+            self._finish(session)
+            return
+        session.advance(timestamp)
+        session.observe(message, event.get('data'))
+
+    def _start(self, session_id, timestamp):
+        if len(self.open) >= self.max_open:
+            _, oldest = self.open.popitem(last=False)
+            self._record(oldest)
+        session = self.open[session_id] = Session(session_id, timestamp)
+        self.current = session
+        return session
+
+    def _finish(self, session):
+        self.open.pop(session.id, None)
+        if self.current is session:
+            self.current = next(reversed(self.open.values()), None)
+        self._record(session)
+
+    def _record(self, session):
+        self.sessions += 1
+        if not session.complete:
+            self.incomplete += 1
+        for phase, seconds in session.seconds.items():
+            self.histograms[phase].add(seconds)
+        self.histograms['total'].add(session.total)
+        if len(self.slowest) < self.top:
+            heapq.heappush(self.slowest, (session.total, self.sessions, session.to_dict()))
+        elif self.top and session.total > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (session.total, self.sessions, session.to_dict()))
+
+    def close(self):
+        """Count the sessions still open at the end of the input (no cleanup logged)"""
+        while self.open:
+            _, session = self.open.popitem(last=False)
+            self._record(session)
+        self.current = None
+
+    def report(self):
+        total = self.histograms['total'].total or 1.0
+        phases = {}
+        for phase in PHASES + ('total',):
+            histogram = self.histograms[phase]
+            phases[phase] = {
+                'total_seconds': round(histogram.total, 6),
+                'share': round(histogram.total / total, 4),
+                'mean': round(histogram.total / histogram.count, 6) if histogram.count else None,
+                **{f'p{p}': round(histogram.percentile(p), 6) if histogram.count else None for p in (50, 90, 99)},
+                'max': round(histogram.max, 6),
+            }
+        return {
+            'sessions': self.sessions,
+            'incomplete': self.incomplete,
+            'events': self.events,
+            'skipped_lines': self.skipped,
+            'phases': phases,
+            'slowest': [entry for _, _, entry in sorted(self.slowest, reverse=True)],
+        }
+
+
+def open_input(path):
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', errors='replace')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, encoding='utf-8', errors='replace')
+
+
+def analyze(paths, top=10, max_open=10000):
+    analyzer = Analyzer(top=top, max_open=max_open)
+    for path in paths:
+        with open_input(path) as f:
+            for line in f:
+                if line.strip():
+                    analyzer.feed(line)
+    analyzer.close()
+    return analyzer.report()
+
+
+def format_seconds(value):
+    if value is None:
+        return '-'
+    return f'{value * 1000:.0f}ms' if value < 1 else f'{value:.2f}s'
+
+
+def print_report(report):
+    print(f"Sessions: {report['sessions']} ({report['incomplete']} without cleanup), "
+          f"events: {report['events']}, skipped lines: {report['skipped_lines']}")
+    print(f"{'phase':<10} {'total':>10} {'share':>6} {'mean':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+    for phase, row in report['phases'].items():
+        print(f"{phase:<10} {format_seconds(row['total_seconds']):>10} {row['share'] * 100:>5.1f}% "
+              f"{format_seconds(row['mean']):>9} {format_seconds(row['p50']):>9} {format_seconds(row['p90']):>9} "
+              f"{format_seconds(row['p99']):>9} {format_seconds(row['max']):>9}")
+    if report['slowest']:
+        print("\nSlowest sessions:")
+        for session in report['slowest']:
+            breakdown = ', '.join(f'{phase} {format_seconds(seconds)}'
+                                  for phase, seconds in session['phases'].items() if seconds)
+            print(f"  {session['session_id']}  {session['started']}  {format_seconds(session['total_seconds'])}"
+                  f"  ({breakdown}; {session['tool_calls']} tool calls, {session['llm_turns']} LLM turns)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Per-session latency breakdown from mcp_agent JSONL logs')
+    parser.add_argument('paths', nargs='*', default=['logs/mcp_agent.log'],
+                        help="Log files, oldest first (.gz allowed, '-' for stdin)")
+    parser.add_argument('--top', type=int, default=10, help='Slowest sessions to list')
+    parser.add_argument('--max-open', type=int, default=10000,
+                        help='Sessions tracked at once; the oldest is closed early beyond this')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args(argv)
+
+    report = analyze(args.paths, top=args.top, max_open=args.max_open)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report)
+    return report
+
+
+if __name__ == '__main__':
+    main()
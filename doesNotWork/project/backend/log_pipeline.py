@@ -0,0 +1,233 @@
+"""
+Buffered, rotated logging for the backend and mcp_agent.
+
+A logging call only filters the record and puts it on a queue; a background
+thread (QueueListener) formats and writes it. Records below the configured
+level are dropped by the logger itself, so debug logging costs next to nothing
+while it is off. mcp_agent's own console/file transport is switched off and
+its events reach the same pipeline through the stdlib "mcp_agent" logger.
+
+Configured from the environment:
+    FIXR_LOG_LEVEL           default level (info)
+    FIXR_LOG_LEVELS          per-namespace levels, e.g. "mcp_agent=warning,server_pool=debug"
+    FIXR_LOG_SAMPLE          share of DEBUG records kept per namespace,
+                             e.g. "mcp_agent.mcp.mcp_agent_client_session=0.01"
+    FIXR_LOG_FILE            log file (logs/mcp_agent.log)
+    FIXR_LOG_MAX_BYTES       rotate once the file is this large (10 MB)
+    FIXR_LOG_ROTATE_SECONDS  rotate once the file is this old (86400; 0 = never)
+    FIXR_LOG_BACKUPS         rotated files kept, gzip-compressed (5)
+Lines are JSON (timestamp, level, namespace, message, data), like mcp_agent's
+own file transport, so log_analyzer.py reads either.
+FIXR_LOG_PIPELINE=0 leaves logging to mcp_agent's settings.
+"""
+
+import datetime
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import shutil
+import time
+
+DEFAULT_PATH = os.path.join('logs', 'mcp_agent.log')
+
+# mcp_agent's LoggerSettings.level only knows these
+MCP_AGENT_LEVELS = ((logging.DEBUG, 'debug'), (logging.INFO, 'info'), (logging.WARNING, 'warning'))
+EVENT_FORMAT = '[%s] %s'
+
+
+def parse_level(value):
+    level = logging.getLevelName(str(value).strip().upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level {value!r}")
+    return level
+
+
+def parse_mapping(value, convert):
+    """'a=x,b.c=y' -> {'a': convert('x'), 'b.c': convert('y')}"""
+    mapping = {}
+    for part in (value or '').split(','):
+        name, sep, setting = part.partition('=')
+        if sep and name.strip():
+            mapping[name.strip()] = convert(setting.strip())
+    return mapping
+
+
+def lookup(table, namespace, default):
+    """Value configured for the longest matching prefix of a dotted namespace"""
+    while namespace:
+        if namespace in table:
+            return table[namespace]
+        namespace = namespace.rpartition('.')[0]
+    return default
+
+
+def event_parts(record):
+    """
+    (namespace, message) of an mcp_agent event: LoggingListener logs every event
+    through the "mcp_agent" logger as "[%s] %s" % (event.namespace, message)
+    """
+    if record.name == 'mcp_agent' and record.msg == EVENT_FORMAT \
+            and isinstance(record.args, tuple) and len(record.args) == 2:
+        return str(record.args[0]), str(record.args[1])
+    return None
+
+
+def namespace_of(record):
+    parts = event_parts(record)
+    if parts is not None:
+        return parts[0]
+    return getattr(record, 'namespace', None) or record.name
+
+
+class NamespaceFilter(logging.Filter):
+    """Per-namespace minimum levels and sampling of DEBUG records, applied before queueing"""
+
+    def __init__(self, levels, default_level, sample):
+        super().__init__()
+        self.levels = levels
+        self.default_level = default_level
+        self.sample = sample
+
+    def filter(self, record):
+        namespace = namespace_of(record)
+        if record.levelno < lookup(self.levels, namespace, self.default_level):
+            return False
+        if record.levelno <= logging.DEBUG:
+            rate = lookup(self.sample, namespace, 1.0)
+            if rate < 1.0 and random.random() >= rate:
+                return False
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the mcp_agent event's namespace and data when present"""
+
+    def format(self, record):
+        parts = event_parts(record)
+        namespace, message = parts if parts is not None else (namespace_of(record), record.getMessage())
+        entry = {
+            'timestamp': datetime.datetime.fromtimestamp(record.created).isoformat(),
+            'level': record.levelname,
+            'namespace': namespace,
+            'message': message,
+        }
+        data = getattr(record, 'event_data', None) or getattr(record, 'data', None)
+        if data:
+            entry['data'] = data
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queues the record as is: the message is formatted by the writer thread, not the caller"""
+
+    def prepare(self, record):
+        return record
+
+
+class RotatingGzipFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotates by size or age; rotated files are gzip-compressed (on the writer thread)"""
+
+    def __init__(self, path, max_bytes, rotate_seconds, backups):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        super().__init__(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8', delay=True)
+        self.rotate_seconds = rotate_seconds
+        self.opened_at = time.time()
+
+    def shouldRollover(self, record):
+        if self.rotate_seconds and time.time() - self.opened_at >= self.rotate_seconds:
+            return os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.opened_at = time.time()
+
+    def rotation_filename(self, default_name):
+        return default_name + '.gz'
+
+    def rotate(self, source, dest):
+        with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(source)
+
+
+class LogPipeline:
+    def __init__(self, path=DEFAULT_PATH, level=logging.INFO, levels=None, sample=None,
+                 max_bytes=10 * 1024 * 1024, rotate_seconds=86400, backups=5):
+        self.path = path
+        self.level = level
+        self.levels = dict(levels or {})
+        self.sample = dict(sample or {})
+        self.queue = queue.SimpleQueue()
+        self.file_handler = RotatingGzipFileHandler(path, max_bytes, rotate_seconds, backups)
+        self.file_handler.setFormatter(JsonFormatter())
+        self.handler = DeferredQueueHandler(self.queue)
+        self.handler.addFilter(NamespaceFilter(self.levels, level, self.sample))
+        self.listener = logging.handlers.QueueListener(self.queue, self.file_handler)
+        self._started = False
+
+    def start(self):
+        if self._started:
+            return self
+        root = logging.getLogger()
+        # Loggers drop records below their level before building them; the filter does the rest
+        root.setLevel(self.level)
+        for namespace, level in self.levels.items():
+            logging.getLogger(namespace).setLevel(level)
+        root.addHandler(self.handler)
+        self.listener.start()
+        self._started = True
+        return self
+
+    def stop(self):
+        """Flush what is queued and close the file"""
+        if not self._started:
+            return
+        self._started = False
+        logging.getLogger().removeHandler(self.handler)
+        self.listener.stop()
+        self.file_handler.close()
+
+    def mcp_agent_level(self):
+        """Lowest level any mcp_agent namespace is logged at, as an mcp_agent level name"""
+        levels = [level for namespace, level in self.levels.items() if namespace.startswith('mcp_agent')]
+        level = min(levels or [lookup(self.levels, 'mcp_agent', self.level)])
+        return next((name for bound, name in MCP_AGENT_LEVELS if level <= bound), 'error')
+
+    def apply_to_settings(self, settings):
+        """Route mcp_agent's logging here: no transport of its own, events gated at our level"""
+        logger_settings = getattr(settings, 'logger', None)
+        if logger_settings is not None:
+            logger_settings.type = 'none'
+            logger_settings.level = self.mcp_agent_level()
+        return settings
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'level': logging.getLevelName(self.level),
+            'levels': {namespace: logging.getLevelName(level) for namespace, level in self.levels.items()},
+            'sample': self.sample,
+            'queued': self.queue.qsize(),
+        }
+
+
+def from_env():
+    """The pipeline configured by FIXR_LOG_*, started, or None when FIXR_LOG_PIPELINE=0"""
+    if os.environ.get('FIXR_LOG_PIPELINE', '1') == '0':
+        return None
+    return LogPipeline(
+        path=os.environ.get('FIXR_LOG_FILE', DEFAULT_PATH),
+        level=parse_level(os.environ.get('FIXR_LOG_LEVEL', 'info')),
+        levels=parse_mapping(os.environ.get('FIXR_LOG_LEVELS'), parse_level),
+        sample=parse_mapping(os.environ.get('FIXR_LOG_SAMPLE'), float),
+        max_bytes=int(os.environ.get('FIXR_LOG_MAX_BYTES', 10 * 1024 * 1024)),
+        rotate_seconds=float(os.environ.get('FIXR_LOG_ROTATE_SECONDS', 86400)),
+        backups=int(os.environ.get('FIXR_LOG_BACKUPS', 5)),
+    ).start()
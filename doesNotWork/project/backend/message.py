@@ -1,55 +1,364 @@
 import asyncio
+import atexit
+import contextlib
 import os
 import time
 
+import mcp_agent.config as mcp_agent_config
 from mcp_agent.app import MCPApp
-from mcp_agent.config import (
-    Settings,
-    LoggerSettings,
-    MCPSettings,
-    MCPServerSettings,
-    OpenAISettings,
-    AnthropicSettings,
-)
-from mcp_agent.agents.agent import Agent
-from mcp_agent.workflows.llm.augmented_llm import RequestParams
-from mcp_agent.workflows.llm.llm_selector import ModelPreferences
-from mcp_agent.workflows.llm.augmented_llm_openai import OpenAIAugmentedLLM
+from mcp_agent.config import get_settings
 
-# Settings can either be specified programmatically,
-# or loaded from mcp_agent.config.yaml/mcp_agent.secrets.yaml
-app = MCPApp(name="fixr")  # settings=settings)
+import metrics
+import progress
+from app_index import from_env as app_index_from_env, make_launcher_tool
+from cassette import from_env as cassette_from_env
+from env_file import read_env
+from fixr_agent import FixrAgent
+from intents import IntentRouter
+from llm import FixrOpenAIAugmentedLLM
+from local_search import index_from_env, make_search_tool
+from log_pipeline import from_env as log_pipeline_from_env
+from response_cache import from_env as response_cache_from_env
+from runtime import AgentRuntime
+from search_cache import from_env as search_cache_from_env
+from server_selection import from_env as server_selector_from_env, using as using_selection
+from sessions import from_env as sessions_from_env, using as using_session
+from token_budget import from_env as token_budget_from_env
+from tool_cache import from_env as tool_cache_from_env
+
+# Buffered, rotated logs with per-namespace levels (FIXR_LOG_*); mcp_agent's own
+# transport is switched off and its events go through the same pipeline
+log_pipeline = log_pipeline_from_env()
+if log_pipeline is not None:
+    atexit.register(log_pipeline.stop)
 
 
-async def process_message(user_input: str):
-    async with app.run() as agent_app:
-        logger = agent_app.logger
-        context = agent_app.context
+def load_settings():
+    """
+    mcp_agent settings freshly read from mcp_agent.config.yaml/mcp_agent.secrets.yaml
+    (get_settings() otherwise returns its first read), with the OPENAI_API_KEY saved in .env
+    """
+    mcp_agent_config._settings = None
+    settings = get_settings()
+    if log_pipeline is not None:
+        log_pipeline.apply_to_settings(settings)
+    api_key = read_env().get("OPENAI_API_KEY")
+    if api_key:
+        os.environ["OPENAI_API_KEY"] = api_key
+        openai_settings = getattr(settings, "openai", None)
+        if openai_settings is not None:
+            openai_settings.api_key = api_key
+    return settings
+
+
+# Settings can either be specified programmatically,
+# or loaded from mcp_agent.config.yaml/mcp_agent.secrets.yaml
+app = MCPApp(name="fixr", settings=load_settings())
 
-        logger.info("Current config:", data=context.config.model_dump())
-        
-        os_agent = Agent(
-            name="windows_assistant",
-            instruction="""You are an agent with access to full filesystem search capabilities on the user's computer with Everything Search, as well as the ability to execute commands on the user's computer using mcp-server-commands.
+INSTRUCTION = """You are an agent with access to full filesystem search capabilities on the user's computer with Everything Search, as well as the ability to execute commands on the user's computer using mcp-server-commands.
             If the user asks to open a file, search for the file first, use a command to execute it, then generate a text response, don't call any more tools.
             If the user asks to open an application, search for either an executable (.exe) or a shortcut (.ink) file, use a command to execute it. Always end the loop after executing the command whether it outputs something or not.
-            """,
-            server_names=["fetch", "mcp-server-commands", "everything-search"]
+            """
+
+# everything-search needs Everything64.dll (Windows only); elsewhere the local file
+# index answers the same search tool in-process (see local_search.py)
+file_index = index_from_env()
+
+SERVER_NAMES = ["fetch", "mcp-server-commands"]
+if file_index is None:
+    SERVER_NAMES.append("everything-search")
+else:
+    atexit.register(file_index.stop)
+
+# Repeated file/app lookups are answered from here until the returned paths change
+search_cache = search_cache_from_env()
+
+# Installed applications by name, so opening an app needs no file search
+app_index = app_index_from_env()
+if app_index is not None:
+    atexit.register(app_index.stop)
+
+# Prompt tokens per completion are measured; with FIXR_PROMPT_COMPACT=1 schemas, results and the instruction are compacted (token_budget.py)
+token_budget = token_budget_from_env()
+
+# The servers' tool lists from the last run, so agent startup needs no tools/list round trips
+tool_cache = tool_cache_from_env()
+
+# Tool calls of one model response run in parallel, at most this many per MCP server;
+# commands run one at a time by default so they start in the order the model gave them
+TOOL_CONCURRENCY = int(os.environ.get("FIXR_TOOL_CONCURRENCY", 4))
+COMMAND_CONCURRENCY = int(os.environ.get("FIXR_COMMAND_CONCURRENCY", 1))
+
+LAUNCHER_INSTRUCTION = """If the user asks to open an application, call find_application first and run the Launch command it returns; only search for files if it finds nothing.
+            """
+
+
+def build_agent():
+    functions = []
+    instruction = INSTRUCTION
+    if file_index is not None:
+        file_index.start()
+        functions.append(make_search_tool(file_index))
+    if app_index is not None:
+        app_index.start()
+        functions.append(make_launcher_tool(app_index))
+        instruction += LAUNCHER_INSTRUCTION
+    return FixrAgent(
+        name="windows_assistant",
+        instruction=token_budget.compact_instruction(instruction),
+        server_names=SERVER_NAMES,
+        functions=functions,
+        search_cache=search_cache,
+        cassette=cassette,
+        token_budget=token_budget,
+        tool_cache=tool_cache,
+        tool_limits={"mcp-server-commands": COMMAND_CONCURRENCY},
+        default_tool_limit=TOOL_CONCURRENCY,
+    )
+
+
+# "open X" / "close X" requests run their search-and-execute recipe without the LLM;
+# FIXR_FAST_PATH=0 sends everything to the agent
+intent_router = None
+if os.environ.get("FIXR_FAST_PATH", "1") != "0":
+    intent_router = IntentRouter(
+        search_tool="search" if file_index is not None else "everything-search_search",
+        app_index=app_index,
     )
 
-        async with os_agent:
-            llm = await os_agent.attach_llm(OpenAIAugmentedLLM)
-            result = await llm.generate_str(
-                message=user_input,
-            )
+
+# FIXR_CASSETTE=<file> with FIXR_CASSETTE_MODE=record|replay records every chat completion
+# and tool call, or replays them with no network or MCP servers (see cassette.py)
+cassette = cassette_from_env()
+
+# Started once (by server.py or lazily on the first message) and reused by every request
+runtime = AgentRuntime(
+    app,
+    build_agent,
+    server_names=[] if cassette is not None and cassette.replaying else SERVER_NAMES,
+    llm_class=FixrOpenAIAugmentedLLM,
+)
+
+# Opt-in (FIXR_RESPONSE_CACHE=1) cache of answers to repeated requests
+response_cache = response_cache_from_env()
+
+# Replaying the answer to a run that executed a command would skip the command itself,
+# so those runs are only cached when FIXR_RESPONSE_CACHE_SIDE_EFFECTS=1
+CACHE_SIDE_EFFECTS = os.environ.get("FIXR_RESPONSE_CACHE_SIDE_EFFECTS") == "1"
+SIDE_EFFECT_SERVERS = ("mcp-server-commands",)
+
+# Only the tool schemas of the servers a request needs go into the prompt; FIXR_SERVER_SELECTION=0 sends all
+server_selector = server_selector_from_env(SERVER_NAMES)
+
+# Conversations continued by session_id; FIXR_SESSIONS=0 keeps every request stateless
+session_store = sessions_from_env()
+
+# How long a reload lets running requests finish before restarting reconfigured MCP servers
+RELOAD_DRAIN_TIMEOUT = float(os.environ.get("FIXR_RELOAD_DRAIN_TIMEOUT", 30))
+
+
+async def reload_config():
+    """Apply the current .env and config files to the running agent, without a restart"""
+    started = time.perf_counter()
+    result = await runtime.reload(load_settings(), drain_timeout=RELOAD_DRAIN_TIMEOUT)
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def default_model():
+    openai_settings = getattr(runtime.app.context.config, "openai", None)
+    return getattr(openai_settings, "default_model", None)
+
+
+async def handle_message(user_input: str, use_cache: bool = True, session_id=None):
+    """
+    Answer one request and report how: {'result': ..., 'route': 'fast_path' | 'cache' | 'agent'}.
+    use_cache=False skips the response cache lookup (the fresh answer still refreshes it).
+    With a session_id the request continues that conversation (see sessions.py).
+    """
+    started = time.perf_counter()
+    try:
+        if session_id is None or session_store is None:
+            answer = await _answer(user_input, use_cache)
+        else:
+            answer = await _answer_in_session(session_store.get(session_id), user_input, use_cache)
+    except Exception as e:
+        metrics.record_error(e)
+        raise
+    metrics.message_seconds.observe(time.perf_counter() - started, route=answer["route"])
+    return answer
+
+
+async def _answer_in_session(session, user_input, use_cache):
+    async with session.lock:
+        # "close it" -> "close discord", which the fast path can answer without the LLM
+        request = session.resolve(user_input)
+        with using_session(session):
+            try:
+                answer = await _answer(request, use_cache, prompt=session.prompt(request))
+            except BaseException:
+                session.discard_turn()
+                raise
+        session.add_turn(request, answer["result"])
+    return {**answer, "session_id": session.id, "session": session.to_dict()}
+
+
+async def _answer(user_input, use_cache, prompt=None):
+    """prompt: what the agent is asked, when it is more than the request itself (conversation history)"""
+    if intent_router is not None:
+        async with runtime.active():
+            result = await intent_router.try_handle(runtime.agent, user_input)
+        if result is not None:
             print(result)
-            return result
+            return {"result": result, "route": "fast_path"}
 
+    cache_key = None
+    # An answer that depends on earlier turns is neither served from nor stored in the cache
+    if response_cache is not None and (prompt is None or prompt == user_input):
+        await runtime.start()
+        cache_key = response_cache.make_key(user_input, default_model(), SERVER_NAMES)
+        if use_cache:
+            result = response_cache.get(cache_key)
+            if result is not None:
+                return {"result": result, "route": "cache"}
 
-if __name__ == "__main__":
-    start = time.time()
-    asyncio.get_event_loop().run_until_complete(process_message("Close Discord"))
-    end = time.time()
-    t = end - start
+    side_effects = []
+
+    def track_side_effects(event, data):
+        if event == "tool_start" and data["tool"].startswith(SIDE_EFFECT_SERVERS):
+            side_effects.append(data["tool"])
+
+    selection = server_selector.select(user_input) if server_selector is not None else None
+    with progress.subscribe(track_side_effects), using_selection(selection):
+        result = await runtime.generate_str(prompt or user_input)
+    print(result)
+
+    if cache_key is not None and (CACHE_SIDE_EFFECTS or not side_effects):
+        response_cache.put(cache_key, result)
+    answer = {"result": result, "route": "agent"}
+    if selection is not None:
+        answer["servers"] = selection.to_dict()
+    return answer
+
+
+async def process_message(user_input: str, use_cache: bool = True):
+    """Answer one request with the warm agent (or the intent fast path)"""
+    return (await handle_message(user_input, use_cache))["result"]
+
+
+async def stream_message(user_input: str, use_cache: bool = True, session_id=None):
+    """
+    Run handle_message and yield (event, data) tuples as the agent works:
+    route, llm_turn, tool_start, tool_end, then a final result or error.
+    """
+    queue = asyncio.Queue()
+
+    async def run():
+        with progress.subscribe(lambda event, data: queue.put_nowait((event, data))):
+            try:
+                queue.put_nowait(('result', await handle_message(user_input, use_cache, session_id)))
+            except Exception as e:
+                queue.put_nowait(('error', {'error': str(e)}))
+            finally:
+                queue.put_nowait(None)
 
-    print(f"Total run time: {t:.2f}s")
+    task = asyncio.create_task(run())
+    try:
+        yield 'start', {'expression': user_input}
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            yield item
+    finally:
+        # The consumer went away (client disconnected, timeout): stop the agent run too
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+async def run_batch(expressions, concurrency, use_cache: bool = True, timeout=None, admit=None):
+    """
+    Answer several requests at once on the shared runtime, at most `concurrency` at a time,
+    and yield one item per expression as it completes:
+    {'index', 'expression', 'success', 'result' and 'route' or 'error', 'elapsed_ms'}.
+    timeout limits each item's run, not the time it waits for a slot.
+    admit() returns an async context manager each item runs in (the server's admission slot).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(index, expression):
+        item = {"index": index, "expression": expression}
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                async with admit() if admit is not None else contextlib.nullcontext():
+                    answer = await asyncio.wait_for(handle_message(expression, use_cache), timeout)
+                item.update(success=True, **answer)
+            except asyncio.TimeoutError:
+                metrics.record_error("timeout")
+                item.update(success=False, error=f"Request timed out after {timeout:g}s")
+            except Exception as e:
+                item.update(success=False, error=str(e))
+            item["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return item
+
+    tasks = [asyncio.create_task(run(index, expression)) for index, expression in enumerate(expressions)]
+    try:
+        for next_item in asyncio.as_completed(tasks):
+            yield await next_item
+    finally:
+        # The consumer went away (client disconnected): stop the remaining runs too
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def batch_summary(items, started):
+    succeeded = sum(1 for item in items if item["success"])
+    return {
+        "succeeded": succeeded,
+        "failed": len(items) - succeeded,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+async def handle_batch(expressions, concurrency, use_cache: bool = True, timeout=None, admit=None):
+    """run_batch, collected: {'results': [item, ...] in input order, 'succeeded', 'failed', 'elapsed_ms'}"""
+    started = time.perf_counter()
+    items = [item async for item in run_batch(expressions, concurrency, use_cache, timeout, admit)]
+    items.sort(key=lambda item: item["index"])
+    return {"results": items, **batch_summary(items, started)}
+
+
+async def stream_batch(expressions, concurrency, use_cache: bool = True, timeout=None, admit=None):
+    """run_batch as (event, data) tuples: start, one item per completed request, then done"""
+    started = time.perf_counter()
+    items = []
+    batch = run_batch(expressions, concurrency, use_cache, timeout, admit)
+    try:
+        yield "start", {"count": len(expressions), "concurrency": concurrency}
+        async for item in batch:
+            items.append(item)
+            yield "item", item
+        yield "done", batch_summary(items, started)
+    finally:
+        await batch.aclose()
+
+
+async def main():
+    try:
+        start = time.time()
+        await process_message("Close Discord")
+        end = time.time()
+        t = end - start
+
+        print(f"Total run time: {t:.2f}s")
+        for stage, (count, seconds) in metrics.stage_totals().items():
+            print(f"  {stage}: {seconds:.2f}s ({count}x)")
+    finally:
+        await runtime.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
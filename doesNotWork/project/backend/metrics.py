@@ -0,0 +1,199 @@
+"""
+Latency histograms and request counters, exposed as Prometheus text on /metrics.
+
+Stages of a request are timed with span() (or observe_stage() when the start
+and end are in different places): MCPApp init, MCP server connect, list_tools,
+each LLM completion and each tool call. Both front ends count requests,
+in-flight requests and errors by type. Metrics are process-wide and safe to
+update from the HTTP threads and the agent loop at the same time.
+"""
+
+import contextlib
+import threading
+import time
+
+# Seconds; LLM completions and cold starts take seconds, cache hits and index lookups microseconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_lock = threading.Lock()
+_metrics = []
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        with _lock:
+            _metrics.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple((name, labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with _lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items):
+        return [f'{self.name}{format_labels(key)} {format_value(value)}' for key, value in items]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        if not self.labelnames:
+            self._values[()] = 0
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # per-bucket counts (not cumulative), sum, count
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def _render_samples(self, items):
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{format_labels(key + (("le", format_value(float(bound))),))} {cumulative}')
+            lines.append(f'{self.name}_bucket{format_labels(key + (("le", "+Inf"),))} {count}')
+            lines.append(f'{self.name}_sum{format_labels(key)} {format_value(total)}')
+            lines.append(f'{self.name}_count{format_labels(key)} {count}')
+        return lines
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    with _lock:
+        metrics = list(_metrics)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+stage_seconds = Histogram(
+    'fixr_stage_duration_seconds',
+    'Time spent in each stage of serving a request (app_init, server_connect, list_tools, llm_completion, tool_call, ...)',
+    ['stage'],
+)
+tool_call_seconds = Histogram('fixr_tool_call_duration_seconds', 'Duration of each tool call', ['tool'])
+message_seconds = Histogram('fixr_message_duration_seconds', 'Time to answer one message, by route', ['route'])
+http_requests = Counter('fixr_http_requests_total', 'HTTP requests served', ['method', 'path', 'status'])
+http_request_seconds = Histogram('fixr_http_request_duration_seconds', 'HTTP request latency', ['path'])
+http_in_flight = Gauge('fixr_http_requests_in_flight', 'HTTP requests currently being served')
+errors = Counter('fixr_errors_total', 'Errors by type (exception class, timeout, ...)', ['type'])
+admission_in_flight = Gauge('fixr_admission_in_flight', 'Agent requests admitted and running')
+admission_queue_depth = Gauge('fixr_admission_queue_depth', 'Agent requests waiting for a slot')
+admission_wait_seconds = Histogram('fixr_admission_wait_seconds', 'Time agent requests waited in the admission queue')
+admission_rejected = Counter('fixr_admission_rejected_total', 'Agent requests turned away (queue_full, queue_timeout)', ['reason'])
+server_selections = Counter('fixr_server_selection_total',
+                            'Agent requests by the MCP servers offered to the LLM ("all" = fallback)', ['servers'])
+prompt_tokens = Histogram('fixr_prompt_tokens',
+                          'Estimated tokens sent with each chat completion, by part (system, tools, history, tool_results)',
+                          ['part'], buckets=(50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000))
+tool_cache_results = Counter('fixr_tool_cache_total',
+                             'Cached MCP tool lists used at startup (hit, miss) and checked against the server '
+                             '(unchanged, changed)', ['result'])
+
+# Known routes; anything else is counted as "other" so random URLs can't blow up label cardinality
+ROUTES = ('/health', '/metrics', '/calculate', '/calculate/stream', '/calculate/batch', '/save-api-key',
+          '/verify-api-key', '/reload')
+
+
+def route_label(path):
+    path = path.split('?', 1)[0]
+    return path if path in ROUTES else 'other'
+
+
+def observe_stage(stage, seconds):
+    stage_seconds.observe(seconds, stage=stage)
+
+
+@contextlib.contextmanager
+def span(stage):
+    """Time the enclosed block as one observation of a stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def stage_totals():
+    """{stage: (observations, total seconds)}, for a quick breakdown of a run"""
+    with _lock:
+        return {key[0][1]: (count, total) for key, (_, total, count) in stage_seconds._values.items()}
+
+
+def record_error(error):
+    """Count an error by type: an exception (its class name) or a string"""
+    errors.inc(type=error if isinstance(error, str) else type(error).__name__)
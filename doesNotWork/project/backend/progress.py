@@ -0,0 +1,26 @@
+"""
+Per-request progress events.
+
+The agent layer calls emit() as things happen (LLM turns, tool calls); a
+request that wants to observe them wraps its work in subscribe(). Listeners
+live in a context variable, so concurrent requests only see their own events.
+"""
+
+import contextlib
+import contextvars
+
+_listeners = contextvars.ContextVar('fixr_progress_listeners', default=())
+
+
+def emit(event, **data):
+    for listener in _listeners.get():
+        listener(event, data)
+
+
+@contextlib.contextmanager
+def subscribe(listener):
+    token = _listeners.set(_listeners.get() + (listener,))
+    try:
+        yield
+    finally:
+        _listeners.reset(token)
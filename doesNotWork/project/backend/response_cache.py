@@ -0,0 +1,76 @@
+"""
+Exact-match response cache for process_message.
+
+Keyed on the normalized request text plus the model and the MCP server set,
+with LRU eviction, a TTL and hit/miss counters. Opt-in via FIXR_RESPONSE_CACHE=1.
+"""
+
+import os
+import time
+from collections import OrderedDict
+
+
+def normalize(text):
+    """Case- and whitespace-insensitive form of a request ("Open  Discord!" == "open discord")"""
+    return ' '.join(text.lower().split()).strip(' .!?')
+
+
+class ResponseCache:
+    def __init__(self, max_entries=256, ttl=600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(text, model, server_names):
+        return normalize(text), model, tuple(sorted(server_names))
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+def from_env():
+    """The configured cache, or None when FIXR_RESPONSE_CACHE is not enabled"""
+    if os.environ.get('FIXR_RESPONSE_CACHE') != '1':
+        return None
+    return ResponseCache(
+        max_entries=int(os.environ.get('FIXR_RESPONSE_CACHE_SIZE', 256)),
+        ttl=float(os.environ.get('FIXR_RESPONSE_CACHE_TTL', 600)),
+    )
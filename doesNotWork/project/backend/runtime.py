@@ -0,0 +1,218 @@
+"""
+Long-lived agent runtime shared by every request.
+
+The MCPApp, the MCP server pool, the windows_assistant agent and the LLM
+are started once and kept warm, so a request only pays for the LLM/tool loop
+itself instead of a full init/cleanup cycle.
+"""
+
+import asyncio
+import contextlib
+import time
+
+from mcp_agent.workflows.llm.augmented_llm import RequestParams
+from mcp_agent.workflows.llm.augmented_llm_openai import OpenAIAugmentedLLM
+
+from metrics import observe_stage
+from server_pool import MCPServerPool, server_changes
+
+
+class Generation:
+    """
+    One version of the runtime's settings and the LLM bound to them. Requests
+    hold on to the generation they started in, so a reload never changes the
+    key or model under a request that is already running.
+    """
+
+    def __init__(self, number, llm, settings):
+        self.number = number
+        self.llm = llm
+        self.settings = settings
+        self.active = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def enter(self):
+        self.active += 1
+        self._idle.clear()
+
+    def exit(self):
+        self.active -= 1
+        if self.active == 0:
+            self._idle.set()
+
+    async def drained(self, timeout):
+        """Wait until no request uses this generation; False if some still do after timeout"""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class AgentRuntime:
+    """
+    Owns the MCPApp/agent/LLM lifecycle.
+
+    Everything is entered and exited from a single lifecycle task, because the
+    MCP connection manager uses anyio task groups that must be closed by the
+    task that opened them.
+    """
+
+    def __init__(self, app, agent_factory, server_names=(), llm_class=OpenAIAugmentedLLM,
+                 pool_options=None):
+        self.app = app
+        self.agent_factory = agent_factory
+        self.server_names = list(server_names)
+        self.llm_class = llm_class
+        self.pool_options = pool_options or {}
+        self.pool = None
+        self.agent = None
+        self.generation = None
+        self._retired = []  # earlier generations still serving requests
+        self._reload_lock = asyncio.Lock()
+        self._task = None
+        self._ready = None
+        self._stopping = None
+        self._start_lock = asyncio.Lock()
+
+    @property
+    def llm(self):
+        return self.generation.llm if self.generation is not None else None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done() and self._ready.is_set()
+
+    async def start(self):
+        """Start the runtime if it is not already running. Safe to call per request."""
+        async with self._start_lock:
+            if self.running:
+                return
+            if self._task is not None:
+                # A previous lifecycle died (e.g. the app crashed); reap it before restarting
+                await asyncio.gather(self._task, return_exceptions=True)
+
+            self._ready = asyncio.Event()
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._lifecycle())
+
+            ready = asyncio.create_task(self._ready.wait())
+            await asyncio.wait({self._task, ready}, return_when=asyncio.FIRST_COMPLETED)
+            if not self._ready.is_set():
+                ready.cancel()
+                task, self._task = self._task, None
+                task.result()  # re-raises the startup error
+                raise RuntimeError("Agent runtime exited during startup")
+
+    async def _lifecycle(self):
+        try:
+            started = time.perf_counter()
+            async with self.app.run() as agent_app:
+                observe_stage('app_init', time.perf_counter() - started)
+                logger = agent_app.logger
+                logger.info("Agent app started", data={"servers": self.server_names})
+
+                # Launch the MCP servers before the agent so it attaches to the pooled connections
+                self.pool = MCPServerPool(agent_app.context, self.server_names, **self.pool_options)
+                await self.pool.start()
+                try:
+                    started = time.perf_counter()
+                    agent = self.agent_factory()
+                    async with agent:
+                        settings = agent_app.context.config
+                        self.generation = Generation(1, self._bind_llm(agent, settings), settings)
+                        observe_stage('agent_init', time.perf_counter() - started)
+                        self.agent = agent
+                        logger.info("Agent runtime ready", data={"agent": agent.name})
+                        self._ready.set()
+                        await self._stopping.wait()
+                finally:
+                    await self.pool.stop()
+        finally:
+            self.agent = None
+            self.generation = None
+            self._retired = []
+            self.pool = None
+
+    async def stop(self):
+        """Shut down the agent, its MCP servers and the app."""
+        if self._task is None:
+            return
+        self._stopping.set()
+        task, self._task = self._task, None
+        await asyncio.gather(task, return_exceptions=True)
+
+    def _bind_llm(self, agent, settings):
+        """An LLM for the agent that reads its API key and model from this settings snapshot only"""
+        context = self.app.context.model_copy(update={'config': settings})
+        agent.llm = self.llm_class(agent=agent, context=context)
+        return agent.llm
+
+    @contextlib.asynccontextmanager
+    async def active(self):
+        """Run a request on the current generation (a reload waits for it before restarting servers)"""
+        await self.start()
+        generation = self.generation
+        generation.enter()
+        try:
+            yield generation
+        finally:
+            generation.exit()
+
+    async def reload(self, settings, drain_timeout=30.0):
+        """
+        Apply new settings without a restart: requests from now on use a new LLM
+        (API key, default model), requests already running finish on the old one,
+        and only the MCP servers whose configuration changed are restarted, once
+        those requests are done (or after drain_timeout seconds).
+        """
+        await self.start()
+        async with self._reload_lock:
+            context = self.app.context
+            previous = self.generation
+            changed, missing = server_changes(previous.settings, settings, self.server_names)
+
+            context.config = settings
+            self.generation = Generation(previous.number + 1, self._bind_llm(self.agent, settings), settings)
+            self._retired.append(previous)
+            self._retired = [generation for generation in self._retired if generation.active]
+
+            drained = True
+            if changed:
+                # Restarting a server would fail the tool calls of requests still on the old settings
+                for generation in list(self._retired):
+                    drained = await generation.drained(drain_timeout) and drained
+                await self.pool.reconfigure(settings, changed)
+                revalidate_tools = getattr(self.agent, 'revalidate_tools', None)
+                if revalidate_tools is not None:
+                    # A restarted server may come back with other tools (e.g. a new package version)
+                    await revalidate_tools(changed)
+
+            self.app.logger.info("Agent runtime reloaded", data={
+                "generation": self.generation.number, "restarted": changed})
+            return {
+                'generation': self.generation.number,
+                'model': model_of(settings),
+                'model_changed': model_of(settings) != model_of(previous.settings),
+                'api_key_changed': api_key_of(settings) != api_key_of(previous.settings),
+                'restarted': changed,
+                'missing': missing,
+                'drained': drained,
+            }
+
+    async def generate_str(self, message):
+        async with self.active() as generation:
+            # The LLM is shared between requests, so history must not leak across them
+            return await generation.llm.generate_str(
+                message=message,
+                request_params=RequestParams(use_history=False),
+            )
+
+
+def model_of(settings):
+    return getattr(getattr(settings, 'openai', None), 'default_model', None)
+
+
+def api_key_of(settings):
+    return getattr(getattr(settings, 'openai', None), 'api_key', None)
@@ -0,0 +1,116 @@
+"""
+Cache of everything-search tool results.
+
+The agent instruction makes the model search before every open request, so
+the same queries ("discord.exe", "*.lnk") hit the search server over and over.
+Results are cached per (tool, arguments) and validated on every hit against
+the mtimes of the returned paths and of their parent directories: if a path
+changed or disappeared, or a file was added/removed next to one, the entry is
+dropped and the search runs again.
+"""
+
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+
+PATH_LINE = re.compile(r'^\s*Path:\s*(.+?)\s*$', re.MULTILINE)
+
+
+def extract_paths(result):
+    """Paths listed in a search tool result ("Path: ..." lines)"""
+    paths = []
+    for content in getattr(result, 'content', None) or []:
+        text = getattr(content, 'text', None)
+        if text:
+            paths.extend(PATH_LINE.findall(text))
+    return paths
+
+
+def stamp(path):
+    """mtime of a path in ns, or None if it no longer exists"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class SearchCache:
+    def __init__(self, server_names=('everything-search',), max_entries=512, ttl=300.0):
+        self.server_names = tuple(server_names)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def handles(self, name, server_name=None):
+        if server_name is not None:
+            return server_name in self.server_names
+        return any(name.startswith(f'{server}_') for server in self.server_names)
+
+    @staticmethod
+    def make_key(name, arguments, server_name=None):
+        return server_name, name, json.dumps(arguments or {}, sort_keys=True, default=str)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, stamps, result = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        if any(stamp(path) != mtime for path, mtime in stamps):
+            del self._entries[key]
+            self.invalidations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        if getattr(result, 'isError', False):
+            return
+        paths = extract_paths(result)
+        watched = dict.fromkeys(paths)
+        watched.update(dict.fromkeys(os.path.dirname(path) for path in paths))
+        stamps = [(path, stamp(path)) for path in watched if path]
+        self._entries[key] = (time.monotonic() + self.ttl, stamps, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'expirations': self.expirations,
+            'evictions': self.evictions,
+        }
+
+
+def from_env():
+    """The configured cache, or None when disabled with FIXR_SEARCH_CACHE=0"""
+    if os.environ.get('FIXR_SEARCH_CACHE', '1') == '0':
+        return None
+    return SearchCache(
+        max_entries=int(os.environ.get('FIXR_SEARCH_CACHE_SIZE', 512)),
+        ttl=float(os.environ.get('FIXR_SEARCH_CACHE_TTL', 300)),
+    )
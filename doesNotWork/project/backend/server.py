@@ -3,120 +3,419 @@
 HTTP server that handles requests and delegates message processing.
 """
 
+import argparse
 import json
 import sys
 import platform
 import os
+import queue
 import asyncio
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import select
+import socket
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
-from message import process_message
+import metrics
+from admission import Rejected, from_env as admission_from_env, parse_priority
+from handlers import (check_api_key, client_timeout, health, key_verifier, parse_batch, reload_backend,
+                      save_api_key, session_id_of, sse_frame, start_reload, use_cache)
+from startup import warm_up_threaded, warmup
+
+# All agent work runs on one long-lived event loop so the warm agent runtime
+# (MCP server connections, LLM) survives between requests.
+agent_loop = asyncio.new_event_loop()
+
+# Limits concurrent agent runs; requests are served on their own threads, so
+# /health and /metrics are never stuck behind them
+admission = admission_from_env()
+
+
+DISCONNECT_POLL_INTERVAL = 0.25
+# Not sent to anyone: counted in the HTTP metrics for requests whose client left first (as nginx does)
+CLIENT_CLOSED = 499
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+def run_async(coro, timeout=None, abandoned=None):
+    """
+    Run a coroutine on the agent loop and wait for its result. The coroutine is
+    cancelled after timeout seconds (FutureTimeoutError), or as soon as
+    abandoned() returns True (ClientDisconnected).
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, agent_loop)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    try:
+        while True:
+            wait = max(deadline - time.monotonic(), 0) if deadline is not None else None
+            if abandoned is not None:
+                wait = DISCONNECT_POLL_INTERVAL if wait is None else min(wait, DISCONNECT_POLL_INTERVAL)
+            try:
+                return future.result(wait)
+            except FutureTimeoutError:
+                if abandoned is None or (deadline is not None and time.monotonic() >= deadline):
+                    raise
+                if abandoned():
+                    raise ClientDisconnected()
+    except (FutureTimeoutError, ClientDisconnected):
+        future.cancel()
+        raise
+
+
+async def acquire_slot(priority, granted):
+    """admission.acquire(), noting in `granted` that the slot was taken"""
+    await admission.acquire(priority)
+    granted.append(True)
+
+
+def release_if_granted(granted):
+    """
+    On the agent loop, after run_async cancelled an acquire_slot() whose client
+    left: a slot granted just before the cancel arrived is freed (a cancel that
+    arrives in time frees it in acquire())
+    """
+    if granted:
+        admission.release()
+
+
+# How long a handler waits for an abandoned event stream to finish closing
+EVENTS_CLOSE_TIMEOUT = 5.0
+
+
+async def pump_events(events, items):
+    """
+    Put the items of an async generator on a thread-safe queue, then None. The
+    generator is iterated and closed by this one task, so it is never closed
+    while it is still producing an item (cancelling the task closes it too).
+    """
+    try:
+        async for item in events:
+            items.put(item)
+    finally:
+        try:
+            await events.aclose()
+        finally:
+            items.put(None)
+
 
 class ServerHandler(BaseHTTPRequestHandler):
+    request_timeout = None
+    status = None
+
+    def handle_one_request(self):
+        self.status = None
+        started = time.perf_counter()
+        metrics.http_in_flight.inc()
+        try:
+            super().handle_one_request()
+        finally:
+            metrics.http_in_flight.dec()
+            if self.status is not None:
+                path = metrics.route_label(self.path)
+                metrics.http_requests.inc(method=self.command, path=path, status=str(self.status))
+                metrics.http_request_seconds.observe(time.perf_counter() - started, path=path)
+
+    def send_response(self, code, message=None):
+        self.status = code
+        super().send_response(code, message)
+
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-Request-Timeout')
         self.end_headers()
     
     def do_GET(self):
         if self.path == '/health':
-            self.send_json_response({'status': 'healthy'})
+            self.send_json_response(health(admission))
+        elif self.path == '/metrics':
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', metrics.CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path.startswith('/calculate/stream'):
+            params = parse_qs(urlparse(self.path).query)
+            if 'expression' in params:
+                self.apply_client_timeout(params)
+                self.stream_calculate(params['expression'][0], use_cache(params), parse_priority(params),
+                                      session_id_of(params))
+            else:
+                self.send_json_response({'success': False, 'error': 'Missing expression'}, 400)
         elif self.path.startswith('/calculate?'):
             query = urlparse(self.path).query
             params = parse_qs(query)
             if 'expression' in params:
-                result = asyncio.get_event_loop().run_until_complete(process_message(params['expression'][0]))
-                self.send_json_response({'success': True, 'result': result})
+                self.apply_client_timeout(params)
+                self.calculate(params['expression'][0], use_cache(params), parse_priority(params),
+                               session_id_of(params))
             else:
                 self.send_json_response({'success': False, 'error': 'Missing expression'}, 400)
         else:
             self.send_json_response({'success': False, 'error': 'Not found'}, 404)
     
     def do_POST(self):
-        if self.path == '/calculate':
+        if self.path == '/calculate/stream':
+            try:
+                content_length = int(self.headers['Content-Length'])
+                data = json.loads(self.rfile.read(content_length).decode('utf-8'))
+            except (TypeError, ValueError):
+                self.send_json_response({'success': False, 'error': 'Invalid JSON'}, 400)
+                return
+            if 'expression' in data:
+                self.apply_client_timeout(data)
+                self.stream_calculate(data['expression'], use_cache(data), parse_priority(data), session_id_of(data))
+            else:
+                self.send_json_response({'success': False, 'error': 'Missing expression'}, 400)
+        elif self.path == '/calculate':
             try:
                 content_length = int(self.headers['Content-Length'])
                 data = json.loads(self.rfile.read(content_length).decode('utf-8'))
                 if 'expression' in data:
-                    result = asyncio.get_event_loop().run_until_complete(process_message(data['expression']))
-                    self.send_json_response({'success': True, 'result': result})
+                    self.apply_client_timeout(data)
+                    self.calculate(data['expression'], use_cache(data), parse_priority(data), session_id_of(data))
                 else:
                     self.send_json_response({'success': False, 'error': 'Missing expression'}, 400)
             except:
                 self.send_json_response({'success': False, 'error': 'Invalid JSON'}, 400)
+        elif self.path == '/calculate/batch':
+            try:
+                content_length = int(self.headers['Content-Length'])
+                data = json.loads(self.rfile.read(content_length).decode('utf-8'))
+            except (TypeError, ValueError):
+                self.send_json_response({'success': False, 'error': 'Invalid JSON'}, 400)
+                return
+            try:
+                expressions, concurrency, stream = parse_batch(data)
+            except ValueError as e:
+                self.send_json_response({'success': False, 'error': str(e)}, 400)
+                return
+            self.apply_client_timeout(data)
+            self.batch(expressions, concurrency, stream, use_cache(data), parse_priority(data))
         elif self.path == '/save-api-key':
             try:
                 content_length = int(self.headers['Content-Length'])
                 data = json.loads(self.rfile.read(content_length).decode('utf-8'))
-                
-                if 'api_key' not in data:
-                    self.send_json_response({'success': False, 'error': 'Missing api_key'}, 400)
-                    return
-                
-                api_key = data['api_key'].strip()
-                
-                if not api_key:
-                    self.send_json_response({'success': False, 'error': 'API key cannot be empty'}, 400)
-                    return
-                
-                if not api_key.startswith('sk-'):
-                    self.send_json_response({'success': False, 'error': 'Invalid API key format. OpenAI keys start with "sk-"'}, 400)
-                    return
-                
-                # Save API key to .env file
-                env_path = os.path.join(os.path.dirname(__file__), '.env')
-                
-                try:
-                    # Read existing .env content
-                    env_content = []
-                    if os.path.exists(env_path):
-                        with open(env_path, 'r') as f:
-                            env_content = f.readlines()
-                    
-                    # Update or add the API key line
-                    api_key_line = f'OPENAI_API_KEY={api_key}\n'
-                    updated = False
-                    
-                    for i, line in enumerate(env_content):
-                        if line.strip().startswith('OPENAI_API_KEY='):
-                            env_content[i] = api_key_line
-                            updated = True
-                            break
-                    
-                    if not updated:
-                        env_content.append(api_key_line)
-                    
-                    # Write back to .env file
-                    with open(env_path, 'w') as f:
-                        f.writelines(env_content)
-                    
-                    print(f"✅ API key saved to {env_path}")
-                    self.send_json_response({'success': True, 'message': 'API key saved successfully'})
-                    
-                except Exception as e:
-                    print(f"❌ Error saving API key: {e}")
-                    self.send_json_response({'success': False, 'error': f'Failed to save API key: {str(e)}'}, 500)
-                    
+                payload, status = save_api_key(data)
+                if status == 200:
+                    # Swap the key into the running agent in the background; /health reports the outcome
+                    payload['reload'] = run_async(start_reload())
+                self.send_json_response(payload, status)
             except json.JSONDecodeError:
                 self.send_json_response({'success': False, 'error': 'Invalid JSON'}, 400)
             except Exception as e:
+                metrics.record_error(e)
                 print(f"❌ Unexpected error in /save-api-key: {e}")
                 self.send_json_response({'success': False, 'error': f'Server error: {str(e)}'}, 500)
+        elif self.path == '/reload':
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))  # no body expected
+            payload, status = run_async(reload_backend())
+            self.send_json_response(payload, status)
+        elif self.path == '/verify-api-key':
+            try:
+                content_length = int(self.headers['Content-Length'])
+                data = json.loads(self.rfile.read(content_length).decode('utf-8'))
+            except (TypeError, ValueError):
+                self.send_json_response({'success': False, 'error': 'Invalid JSON'}, 400)
+                return
+            try:
+                # On the agent loop, where the verifier's pooled client and cache live
+                payload, status = run_async(check_api_key(data), key_verifier.timeout + 5)
+            except FutureTimeoutError:
+                payload, status = {'success': False, 'error': 'Key verification timed out'}, 504
+            except Exception as e:
+                metrics.record_error(e)
+                print(f"❌ Unexpected error in /verify-api-key: {e}")
+                payload, status = {'success': False, 'error': f'Server error: {str(e)}'}, 500
+            self.send_json_response(payload, status)
         else:
             self.send_json_response({'success': False, 'error': 'Not found'}, 404)
     
-    def send_json_response(self, data, status=200):
+    def backend(self):
+        """The message module, waiting for warm-up if needed; None (after a 503) if not loaded in time"""
+        try:
+            backend = warmup.wait(self.request_timeout)
+        except RuntimeError as e:
+            self.send_json_response({'success': False, 'error': str(e)}, 503)
+            return None
+        if backend is None:
+            self.send_json_response({'success': False, 'error': 'Backend is still starting'}, 503)
+        return backend
+
+    def apply_client_timeout(self, options):
+        """Use the client's deadline for this request when it is shorter than the server's"""
+        self.request_timeout = client_timeout(options, self.headers.get('X-Request-Timeout'),
+                                              type(self).request_timeout)
+    
+    def client_gone(self):
+        """True once the client has closed the connection (EOF on a non-consuming peek)"""
+        try:
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            return bool(readable) and self.connection.recv(1, socket.MSG_PEEK) == b''
+        except (OSError, ValueError):
+            return True
+    
+    def disconnected(self):
+        """The client left: nothing more to send; count it in the metrics"""
+        metrics.record_error('client_disconnect')
+        self.status = CLIENT_CLOSED
+        self.close_connection = True
+    
+    def admit(self, priority):
+        """Take an admission slot; False (after a 429/503 with Retry-After) when saturated"""
+        if admission is None:
+            return True
+        granted = []
+        try:
+            run_async(acquire_slot(priority, granted), abandoned=self.client_gone)
+        except Rejected as e:
+            self.send_json_response({'success': False, 'error': str(e)}, e.status,
+                                    {'Retry-After': str(e.retry_after)})
+            return False
+        except ClientDisconnected:
+            agent_loop.call_soon_threadsafe(release_if_granted, granted)
+            self.disconnected()
+            return False
+        return True
+    
+    def calculate(self, expression, cache=True, priority=None, session_id=None):
+        backend = self.backend()
+        if backend is None or not self.admit(priority):
+            return
+        started = time.perf_counter()
+        try:
+            answer = run_async(backend.handle_message(expression, cache, session_id), self.request_timeout,
+                               self.client_gone)
+        except ClientDisconnected:
+            self.disconnected()
+            return
+        except FutureTimeoutError:
+            metrics.record_error('timeout')
+            self.send_json_response({'success': False, 'error': f'Request timed out after {self.request_timeout:g}s'}, 504)
+            return
+        except Exception as e:
+            print(f"❌ Error processing message: {e}")
+            self.send_json_response({'success': False, 'error': f'Server error: {str(e)}'}, 500)
+            return
+        finally:
+            if admission is not None:
+                agent_loop.call_soon_threadsafe(admission.release, time.perf_counter() - started)
+        self.send_json_response({'success': True, **answer})
+    
+    def stream_calculate(self, expression, cache=True, priority=None, session_id=None):
+        """Send agent progress as Server-Sent Events until the result arrives"""
+        backend = self.backend()
+        if backend is None or not self.admit(priority):
+            return
+        events = backend.stream_message(expression, cache, session_id)
+        if admission is not None:
+            events = admission.release_after(events)
+        self.send_events(events, self.request_timeout)
+    
+    def batch(self, expressions, concurrency, stream=False, cache=True, priority=None):
+        """Run a batch; request_timeout applies to each item rather than the whole batch"""
+        backend = self.backend()
+        if backend is None:
+            return
+        # Every item takes its own admission slot, so a batch cannot starve single requests
+        admit = None if admission is None else lambda: admission.slot(priority)
+        if stream:
+            self.send_events(backend.stream_batch(expressions, concurrency, cache, self.request_timeout, admit))
+            return
+        try:
+            answer = run_async(backend.handle_batch(expressions, concurrency, cache, self.request_timeout, admit),
+                               abandoned=self.client_gone)
+        except ClientDisconnected:
+            self.disconnected()
+            return
+        except Exception as e:
+            print(f"❌ Error processing batch: {e}")
+            self.send_json_response({'success': False, 'error': f'Server error: {str(e)}'}, 500)
+            return
+        self.send_json_response({'success': True, **answer})
+    
+    def send_events(self, events, timeout=None):
+        """Write (event, data) items from an async generator as Server-Sent Events"""
+        deadline = time.monotonic() + timeout if timeout else None
+        items = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(pump_events(events, items), agent_loop)
+        finished = False
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            
+            while True:
+                wait = DISCONNECT_POLL_INTERVAL
+                if deadline is not None:
+                    wait = min(wait, max(deadline - time.monotonic(), 0))
+                try:
+                    item = items.get(timeout=wait)
+                except queue.Empty:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        metrics.record_error('timeout')
+                        self.wfile.write(sse_frame('error', {'error': f'Request timed out after {timeout:g}s'}))
+                        break
+                    if self.client_gone():
+                        self.disconnected()
+                        break
+                    continue
+                if item is None:
+                    finished = True
+                    break
+                self.wfile.write(sse_frame(*item))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            if not finished:
+                # Cancelling the pump closes the generator (and stops the agent run behind it);
+                # its final None says the close is done
+                future.cancel()
+                close_deadline = time.monotonic() + EVENTS_CLOSE_TIMEOUT
+                try:
+                    while items.get(timeout=max(close_deadline - time.monotonic(), 0)) is not None:
+                        pass
+                except queue.Empty:
+                    print("⚠️ Event stream did not close in time")
+        if finished:
+            try:
+                future.result(EVENTS_CLOSE_TIMEOUT)
+            except Exception as e:
+                print(f"❌ Error streaming events: {e}")
+    
+    def send_json_response(self, data, status=200, headers=None):
         self.send_response(status)
         self.send_header('Content-Type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.end_headers()
         self.wfile.write(json.dumps(data).encode('utf-8'))
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='FIXR Backend Server')
+    parser.add_argument('port', nargs='?', type=int, default=8080)
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        default=os.environ.get('FIXR_ASYNC_SERVER') == '1',
+                        help='Serve every request on one asyncio event loop')
+    parser.add_argument('--timeout', type=float, default=float(os.environ.get('FIXR_REQUEST_TIMEOUT', 120)),
+                        help='Per-request timeout for /calculate in seconds')
+    parser.add_argument('--drain-timeout', type=float, default=float(os.environ.get('FIXR_DRAIN_TIMEOUT', 30)),
+                        help='Seconds to let in-flight requests finish on shutdown (async mode)')
+    return parser.parse_args()
+
 if __name__ == '__main__':
-    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
-    server = HTTPServer(('', port), ServerHandler)
+    args = parse_args()
+    port = args.port
     
     # Detect platform and show appropriate instructions
     system = platform.system()
@@ -129,11 +428,32 @@ if __name__ == '__main__':
     print(f"Platform: {system}")
     print(f"Python: {sys.version}")
     print(f"Server URL: http://localhost:{port}")
+    print(f"Mode: {'asyncio' if args.use_async else 'threaded'}")
     print("Press Ctrl+C to stop the server")
     print("-" * 50)
     
+    if args.use_async:
+        from async_server import run_server
+        run_server(port, request_timeout=args.timeout, drain_timeout=args.drain_timeout)
+        sys.exit(0)
+    
+    ServerHandler.request_timeout = args.timeout
+    # Bind first so /health answers while the agent stack loads in the background
+    server = ThreadingHTTPServer(('', port), ServerHandler)
+    server.daemon_threads = True
+    
+    threading.Thread(target=agent_loop.run_forever, daemon=True).start()
+    warm_up_threaded(run_async)
+    
     try:
         server.serve_forever()
     except KeyboardInterrupt:
         print("\nServer stopped by user")
-        server.shutdown()
\ No newline at end of file
+        server.shutdown()
+    finally:
+        server.server_close()
+        if warmup.backend is not None:
+            run_async(warmup.backend.runtime.stop())
+        run_async(key_verifier.aclose())
+        agent_loop.call_soon_threadsafe(agent_loop.stop)
+        print("Agent runtime stopped")
\ No newline at end of file
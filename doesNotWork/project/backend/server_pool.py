@@ -0,0 +1,208 @@
+"""
+Supervised pool of MCP server connections (fetch, everything-search, mcp-server-commands).
+
+The pool owns the persistent MCPConnectionManager that every agent in the
+process shares, launches the servers once, pings them periodically and
+restarts crashed ones with exponential backoff.
+"""
+
+import asyncio
+import time
+
+from mcp_agent.logging.logger import get_logger
+from mcp_agent.mcp.mcp_agent_client_session import MCPAgentClientSession
+from mcp_agent.mcp.mcp_connection_manager import MCPConnectionManager
+
+from metrics import record_error, span
+
+logger = get_logger(__name__)
+
+
+def server_configs(settings):
+    """{name: server settings} from the mcp.servers section of mcp_agent settings"""
+    return dict(getattr(getattr(settings, 'mcp', None), 'servers', None) or {})
+
+
+def _dump(config):
+    return config.model_dump() if hasattr(config, 'model_dump') else config
+
+
+def server_changes(old_settings, new_settings, names):
+    """
+    (changed, missing) among the servers in names: changed have a different
+    configuration in new_settings, missing are no longer configured at all
+    """
+    old, new = server_configs(old_settings), server_configs(new_settings)
+    changed = [name for name in names if name in new and _dump(new[name]) != _dump(old.get(name))]
+    missing = [name for name in names if name not in new]
+    return changed, missing
+
+
+class ServerState:
+    def __init__(self, name):
+        self.name = name
+        self.healthy = False
+        self.restarts = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_check = None
+        self.next_check = 0.0
+        self.next_attempt = 0.0
+
+    def to_dict(self):
+        return {
+            'healthy': self.healthy,
+            'restarts': self.restarts,
+            'last_error': self.last_error,
+            'last_check': self.last_check,
+        }
+
+
+class MCPServerPool:
+    """
+    Keeps MCP server subprocesses alive between requests.
+
+    Agents created with connection persistence pick up the manager from the
+    context, so they share these connections instead of spawning their own.
+    start() and stop() must be called from the same task (anyio task groups).
+    """
+
+    def __init__(self, context, server_names, health_interval=30.0, ping_timeout=5.0,
+                 backoff_base=1.0, max_backoff=60.0):
+        self.context = context
+        self.server_names = list(server_names)
+        self.health_interval = health_interval
+        self.ping_timeout = ping_timeout
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.states = {name: ServerState(name) for name in self.server_names}
+        self.manager = None
+        self._supervisor = None
+        self._locks = {name: asyncio.Lock() for name in self.server_names}
+
+    async def start(self):
+        context = self.context
+        if getattr(context, '_mcp_connection_manager', None) is None:
+            self.manager = MCPConnectionManager(context.server_registry)
+            await self.manager.__aenter__()
+            context._mcp_connection_manager = self.manager
+            context._mcp_connection_manager_ref_count = 0
+            context._mcp_connection_manager_lock = asyncio.Lock()
+        else:
+            self.manager = context._mcp_connection_manager
+
+        # Hold our own reference so the manager survives the last agent shutting down
+        context._mcp_connection_manager_ref_count += 1
+
+        await asyncio.gather(*(self._connect(name) for name in self.server_names))
+        self._supervisor = asyncio.create_task(self._supervise())
+
+    async def stop(self):
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            await asyncio.gather(self._supervisor, return_exceptions=True)
+            self._supervisor = None
+
+        context = self.context
+        context._mcp_connection_manager_ref_count -= 1
+        if context._mcp_connection_manager_ref_count <= 0 and self.manager is not None:
+            logger.info("Shutting down MCP server pool...")
+            await self.manager.disconnect_all()
+            await self.manager.__aexit__(None, None, None)
+            context._mcp_connection_manager = None
+        self.manager = None
+
+    async def get_server(self, name):
+        """Return a live connection to a server, relaunching it if needed"""
+        async with self._locks[name]:
+            return await self.manager.get_server(name, client_session_factory=MCPAgentClientSession)
+
+    async def check(self, name):
+        """Ping a server; returns True if it answered in time"""
+        state = self.states[name]
+        state.last_check = time.time()
+        try:
+            server_conn = await self.get_server(name)
+            await asyncio.wait_for(server_conn.session.send_ping(), self.ping_timeout)
+        except Exception as e:
+            state.healthy = False
+            state.last_error = str(e) or type(e).__name__
+            return False
+        self._mark_healthy(state)
+        return True
+
+    async def restart(self, name):
+        state = self.states[name]
+        logger.info(f"{name}: Restarting MCP server...", data=state.to_dict())
+        async with self._locks[name]:
+            try:
+                await self.manager.disconnect_server(name)
+            except Exception as e:
+                logger.debug(f"{name}: Error disconnecting server: {e}")
+        state.restarts += 1
+        await self._connect(name)
+
+    async def reconfigure(self, settings, names):
+        """Register the new configuration of these servers and restart them with it"""
+        registry = getattr(self.context.server_registry, 'registry', None)
+        configs = server_configs(settings)
+        for name in names:
+            if registry is not None:
+                registry[name] = configs[name]
+        await asyncio.gather(*(self.restart(name) for name in names if name in self.states))
+
+    async def _connect(self, name):
+        state = self.states[name]
+        try:
+            with span('server_connect'):
+                await self.get_server(name)
+        except Exception as e:
+            record_error('server_connect')
+            state.healthy = False
+            state.last_error = str(e) or type(e).__name__
+            self._schedule_retry(state)
+            logger.error(f"{name}: Failed to start MCP server: {state.last_error}")
+            return False
+        self._mark_healthy(state)
+        state.next_check = time.monotonic() + self.health_interval
+        return True
+
+    @staticmethod
+    def _mark_healthy(state):
+        # A server that recovered starts over at the shortest backoff the next time it fails
+        state.healthy = True
+        state.failures = 0
+        state.next_attempt = 0.0
+        state.last_error = None
+
+    def _schedule_retry(self, state):
+        delay = min(self.backoff_base * (2 ** state.failures), self.max_backoff)
+        state.failures += 1
+        state.next_attempt = time.monotonic() + delay
+
+    async def _supervise(self):
+        while True:
+            await asyncio.sleep(self._next_wakeup())
+            for name, state in self.states.items():
+                now = time.monotonic()
+                if state.healthy:
+                    if now < state.next_check:
+                        continue
+                    state.next_check = now + self.health_interval
+                    if await self.check(name):
+                        continue
+                    logger.warning(f"{name}: Health check failed: {state.last_error}")
+                    self._schedule_retry(state)
+                elif now >= state.next_attempt:
+                    await self.restart(name)
+
+    def _next_wakeup(self):
+        now = time.monotonic()
+        due = [
+            state.next_check if state.healthy else state.next_attempt
+            for state in self.states.values()
+        ]
+        return max(min(due, default=now + self.health_interval) - now, 0.1)
+
+    def status(self):
+        return {name: state.to_dict() for name, state in self.states.items()}
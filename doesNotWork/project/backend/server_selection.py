@@ -0,0 +1,99 @@
+"""
+Per-request choice of the MCP servers whose tools the LLM gets to see.
+
+A keyword classifier maps the request to what it needs: finding files or apps
+(everything-search), running or closing programs (mcp-server-commands, which
+for "open X" also needs the search), or reading the web (fetch). Only those
+servers' tool schemas go into the prompt. When the request matches nothing,
+or reads like several things at once, the classifier is not confident and the
+agent keeps every server. Tools defined in-process (search, find_application)
+are always offered.
+"""
+
+import contextlib
+import contextvars
+import os
+import re
+
+import metrics
+
+SEARCH = 'everything-search'
+COMMANDS = 'mcp-server-commands'
+FETCH = 'fetch'
+
+# (server, pattern, also needs): every rule a request matches adds its servers
+RULES = (
+    (FETCH, re.compile(r'https?://|\bwww\.|\b[\w-]+\.(?:com|org|net|io|dev|gov|edu)\b|\b(?:website|web ?page|url|'
+                       r'download|fetch|online|internet|browse to|news|weather)\b'), ()),
+    (COMMANDS, re.compile(r'^(?:please\s+)?(?:close|quit|exit|kill|stop|shut ?down|restart|reboot|execute|'
+                          r'install|uninstall|delete|remove|rename|move|copy|create|make|mkdir)\b'), ()),
+    (COMMANDS, re.compile(r'^(?:please\s+)?(?:open|launch|start|run)\b'), (SEARCH,)),
+    (SEARCH, re.compile(r'\b(?:find|search|locate|where is|where are|look for|which folder|list (?:my|all)?\s*'
+                        r'(?:files|documents|folders))\b|\.(?!(?:com|org|net|io|dev|gov|edu)\b)\w{2,4}\b'), ()),
+)
+# Several requests in one: don't narrow the tools down
+AMBIGUOUS = re.compile(r'\b(?:and then|and also|then|also|after that|as well)\b|[;]')
+
+CONFIDENT = 0.9
+UNSURE = 0.4
+
+_selected = contextvars.ContextVar('fixr_server_selection', default=None)
+
+
+class Selection:
+    def __init__(self, servers, confidence, fallback):
+        self.servers = servers        # names offered to the LLM
+        self.confidence = confidence
+        self.fallback = fallback      # True: not confident, every server kept
+
+    def to_dict(self):
+        return {'servers': self.servers, 'confidence': self.confidence, 'fallback': self.fallback}
+
+
+class ServerSelector:
+    def __init__(self, server_names, threshold=0.7):
+        self.server_names = list(server_names)
+        self.threshold = threshold
+
+    def classify(self, text):
+        """(servers the request needs, confidence)"""
+        normalized = ' '.join(text.lower().split())
+        needed = []
+        for server, pattern, also in RULES:
+            if pattern.search(normalized):
+                for name in (server,) + also:
+                    if name not in needed:
+                        needed.append(name)
+        if not needed or AMBIGUOUS.search(normalized):
+            return needed, UNSURE
+        return needed, CONFIDENT
+
+    def select(self, text):
+        needed, confidence = self.classify(text)
+        # A needed server that is not running here (e.g. no everything-search off Windows) is simply left out
+        servers = [name for name in self.server_names if name in needed]
+        fallback = confidence < self.threshold or (not servers and SEARCH not in needed)
+        selection = Selection(list(self.server_names) if fallback else servers, confidence, fallback)
+        metrics.server_selections.inc(servers='all' if fallback else '+'.join(servers) or 'none')
+        return selection
+
+
+def current():
+    """Server names the LLM may use for the request being served, or None for all"""
+    return _selected.get()
+
+
+@contextlib.contextmanager
+def using(selection):
+    token = _selected.set(None if selection is None or selection.fallback else selection.servers)
+    try:
+        yield selection
+    finally:
+        _selected.reset(token)
+
+
+def from_env(server_names):
+    """The selector for these servers, or None when FIXR_SERVER_SELECTION=0"""
+    if os.environ.get('FIXR_SERVER_SELECTION', '1') == '0':
+        return None
+    return ServerSelector(server_names, threshold=float(os.environ.get('FIXR_SERVER_SELECTION_THRESHOLD', 0.7)))
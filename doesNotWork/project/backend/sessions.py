@@ -0,0 +1,223 @@
+"""
+Server-side conversation sessions.
+
+A request that carries a session_id continues that conversation. The agent
+gets a compact transcript of the earlier turns (requests, answers, the tool
+calls behind them) that fits a token budget: tool outputs are cut to a few
+lines, and the oldest turns are dropped first. Read-only tool calls already
+made in the session (searches, application lookups, fetches) are answered
+from it instead of running again, and "close it" after "open Discord" is
+resolved to "close discord" so the fast path can take it.
+
+Sessions live in memory: at most FIXR_SESSION_MAX (LRU), dropped after
+FIXR_SESSION_TTL idle seconds. FIXR_SESSIONS=0 turns them off.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import json
+import os
+import time
+from collections import OrderedDict
+
+from intents import PRONOUN, classify
+
+VERBS = {'launch': 'open', 'open_file': 'open', 'close': 'close'}
+MAX_SESSION_ID = 128
+
+_current = contextvars.ContextVar('fixr_session', default=None)
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for English and paths)"""
+    return (len(text) + 3) // 4
+
+
+def truncate(text, tokens):
+    """text cut to about `tokens` tokens"""
+    limit = tokens * 4
+    if len(text) <= limit:
+        return text
+    return text[:limit].rstrip() + ' …'
+
+
+def result_text(result):
+    """Text content of a tool result"""
+    parts = [getattr(content, 'text', None) for content in getattr(result, 'content', None) or []]
+    return '\n'.join(part for part in parts if part)
+
+
+def current():
+    """The session of the request being served, if it has one"""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def using(session):
+    token = _current.set(session)
+    try:
+        yield session
+    finally:
+        _current.reset(token)
+
+
+class Session:
+    def __init__(self, session_id, history_tokens, tool_result_tokens, reuse_ttl, side_effect_servers):
+        self.id = session_id
+        self.history_tokens = history_tokens
+        self.tool_result_tokens = tool_result_tokens
+        self.reuse_ttl = reuse_ttl
+        self.side_effect_servers = side_effect_servers
+        self.turns = []
+        self.subject = None          # what the last open/close request was about
+        self.lock = asyncio.Lock()   # turns of one session run one at a time
+        self.last_used = time.monotonic()
+        self.reused = 0
+        self._tools = []             # tool calls of the turn in progress
+        self._results = OrderedDict()  # (tool, arguments) -> (time, result), read-only tools only
+
+    def resolve(self, text):
+        """The request with "it"/"that" replaced by the session's subject when it is an open/close request"""
+        intent = classify(text)
+        if intent is None or self.subject is None:
+            return text
+        if PRONOUN.match(intent.target.lower()):
+            return f'{VERBS[intent.kind]} {self.subject}'
+        return text
+
+    def prompt(self, text):
+        """The request prefixed with as much of the conversation as the token budget allows"""
+        if not self.turns:
+            return text
+        budget = self.history_tokens
+        lines = []
+        for turn in reversed(self.turns):
+            rendered = self._render(turn)
+            cost = estimate_tokens(rendered)
+            if cost > budget:
+                break
+            lines.append(rendered)
+            budget -= cost
+        if not lines:
+            return text
+        history = '\n'.join(reversed(lines))
+        return f'Conversation so far (oldest first):\n{history}\n\nCurrent request: {text}'
+
+    def _render(self, turn):
+        lines = [f"User: {turn['request']}"]
+        for name, arguments, output in turn['tools']:
+            lines.append(f'  Tool {name}({arguments}) -> {output}')
+        lines.append(f"Assistant: {truncate(turn['answer'], self.tool_result_tokens)}")
+        return '\n'.join(lines)
+
+    def reusable(self, name):
+        return not name.startswith(self.side_effect_servers)
+
+    def cached_result(self, name, arguments):
+        """Result of an identical read-only tool call made earlier in this session, if still fresh"""
+        if not self.reusable(name):
+            return None
+        entry = self._results.get((name, json.dumps(arguments or {}, sort_keys=True, default=str)))
+        if entry is None or time.monotonic() - entry[0] > self.reuse_ttl:
+            return None
+        self.reused += 1
+        return entry[1]
+
+    def record_tool(self, name, arguments, result):
+        key = json.dumps(arguments or {}, sort_keys=True, default=str)
+        text = ' '.join(result_text(result).split())
+        self._tools.append((name, truncate(key, 50), truncate(text, self.tool_result_tokens)))
+        if self.reusable(name) and not getattr(result, 'isError', False):
+            self._results[(name, key)] = (time.monotonic(), result)
+            self._results.move_to_end((name, key))
+            while len(self._results) > 32:
+                self._results.popitem(last=False)
+
+    def add_turn(self, request, answer):
+        self.turns.append({'request': request, 'answer': answer, 'tools': self._tools})
+        self._tools = []
+        intent = classify(request)
+        if intent is not None and not PRONOUN.match(intent.target.lower()):
+            self.subject = intent.target
+        # Older turns beyond what could ever fit the budget are dropped for good
+        while sum(estimate_tokens(self._render(turn)) for turn in self.turns) > 2 * self.history_tokens:
+            self.turns.pop(0)
+
+    def discard_turn(self):
+        """Forget the tool calls of a turn that failed"""
+        self._tools = []
+
+    def to_dict(self):
+        return {
+            'turns': len(self.turns),
+            'history_tokens': estimate_tokens(self.prompt('')),
+            'subject': self.subject,
+            'reused_tool_results': self.reused,
+        }
+
+
+class SessionStore:
+    def __init__(self, max_sessions=256, ttl=1800.0, history_tokens=1500, tool_result_tokens=120,
+                 reuse_ttl=300.0, side_effect_servers=('mcp-server-commands',)):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.history_tokens = history_tokens
+        self.tool_result_tokens = tool_result_tokens
+        self.reuse_ttl = reuse_ttl
+        self.side_effect_servers = tuple(side_effect_servers)
+        self._sessions = OrderedDict()
+        self.created = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, session_id):
+        """The session with this id, created if new or expired; ValueError for an unusable id"""
+        if not isinstance(session_id, str) or not session_id.strip() or len(session_id) > MAX_SESSION_ID:
+            raise ValueError(f'session_id must be a non-empty string of at most {MAX_SESSION_ID} characters')
+        self._expire()
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = Session(
+                session_id, self.history_tokens, self.tool_result_tokens, self.reuse_ttl, self.side_effect_servers)
+            self.created += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+        self._sessions.move_to_end(session_id)
+        session.last_used = time.monotonic()
+        return session
+
+    def drop(self, session_id):
+        return self._sessions.pop(session_id, None) is not None
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used <= self.ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.expirations += 1
+
+    def stats(self):
+        return {
+            'sessions': len(self._sessions),
+            'max_sessions': self.max_sessions,
+            'ttl': self.ttl,
+            'history_tokens': self.history_tokens,
+            'created': self.created,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+def from_env():
+    """The session store, or None when FIXR_SESSIONS=0"""
+    if os.environ.get('FIXR_SESSIONS', '1') == '0':
+        return None
+    return SessionStore(
+        max_sessions=int(os.environ.get('FIXR_SESSION_MAX', 256)),
+        ttl=float(os.environ.get('FIXR_SESSION_TTL', 1800)),
+        history_tokens=int(os.environ.get('FIXR_SESSION_HISTORY_TOKENS', 1500)),
+    )
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Background warm-up of the agent backend, and a startup-time report.
+
+The front ends bind their port and answer /health straight away; the heavy
+part of startup (importing mcp_agent/openai and message.py, loading config,
+launching the MCP servers) runs in the background through `warmup`, and
+requests that need the agent wait for it. Each phase is timed and reported on
+/health and at startup, and checked against FIXR_STARTUP_BUDGET_MS.
+
+Run `python startup.py` for a per-module import-time breakdown (from
+`python -X importtime`); it exits non-zero when importing message.py takes
+longer than the budget.
+"""
+
+import asyncio
+import importlib
+import os
+import subprocess
+import sys
+import threading
+import time
+
+# Imported one by one so the report shows where the time goes
+HEAVY_MODULES = (
+    'mcp_agent.app',
+    'mcp_agent.agents.agent',
+    'mcp_agent.workflows.llm.augmented_llm_openai',
+    'message',
+)
+
+BUDGET_MS = float(os.environ.get('FIXR_STARTUP_BUDGET_MS', 3000))
+
+
+class Warmup:
+    def __init__(self, modules=HEAVY_MODULES, budget_ms=BUDGET_MS):
+        self.modules = modules
+        self.budget_ms = budget_ms
+        self.started = time.perf_counter()
+        self.import_ms = {}
+        self.phases_ms = {}
+        self.error = None
+        self.backend = None             # the message module, once imported
+        self.loaded = threading.Event()  # imports done (or failed)
+        self.ready = threading.Event()   # agent runtime started
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Import the agent stack (once); returns the message module"""
+        with self._lock:
+            if self.loaded.is_set():
+                return self.backend
+            phase_started = time.perf_counter()
+            try:
+                for name in self.modules:
+                    started = time.perf_counter()
+                    module = importlib.import_module(name)
+                    self.import_ms[name] = round((time.perf_counter() - started) * 1000, 1)
+                self.backend = module
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                self.phases_ms['imports'] = round((time.perf_counter() - phase_started) * 1000, 1)
+                self.loaded.set()
+            return self.backend
+
+    def mark(self, phase, started):
+        self.phases_ms[phase] = round((time.perf_counter() - started) * 1000, 1)
+
+    def finish(self, error=None):
+        """Record the end of warm-up (error: why the runtime could not start)"""
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.phases_ms['total'] = round((time.perf_counter() - self.started) * 1000, 1)
+        self.ready.set()
+
+    def wait(self, timeout=None):
+        """The message module once imports are done; None if still loading after timeout"""
+        if not self.loaded.wait(timeout):
+            return None
+        if self.backend is None:
+            raise RuntimeError(f"Backend failed to load: {self.error}")
+        return self.backend
+
+    async def wait_async(self, timeout=None):
+        if self.loaded.is_set():
+            return self.wait(0)
+        return await asyncio.to_thread(self.wait, timeout)
+
+    def status(self):
+        return {
+            'loaded': self.loaded.is_set(),
+            'ready': self.ready.is_set(),
+            'error': self.error,
+            'import_ms': dict(self.import_ms),
+            'phases_ms': dict(self.phases_ms),
+            'budget_ms': self.budget_ms,
+        }
+
+    def report(self):
+        for name, ms in self.import_ms.items():
+            print(f"  import {name}: {ms:.0f}ms")
+        for phase, ms in self.phases_ms.items():
+            print(f"  {phase}: {ms:.0f}ms")
+        imports = self.phases_ms.get('imports', 0)
+        if imports > self.budget_ms:
+            print(f"❌ Imports took {imports:.0f}ms, over the {self.budget_ms:.0f}ms startup budget")
+
+
+warmup = Warmup()
+
+
+def warm_up_threaded(run_async):
+    """Warm-up for server.py: imports here, runtime start on the agent loop via run_async"""
+    def run():
+        try:
+            backend = warmup.load()
+            started = time.perf_counter()
+            run_async(backend.runtime.start())
+            warmup.mark('runtime_start', started)
+            warmup.finish()
+            print("✅ Agent runtime started")
+        except Exception as e:
+            # Not fatal: the runtime retries on the first request
+            warmup.finish(e)
+            print(f"❌ Error starting agent runtime: {e}")
+        warmup.report()
+
+    thread = threading.Thread(target=run, name='fixr-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+async def warm_up_async():
+    """Warm-up for async_server.py: imports in a worker thread, runtime start on this loop"""
+    try:
+        backend = await asyncio.to_thread(warmup.load)
+        started = time.perf_counter()
+        await backend.runtime.start()
+        warmup.mark('runtime_start', started)
+        warmup.finish()
+        print("✅ Agent runtime started")
+    except Exception as e:
+        warmup.finish(e)
+        print(f"❌ Error starting agent runtime: {e}")
+    warmup.report()
+
+
+def import_times(module='message', top=20):
+    """[(cumulative ms, self ms, module)] for importing a module in a fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        rows.append((int(cumulative_us) / 1000, int(self_us) / 1000, name.strip()))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed')
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    rows = import_times()
+    total = rows[0][0] if rows else 0.0
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for cumulative, own, name in rows:
+        print(f"{cumulative:>10.1f}ms {own:>8.1f}ms  {name}")
+    if total > BUDGET_MS:
+        print(f"❌ import message: {total:.0f}ms (budget {BUDGET_MS:.0f}ms)")
+        sys.exit(1)
+    print(f"✅ import message: {total:.0f}ms (budget {BUDGET_MS:.0f}ms)")
+
+
+if __name__ == '__main__':
+    main()
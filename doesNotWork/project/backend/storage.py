@@ -0,0 +1,22 @@
+"""
+Where the backend keeps its on-disk caches and indexes.
+"""
+
+import os
+import platform
+
+
+def cache_dir():
+    """FIXR_CACHE_DIR, or the platform's per-user cache directory"""
+    path = os.environ.get('FIXR_CACHE_DIR')
+    if path:
+        return path
+    if platform.system() == "Windows":
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'fixr')
+
+
+def cache_path(name):
+    return os.path.join(cache_dir(), name)
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, Rejected
+
+
+def test_waiter_cancelled_as_it_is_granted_frees_the_slot():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=4, queue_timeout=5)
+        await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)  # queued
+        controller.release()    # grants the waiter's slot...
+        waiter.cancel()         # ...which gives up before it resumes
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert controller.in_flight == 0
+        await asyncio.wait_for(controller.acquire(), 1)
+        assert controller.stats()['queued'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=4, queue_timeout=5)
+        await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert controller.stats()['queued'] == 0
+        controller.release()
+        assert controller.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_rejects_with_503():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=4, queue_timeout=0.05)
+        await controller.acquire()
+        with pytest.raises(Rejected) as rejected:
+            await controller.acquire()
+        assert rejected.value.status == 503
+        assert controller.stats()['queued'] == 0
+        controller.release()
+        assert controller.in_flight == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,26 @@
+from app_index import exec_process, read_desktop_file
+
+
+def test_exec_process_skips_wrappers():
+    assert exec_process('/usr/bin/discord') == 'discord'
+    assert exec_process('env FOO=1 BAR="a b" /usr/bin/discord') == 'discord'
+    assert exec_process('env -i A=1 nohup /opt/Slack/slack') == 'slack'
+    assert exec_process('/snap/bin/firefox') == 'firefox'
+
+
+def test_exec_process_hides_nothing_behind_launchers():
+    for command in ('flatpak run com.spotify.Client', 'sh -c "exec foo"', 'env', 'env FOO=1', 'bad "quote'):
+        assert exec_process(command) is None
+
+
+def test_flatpak_desktop_file_uses_startup_wm_class(tmp_path):
+    path = tmp_path / 'com.spotify.Client.desktop'
+    path.write_text('[Desktop Entry]\n'
+                    'Type=Application\n'
+                    'Name=Spotify\n'
+                    'Exec=/usr/bin/flatpak run --branch=stable com.spotify.Client %U\n'
+                    'StartupWMClass=spotify\n')
+    entry = read_desktop_file(str(path))
+    assert entry.name == 'Spotify'
+    assert entry.kind == 'desktop'
+    assert entry.process == 'spotify'
@@ -0,0 +1,27 @@
+import os
+import shutil
+
+from file_index import FileIndex
+
+
+def make_file(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write('x')
+
+
+def test_recreated_directory_is_indexed_again(tmp_path):
+    root = str(tmp_path)
+    make_file(os.path.join(root, 'logs', 'old.txt'))
+    index = FileIndex([root])
+    index._crawl(index.roots[0])
+    assert index.search('old.txt') == [os.path.join(root, 'logs', 'old.txt')]
+
+    shutil.rmtree(os.path.join(root, 'logs'))
+    assert index._poll()
+    assert index.search('old.txt') == []
+
+    make_file(os.path.join(root, 'logs', 'new.txt'))
+    assert index._poll()
+    assert index.search('new.txt') == [os.path.join(root, 'logs', 'new.txt')]
+    assert index.search('old.txt') == []
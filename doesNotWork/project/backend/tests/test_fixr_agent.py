@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip('mcp_agent')
+
+from mcp.types import Tool
+from mcp_agent.app import MCPApp
+from mcp_agent.config import LoggerSettings, MCPServerSettings, MCPSettings, Settings
+from mcp_agent.mcp.mcp_aggregator import MCPAggregator
+
+from cassette import Cassette, request_key
+from fixr_agent import FixrAgent
+from tool_cache import ToolCache
+
+SETTINGS = Settings(
+    execution_engine='asyncio',
+    logger=LoggerSettings(type='none', level='error'),
+    mcp=MCPSettings(servers={'demo': MCPServerSettings(command='demo-mcp-server', args=['demo==1.0'])}),
+)
+
+
+@pytest.fixture
+def listed(monkeypatch):
+    """Servers asked for their capabilities (nothing is started; the listing is made up)"""
+    servers = []
+
+    async def fetch_capabilities(self, server_name):
+        servers.append(server_name)
+        return server_name, [Tool(name='echo', description='Echo', inputSchema={'type': 'object'})], [], []
+
+    async def revalidate_tools(self, server_names=None):
+        return []
+
+    monkeypatch.setattr(MCPAggregator, '_fetch_capabilities', fetch_capabilities)
+    monkeypatch.setattr(FixrAgent, 'revalidate_tools', revalidate_tools)
+    return servers
+
+
+def test_warm_tool_cache_lists_no_tools_at_startup(tmp_path, listed):
+    path = str(tmp_path / 'mcp_tools.json')
+
+    async def start_agent():
+        async with MCPApp(name='test', settings=SETTINGS).run() as app:
+            agent = FixrAgent(name='agent', instruction='x', server_names=['demo'], context=app.context,
+                              tool_cache=ToolCache(path))
+            async with agent:
+                return sorted(agent._namespaced_tool_map)
+
+    assert asyncio.run(start_agent()) == ['demo_echo']
+    assert listed == ['demo']  # cold cache: listed once, then saved
+
+    assert asyncio.run(start_agent()) == ['demo_echo']
+    assert listed == ['demo']  # warm cache: no tools/list
+
+
+def test_cassette_replay_starts_no_server(tmp_path, monkeypatch):
+    started = []
+
+    async def initialize(self, force=False):
+        started.extend(self.server_names)
+
+    monkeypatch.setattr(MCPAggregator, 'initialize', initialize)
+    path = tmp_path / 'run.jsonl'
+    listing = {'tools': [{'name': 'demo_echo', 'inputSchema': {'type': 'object'}}]}
+    path.write_text(json.dumps({'kind': 'list_tools', 'key': request_key('list_tools', None), 'elapsed': 0.0,
+                                'server_name': None, 'result': listing}) + '\n')
+
+    async def replay():
+        async with MCPApp(name='test', settings=SETTINGS).run() as app:
+            agent = FixrAgent(name='agent', instruction='x', server_names=['demo'], context=app.context,
+                              cassette=Cassette(str(path), mode='replay'))
+            async with agent:
+                result = await agent.list_tools()
+            return [tool.name for tool in result.tools]
+
+    assert asyncio.run(replay()) == ['demo_echo']
+    assert started == []
@@ -0,0 +1,87 @@
+import asyncio
+
+from intents import IntentRouter, classify
+
+
+class Result:
+    def __init__(self, is_error=False, text=''):
+        self.isError = is_error
+        self.content = [type('Text', (), {'text': text})()]
+
+
+class Agent:
+    """Runs no command; answers every tool call with the given result"""
+
+    def __init__(self, result=None):
+        self.result = result or Result()
+        self.commands = []
+
+    async def call_tool(self, name, arguments):
+        if 'command' in arguments:
+            self.commands.append(arguments['command'])
+        return self.result
+
+
+class Entry:
+    def __init__(self, name, process, kind='desktop', path=''):
+        self.name = name
+        self.process = process
+        self.kind = kind
+        self.path = path
+
+
+class AppIndex:
+    def __init__(self, *entries):
+        self.entries = {entry.name.lower(): entry for entry in entries}
+
+    def lookup(self, name):
+        entry = self.entries.get(name.lower())
+        return [entry] if entry else []
+
+
+def handle(text, agent, app_index=None):
+    router = IntentRouter('search', system='Linux', app_index=app_index)
+    return asyncio.run(router.try_handle(agent, text))
+
+
+close = handle
+
+
+def test_close_known_app():
+    agent = Agent()
+    assert close('close chrome', agent) == 'Closed chrome.'
+    assert agent.commands == ['pkill -i -x -- chrome']
+
+
+def test_close_app_from_the_index():
+    agent = Agent()
+    assert close('quit discord', agent, AppIndex(Entry('Discord', 'Discord'))) == 'Closed discord.'
+    assert agent.commands == ['pkill -i -x -- Discord']
+
+
+def test_close_unknown_target_goes_to_the_agent():
+    for text in ('exit fullscreen', 'kill time', 'close the window'):
+        agent = Agent()
+        assert close(text, agent, AppIndex(Entry('Discord', 'Discord'))) is None
+        assert agent.commands == []
+    assert classify('stop the music') is None
+
+
+def test_failed_close_goes_to_the_agent():
+    agent = Agent(Result(is_error=True, text='no process found'))
+    assert close('close firefox', agent) is None
+    assert agent.commands == ['pkill -i -x -- firefox']
+
+
+def test_path_binaries_are_not_run_on_the_fast_path():
+    index = AppIndex(Entry('shutdown', 'shutdown', kind='binary', path='/usr/sbin/shutdown'))
+    for text in ('kill shutdown', 'run shutdown'):
+        agent = Agent()  # the search finds nothing either
+        assert handle(text, agent, index) is None
+        assert agent.commands == []
+
+
+def test_executable_files_go_to_the_agent():
+    agent = Agent()
+    assert handle('open setup.exe', agent) is None
+    assert agent.commands == []
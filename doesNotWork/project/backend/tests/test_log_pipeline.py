@@ -0,0 +1,32 @@
+import json
+import logging
+
+from log_pipeline import JsonFormatter, NamespaceFilter
+
+
+def event_record(namespace, message, level=logging.INFO):
+    """A record as mcp_agent's LoggingListener logs an event"""
+    return logging.getLogger('mcp_agent').makeRecord(
+        'mcp_agent', level, __file__, 1, '[%s] %s', (namespace, message), None,
+        extra={'event_data': {'server': 'fetch'}, 'span_id': None, 'trace_id': None, 'event_name': None})
+
+
+def test_filter_uses_the_event_namespace():
+    namespace_filter = NamespaceFilter({'mcp_agent.mcp': logging.WARNING}, logging.DEBUG, {})
+    assert not namespace_filter.filter(event_record('mcp_agent.mcp.mcp_aggregator', 'Loading tools'))
+    assert namespace_filter.filter(event_record('mcp_agent.mcp.mcp_aggregator', 'Failed', logging.WARNING))
+    assert namespace_filter.filter(event_record('mcp_agent.core.context', 'Configuring'))
+
+
+def test_json_line_has_the_event_namespace_and_message():
+    entry = json.loads(JsonFormatter().format(event_record('mcp_agent.mcp.mcp_aggregator', 'Loading tools')))
+    assert entry['namespace'] == 'mcp_agent.mcp.mcp_aggregator'
+    assert entry['message'] == 'Loading tools'
+    assert entry['data'] == {'server': 'fetch'}
+
+
+def test_other_records_use_the_logger_name():
+    record = logging.getLogger('server_pool').makeRecord(
+        'server_pool', logging.INFO, __file__, 1, 'Restarted %s', ('fetch',), None)
+    entry = json.loads(JsonFormatter().format(record))
+    assert (entry['namespace'], entry['message']) == ('server_pool', 'Restarted fetch')
@@ -0,0 +1,57 @@
+import pytest
+
+Tool = pytest.importorskip('mcp.types').Tool
+
+from token_budget import TokenBudget, from_env
+
+SEARCH = Tool(
+    name='everything-search_search',
+    description='Search for files and folders. Supports wildcards, ext: and path: filters. '
+                'Results are sorted by name.',
+    inputSchema={
+        'type': 'object',
+        'title': 'searchArguments',
+        '$schema': 'http://json-schema.org/draft-07/schema#',
+        'properties': {
+            'query': {
+                'type': 'string',
+                'title': 'Query',
+                'description': 'Search query. Use *.txt for extensions, "quoted phrases" for exact '
+                               'names and path:dir to search under a folder. Example: ext:pdf report',
+            },
+            'max_results': {'type': 'integer', 'default': 100, 'description': 'At most 1000.'},
+            'sort': {'type': 'string', 'default': None},
+        },
+        'required': ['query'],
+    },
+)
+
+
+def test_compaction_is_off_by_default(monkeypatch):
+    monkeypatch.delenv('FIXR_PROMPT_COMPACT', raising=False)
+    budget = from_env()
+    assert budget.compact_tools([SEARCH]) == [SEARCH]
+
+
+def test_compacted_schema_keeps_parameter_descriptions():
+    compacted, = TokenBudget(compact=True).compact_tools([SEARCH])
+    schema = compacted.inputSchema
+    assert compacted.description == 'Search for files and folders.'
+    assert 'title' not in schema and '$schema' not in schema
+    assert schema['type'] == 'object'
+    assert schema['required'] == ['query']
+    assert schema['properties']['query'] == {
+        'type': 'string', 'description': SEARCH.inputSchema['properties']['query']['description']}
+    assert schema['properties']['max_results'] == SEARCH.inputSchema['properties']['max_results']
+    assert schema['properties']['sort'] == {'type': 'string'}
+    # Still a tool the client accepts
+    Tool.model_validate(compacted.model_dump())
+
+
+def test_compacted_schema_is_a_valid_json_schema():
+    jsonschema = pytest.importorskip('jsonschema')
+    compacted, = TokenBudget(compact=True).compact_tools([SEARCH])
+    jsonschema.Draft7Validator.check_schema(compacted.inputSchema)
+    jsonschema.validate({'query': 'ext:pdf report', 'max_results': 5}, compacted.inputSchema)
+    with pytest.raises(jsonschema.ValidationError):
+        jsonschema.validate({'max_results': 5}, compacted.inputSchema)
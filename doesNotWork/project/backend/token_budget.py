@@ -0,0 +1,212 @@
+"""
+Token accounting and compaction for what each chat completion sends.
+
+Every completion of the tool loop sends the windows_assistant instruction, the
+JSON schema of every offered tool and the whole conversation so far (the
+request, the model's tool calls and the tool results). Before each completion
+those parts are estimated (about 4 characters per token) and observed in
+fixr_prompt_tokens{part=system|tools|history|tool_results}; the llm_turn
+progress event carries the same numbers.
+
+Compaction (off by default, FIXR_PROMPT_COMPACT=1 turns it on) makes the
+prompt smaller without changing what the tools accept:
+
+    instruction    the indentation of its lines is removed
+    tool schemas   titles, $schema, examples and null defaults are dropped;
+                   parameter descriptions are kept as they are (they hold the
+                   usage details: query syntax, limits)
+    descriptions   a tool's own description is cut to its first sentence
+                   (FIXR_TOOL_DESCRIPTION_CHARS, 200)
+    tool results   each is cut to FIXR_TOOL_RESULT_TOKENS (1000), and once the
+                   results of one request add up to FIXR_TOOL_LOOP_TOKENS (4000)
+                   further results get only FIXR_TOOL_RESULT_MIN_TOKENS (64)
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import re
+
+import metrics
+from sessions import estimate_tokens, truncate
+
+PARTS = ('system', 'tools', 'history', 'tool_results')
+
+# Schema keys that only document the schema; the model does not need them to call the tool
+DROPPED_KEYS = ('title', '$schema', 'examples', '$comment')
+FIRST_SENTENCE = re.compile(r'^(.+?[.!?])(?:\s|$)', re.S)
+
+_current = contextvars.ContextVar('fixr_prompt_budget', default=None)
+
+
+def json_tokens(value):
+    return estimate_tokens(json.dumps(value, separators=(',', ':'), default=str))
+
+
+def shorten(text, chars):
+    """First sentence of a description (or its first paragraph), at most `chars` characters"""
+    text = ' '.join(text.split('\n\n', 1)[0].split())
+    match = FIRST_SENTENCE.match(text)
+    if match:
+        text = match.group(1)
+    if len(text) > chars:
+        text = text[:chars].rstrip() + '…'
+    return text
+
+
+def compact_schema(schema):
+    """A copy of a JSON schema without documentation-only keys (descriptions are kept)"""
+    if isinstance(schema, list):
+        return [compact_schema(item) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    compacted = {}
+    for key, value in schema.items():
+        if key in DROPPED_KEYS or (key == 'default' and value is None):
+            continue
+        if key in ('properties', '$defs', 'definitions') and isinstance(value, dict):
+            # Keys here are property names, not schema keywords: a property called "title" stays
+            compacted[key] = {name: compact_schema(item) for name, item in value.items()}
+        else:
+            compacted[key] = compact_schema(value)
+    return compacted
+
+
+def tool_tokens(tool):
+    """Tokens one tool takes in the request (name, description and parameter schema)"""
+    return json_tokens({'name': tool.name, 'description': tool.description, 'parameters': tool.inputSchema})
+
+
+class PromptBudget:
+    """
+    Token estimates of the parts of the prompt for one generate() call. Tool
+    calls of one turn run in parallel tasks and all add to the same budget.
+    """
+
+    def __init__(self, system, request, loop_tokens):
+        self.parts = dict.fromkeys(PARTS, 0)
+        self.parts['system'] = system
+        self.parts['history'] = request
+        self.loop_tokens = loop_tokens
+        self.completions = 0
+        self.truncated = 0
+
+    def add(self, part, tokens):
+        self.parts[part] += tokens
+
+    def set(self, part, tokens):
+        self.parts[part] = tokens
+
+    def completion(self):
+        """Observe the parts for the completion about to be sent; returns them with their total"""
+        self.completions += 1
+        for part, tokens in self.parts.items():
+            metrics.prompt_tokens.observe(tokens, part=part)
+        return {**self.parts, 'total': sum(self.parts.values())}
+
+    def to_dict(self):
+        return {**self.parts, 'completions': self.completions, 'truncated_tool_results': self.truncated}
+
+
+class TokenBudget:
+    def __init__(self, compact=False, description_chars=200, tool_result_tokens=1000, loop_tokens=4000,
+                 min_tool_result_tokens=64):
+        self.compact = compact
+        self.description_chars = description_chars
+        self.tool_result_tokens = tool_result_tokens
+        self.loop_tokens = loop_tokens
+        self.min_tool_result_tokens = min_tool_result_tokens
+        self._compacted = {}  # tool name -> (tool as listed, compacted copy)
+
+    def start(self, system, request):
+        """A budget for one generate() call"""
+        return PromptBudget(estimate_tokens(system or ''), estimate_tokens(request_text(request)), self.loop_tokens)
+
+    def compact_instruction(self, instruction):
+        """The system prompt without the indentation and blank lines of its source"""
+        if not self.compact:
+            return instruction
+        return '\n'.join(line.strip() for line in instruction.splitlines() if line.strip())
+
+    def compact_tools(self, tools):
+        """The tools with compacted descriptions and schemas (unchanged when compaction is off)"""
+        if not self.compact:
+            return tools
+        return [self._compact_tool(tool) for tool in tools]
+
+    def _compact_tool(self, tool):
+        # Listings repeat the same tools (often as fresh copies), so each is compacted once
+        entry = self._compacted.get(tool.name)
+        if entry is None or (entry[0] is not tool and entry[0] != tool):
+            entry = self._compacted[tool.name] = (tool, tool.model_copy(update={
+                'description': shorten(tool.description, self.description_chars) if tool.description else tool.description,
+                'inputSchema': compact_schema(tool.inputSchema),
+            }))
+        return entry[1]
+
+    def result_limit(self, budget):
+        """Tokens the next tool result may take"""
+        if not self.compact:
+            return None
+        if budget is None:
+            return self.tool_result_tokens
+        remaining = budget.loop_tokens - budget.parts['tool_results']
+        return max(self.min_tool_result_tokens, min(self.tool_result_tokens, remaining))
+
+    def limit_result(self, message, budget):
+        """
+        A tool result message (role "tool") with its text cut to the result limit;
+        counts it in the budget
+        """
+        limit = self.result_limit(budget)
+        content = message.get('content')
+        if limit is not None:
+            if isinstance(content, str):
+                content = truncate(content, limit) if estimate_tokens(content) > limit else content
+            elif isinstance(content, list):
+                content = [self._limit_part(part, limit) for part in content]
+            if content != message.get('content'):
+                message = {**message, 'content': content}
+                if budget is not None:
+                    budget.truncated += 1
+        if budget is not None:
+            budget.add('tool_results', json_tokens(message.get('content')))
+        return message
+
+    @staticmethod
+    def _limit_part(part, limit):
+        text = part.get('text') if isinstance(part, dict) else None
+        if text is None or estimate_tokens(text) <= limit:
+            return part
+        return {**part, 'text': truncate(text, limit)}
+
+
+def request_text(message):
+    if isinstance(message, str):
+        return message
+    return json.dumps(message, default=str)
+
+
+def current():
+    """The prompt budget of the generate() call being served, if any"""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def using(budget):
+    token = _current.set(budget)
+    try:
+        yield budget
+    finally:
+        _current.reset(token)
+
+
+def from_env():
+    return TokenBudget(
+        compact=os.environ.get('FIXR_PROMPT_COMPACT', '0') == '1',
+        description_chars=int(os.environ.get('FIXR_TOOL_DESCRIPTION_CHARS', 200)),
+        tool_result_tokens=int(os.environ.get('FIXR_TOOL_RESULT_TOKENS', 1000)),
+        loop_tokens=int(os.environ.get('FIXR_TOOL_LOOP_TOKENS', 4000)),
+        min_tool_result_tokens=int(os.environ.get('FIXR_TOOL_RESULT_MIN_TOKENS', 64)),
+    )
@@ -0,0 +1,146 @@
+"""
+On-disk cache of the MCP servers' tool lists.
+
+Initializing the agent normally asks every server for tools/list before the
+first completion can go out. With a cached listing the agent starts from the
+listing saved by an earlier run and asks the servers again in the background.
+When a server's tools turned out different (a new package version, a changed
+description), the agent's tools and the cache are updated in place.
+
+A listing is keyed by the server's command, args and package version (the
+version pinned in args: mcp-server-fetch==2025.1.17, mcp-server-commands@0.6),
+so changing a server's configuration never reuses the old listing. Upgrades of
+unpinned packages are caught by the background check.
+
+    FIXR_TOOL_CACHE=0     always list tools before the agent starts
+    FIXR_TOOL_CACHE_PATH  cache file (mcp_tools.json in the cache directory)
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import metrics
+from storage import cache_path
+
+FORMAT_VERSION = 1
+PINNED = re.compile(r'^(?:@?[\w.-]+/)?[\w.-]+(?:==|@)(\d[\w.+-]*)$')
+
+
+def package_version(config):
+    """The package version pinned in a server's args, or None"""
+    for arg in getattr(config, 'args', None) or ():
+        match = PINNED.match(str(arg))
+        if match:
+            return match.group(1)
+    return None
+
+
+def server_key(config):
+    """Cache key for a server configuration (command, args, pinned package version)"""
+    parts = {
+        'command': getattr(config, 'command', None),
+        'args': list(getattr(config, 'args', None) or ()),
+        'url': getattr(config, 'url', None),
+        'version': package_version(config),
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def dump_tools(tools):
+    return [tool.model_dump(mode='json', exclude_none=True) for tool in tools]
+
+
+async def fetch_tools(session):
+    """Every tool a server lists (all pages)"""
+    result = await session.list_tools()
+    tools = list(result.tools or [])
+    while getattr(result, 'nextCursor', None):
+        result = await session.list_tools(cursor=result.nextCursor)
+        tools.extend(result.tools or [])
+    return tools
+
+
+class ToolCache:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = None  # server key -> {'server', 'tools', 'saved'}
+        self.hits = 0
+        self.misses = 0
+        self.unchanged = 0
+        self.changed = 0
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        if not isinstance(state, dict) or state.get('version') != FORMAT_VERSION \
+                or not isinstance(state.get('servers'), dict):
+            state = {'servers': {}}
+        self._entries = state['servers']
+
+    def get(self, config):
+        """The cached tool listing (list of dicts) for a server configuration, or None"""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(server_key(config))
+        if entry is None:
+            self.misses += 1
+            metrics.tool_cache_results.inc(result='miss')
+            return None
+        self.hits += 1
+        metrics.tool_cache_results.inc(result='hit')
+        return entry['tools']
+
+    def put(self, name, config, tools):
+        """
+        Save a server's tool listing (list of dicts); returns False if it matches
+        what was cached already, in which case nothing is written
+        """
+        key = server_key(config)
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is not None and entry['tools'] == tools:
+                self.unchanged += 1
+                metrics.tool_cache_results.inc(result='unchanged')
+                return False
+            self._entries[key] = {'server': name, 'tools': tools, 'saved': time.time()}
+            self.changed += 1
+            self._save()
+        metrics.tool_cache_results.inc(result='changed')
+        return True
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': FORMAT_VERSION, 'servers': self._entries}, f)
+        os.replace(tmp_path, self.path)
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries or {})
+        return {
+            'path': self.path,
+            'servers': entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'unchanged': self.unchanged,
+            'changed': self.changed,
+        }
+
+
+def from_env():
+    """The tool list cache, or None when FIXR_TOOL_CACHE=0"""
+    if os.environ.get('FIXR_TOOL_CACHE', '1') == '0':
+        return None
+    return ToolCache(os.environ.get('FIXR_TOOL_CACHE_PATH') or cache_path('mcp_tools.json'))
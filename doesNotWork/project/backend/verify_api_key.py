@@ -2,85 +2,243 @@
 """
 OpenAI API Key Verification Script
 Validates an API key by making a test request to OpenAI
+
+The backend verifies keys in process (POST /verify-api-key) with KeyVerifier:
+one pooled keep-alive client, results cached by key hash, concurrent checks of
+the same key collapsed into one request. The command line form below is kept
+for scripts.
+
+    OPENAI_BASE_URL           API base URL (https://api.openai.com/v1), e.g. a local stub
+    FIXR_VERIFY_MODEL         model looked up to check the key (gpt-4o)
+    FIXR_VERIFY_TTL           seconds a valid result is cached (300)
+    FIXR_VERIFY_NEGATIVE_TTL  seconds an invalid-key result is cached (60)
 """
 
+import asyncio
+import hashlib
 import json
+import os
 import sys
+import time
+from collections import OrderedDict
 from urllib.request import Request, urlopen
 from urllib.error import HTTPError, URLError
 
-def verify_openai_api_key(api_key):
-    """
-    Verify an OpenAI API key by making a test request
-    Returns: (is_valid: bool, message: str, details: dict)
-    """
-    
-    # Basic format validation
+DEFAULT_BASE_URL = 'https://api.openai.com/v1'
+DEFAULT_MODEL = 'gpt-4o'
+USER_AGENT = 'FIXR-API-Verification/1.0'
+
+# Results that say something about the key itself; network trouble and rate limits are not cached
+CACHED_ERRORS = ('invalid_key',)
+
+
+def check_format(api_key):
+    """(False, message, {}) when the key cannot be valid, without asking OpenAI; None otherwise"""
     if not api_key:
         return False, "API key is empty", {}
-    
+
     if not api_key.startswith('sk-'):
         return False, "Invalid API key format. OpenAI API keys start with 'sk-'", {}
-    
+
     if len(api_key) < 20:
         return False, "API key is too short", {}
-    
+    return None
+
+
+def interpret(status, body, model):
+    """
+    (is_valid, message, details) for the response to GET /models/<model>.
+    404 still means the key was accepted: only the model is not available to it.
+    """
+    if status == 200:
+        return True, "API key is valid!", {'model': model, 'model_available': True}
+    try:
+        error_message = json.loads(body).get('error', {}).get('message', 'Unknown API error')
+    except (ValueError, AttributeError):
+        return False, f"OpenAI API Error: HTTP {status}", {'error_type': 'http_error'}
+
+    lowered = error_message.lower()
+    if status == 401 or 'invalid_api_key' in lowered or 'incorrect api key' in lowered:
+        return False, "Invalid API key. Please check your key and try again.", {'error_type': 'invalid_key'}
+    elif status == 404:
+        return True, f"API key is valid, but {model} is not available to it.", {'model': model, 'model_available': False}
+    elif 'insufficient_quota' in lowered:
+        return False, "API key is valid but you've exceeded your quota. Please check your billing.", {'error_type': 'quota_exceeded'}
+    elif status == 429 or 'rate_limit' in lowered:
+        return False, "API key is valid but rate limited. Please wait and try again.", {'error_type': 'rate_limited'}
+    else:
+        return False, f"OpenAI API Error: {error_message}", {'error_type': 'api_error'}
+
+
+def verify_openai_api_key(api_key, base_url=None, model=None):
+    """
+    Verify an OpenAI API key by making a test request
+    Returns: (is_valid: bool, message: str, details: dict)
+    """
+
+    # Basic format validation
+    problem = check_format(api_key)
+    if problem:
+        return problem
+
+    base_url = (base_url or os.environ.get('OPENAI_BASE_URL') or DEFAULT_BASE_URL).rstrip('/')
+    model = model or os.environ.get('FIXR_VERIFY_MODEL', DEFAULT_MODEL)
     try:
-        # Make a minimal test request to OpenAI API
-        url = "https://api.openai.com/v1/models"
-        
+        # Look up a single model: a small response, unlike the full model list
         headers = {
             'Authorization': f'Bearer {api_key}',
-            'User-Agent': 'FIXR-API-Verification/1.0'
+            'User-Agent': USER_AGENT
         }
-        
+
         # Create and send the request with 10-second timeout
-        request = Request(url, headers=headers)
-        
+        request = Request(f'{base_url}/models/{model}', headers=headers)
+
         with urlopen(request, timeout=10) as response:
-            if response.status == 200:
-                response_data = json.loads(response.read().decode('utf-8'))
-                
-                # Check if we got a valid models response
-                if 'data' in response_data and isinstance(response_data['data'], list):
-                    model_count = len(response_data['data'])
-                    return True, f"API key is valid! Found {model_count} available models.", {
-                        'model_count': model_count,
-                        'has_gpt35': any('gpt-3.5' in model.get('id', '') for model in response_data['data']),
-                        'has_gpt4': any('gpt-4' in model.get('id', '') for model in response_data['data'])
-                    }
-                else:
-                    return False, "Unexpected response format from OpenAI API", {}
-            else:
-                return False, f"OpenAI API returned status code {response.status}", {}
-                
+            return interpret(response.status, response.read(), model)
+
     except HTTPError as e:
-        error_body = e.read().decode('utf-8') if hasattr(e, 'read') else str(e)
-        try:
-            error_data = json.loads(error_body)
-            error_message = error_data.get('error', {}).get('message', 'Unknown API error')
-            
-            # Handle specific error types
-            if 'invalid_api_key' in error_message.lower() or 'incorrect api key' in error_message.lower():
-                return False, "Invalid API key. Please check your key and try again.", {'error_type': 'invalid_key'}
-            elif 'insufficient_quota' in error_message.lower():
-                return False, "API key is valid but you've exceeded your quota. Please check your billing.", {'error_type': 'quota_exceeded'}
-            elif 'rate_limit' in error_message.lower():
-                return False, "API key is valid but rate limited. Please wait and try again.", {'error_type': 'rate_limited'}
-            else:
-                return False, f"OpenAI API Error: {error_message}", {'error_type': 'api_error'}
-        except:
-            return False, f"OpenAI API Error: HTTP {e.code}", {'error_type': 'http_error'}
-            
+        return interpret(e.code, e.read() if hasattr(e, 'read') else b'', model)
+
     except URLError as e:
         return False, f"Network Error: Unable to connect to OpenAI API. Check your internet connection.", {'error_type': 'network_error'}
-        
-    except json.JSONDecodeError as e:
-        return False, f"Invalid JSON response from OpenAI API", {'error_type': 'json_error'}
-        
+
     except Exception as e:
         return False, f"Unexpected Error: {str(e)}", {'error_type': 'unknown_error'}
 
+
+def key_hash(api_key):
+    """Cache key for an API key; the key itself is never kept"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+class KeyVerifier:
+    """
+    Async key verification for the backend. Valid results are cached for ttl
+    seconds and invalid keys for negative_ttl; a check already in flight for the
+    same key is awaited instead of repeated. Used from one event loop.
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, model=DEFAULT_MODEL, ttl=300.0, negative_ttl=60.0,
+                 max_entries=256, timeout=10.0):
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._client = None
+        self._entries = OrderedDict()  # key hash -> (expires, result)
+        self._in_flight = {}           # key hash -> task
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.requests = 0
+
+    def client(self):
+        if self._client is None:
+            # Imported here so starting the server does not pay for it
+            import httpx
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                headers={'User-Agent': USER_AGENT},
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=4),
+            )
+        return self._client
+
+    async def verify(self, api_key):
+        """(is_valid, message, details); details['cached'] says whether OpenAI was asked"""
+        problem = check_format(api_key)
+        if problem:
+            return problem
+        digest = key_hash(api_key)
+        cached = self._get(digest)
+        if cached is not None:
+            is_valid, message, details = cached
+            return is_valid, message, {**details, 'cached': True}
+
+        task = self._in_flight.get(digest)
+        if task is None:
+            task = asyncio.ensure_future(self._check(api_key))
+            self._in_flight[digest] = task
+            task.add_done_callback(lambda done: self._finish(digest, done))
+        else:
+            self.coalesced += 1
+        # Shielded: a caller that gives up does not cancel the check for the others
+        is_valid, message, details = await asyncio.shield(task)
+        return is_valid, message, {**details, 'cached': False}
+
+    async def _check(self, api_key):
+        import httpx
+        self.requests += 1
+        try:
+            response = await self.client().get(f'/models/{self.model}',
+                                               headers={'Authorization': f'Bearer {api_key}'})
+        except httpx.HTTPError:
+            return False, "Network Error: Unable to connect to OpenAI API. Check your internet connection.", {'error_type': 'network_error'}
+        except Exception as e:
+            print(f"❌ Error verifying API key: {e!r}", file=sys.stderr)
+            return False, f"Unexpected Error: {str(e)}", {'error_type': 'unknown_error'}
+        return interpret(response.status_code, response.content, self.model)
+
+    def _finish(self, digest, task):
+        self._in_flight.pop(digest, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        is_valid, _, details = task.result()
+        if is_valid:
+            self._put(digest, task.result(), self.ttl)
+        elif details.get('error_type') in CACHED_ERRORS:
+            self._put(digest, task.result(), self.negative_ttl)
+
+    def _get(self, digest):
+        entry = self._entries.get(digest)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(digest, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return entry[1]
+
+    def _put(self, digest, result, ttl):
+        if ttl <= 0:
+            return
+        self._entries[digest] = (time.monotonic() + ttl, result)
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def forget(self, api_key):
+        """Drop the cached result for a key (e.g. after it was replaced)"""
+        self._entries.pop(key_hash(api_key), None)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self):
+        return {
+            'base_url': self.base_url,
+            'entries': len(self._entries),
+            'in_flight': len(self._in_flight),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'requests': self.requests,
+        }
+
+
+def from_env():
+    return KeyVerifier(
+        base_url=os.environ.get('OPENAI_BASE_URL') or DEFAULT_BASE_URL,
+        model=os.environ.get('FIXR_VERIFY_MODEL', DEFAULT_MODEL),
+        ttl=float(os.environ.get('FIXR_VERIFY_TTL', 300)),
+        negative_ttl=float(os.environ.get('FIXR_VERIFY_NEGATIVE_TTL', 60)),
+    )
+
+
 def main():
     """
     Main function for command-line usage
@@ -91,18 +249,18 @@ def main():
             'error': 'Usage: python verify_api_key.py <api_key>'
         }))
         sys.exit(1)
-    
+
     api_key = sys.argv[1].strip()
     is_valid, message, details = verify_openai_api_key(api_key)
-    
+
     result = {
         'success': is_valid,
         'message': message,
         'details': details
     }
-    
+
     print(json.dumps(result))
     sys.exit(0 if is_valid else 1)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()